@@ -0,0 +1,3 @@
+"""
+    性能基准测试脚本集合（在仓库根目录下用 python -m bench.xxx 运行）
+"""
@@ -0,0 +1,122 @@
+"""
+    降维基准：对比不同 embedding 维度下的召回损失、检索速度与向量内存
+
+两种降维方式：
+    pca - 本地全宽 embedding + PCA 投影（离线）
+    api - 通过假 DashScope 服务请求指定 dimension（与 API 原生降维走同一条代码路径）
+
+用法：
+    python -m bench.bench_dimension --chunks 5000 --dims 1024,512,256,128 --method pca
+"""
+import argparse
+import time
+
+import chromadb
+import dashscope
+import numpy as np
+
+from bench.common import save_results
+from bench.corpus import generate_corpus, generate_questions
+from bench.fake_dashscope import FakeDashScopeServer
+from src.embeddings import LocalEmbeddingFunction, QwenEmbeddingFunction
+from src.projection import PCAProjection
+
+TOP_K = 10
+
+
+def embed_all(embedding_function, texts, batch_size=10):
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embedding_function(texts[start:start + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def brute_force_top_k(doc_vectors, query_vectors, k=TOP_K):
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def chroma_query_ms(doc_vectors, query_vectors, k=TOP_K):
+    """把向量放进一个临时 Chroma 集合，测单条查询的平均耗时"""
+    client = chromadb.Client()
+    name = f"bench_dim_{doc_vectors.shape[1]}"
+    if name in [c.name for c in client.list_collections()]:
+        client.delete_collection(name)
+    collection = client.create_collection(name)
+    ids = [f"doc_{i}" for i in range(len(doc_vectors))]
+    for start in range(0, len(ids), 1000):
+        collection.add(ids=ids[start:start + 1000], embeddings=doc_vectors[start:start + 1000])
+    start = time.perf_counter()
+    for q in query_vectors:
+        collection.query(query_embeddings=[q], n_results=k)
+    elapsed = (time.perf_counter() - start) * 1000 / len(query_vectors)
+    client.delete_collection(name)
+    return elapsed
+
+
+def evaluate(doc_vectors, query_vectors, baseline_top_k, targets):
+    start = time.perf_counter()
+    top_k = brute_force_top_k(doc_vectors, query_vectors)
+    brute_ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+    overlap = np.mean([len(set(a) & set(b)) / TOP_K for a, b in zip(top_k, baseline_top_k)])
+    hit = np.mean([t in row for t, row in zip(targets, top_k)])
+    return {
+        "dim": int(doc_vectors.shape[1]),
+        f"recall@{TOP_K}_vs_full": float(overlap),
+        f"hit@{TOP_K}": float(hit),
+        "brute_force_ms_per_query": brute_ms,
+        "chroma_ms_per_query": chroma_query_ms(doc_vectors, query_vectors),
+        "vector_mb": doc_vectors.nbytes / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding 降维基准")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", default="1024,512,256,128")
+    parser.add_argument("--method", choices=["pca", "api"], default="pca")
+    parser.add_argument("--fit-sample", type=int, default=3000, help="拟合 PCA 使用的段落数")
+    args = parser.parse_args()
+
+    texts = list(generate_corpus(args.chunks))
+    questions = generate_questions(texts, args.queries)
+    query_texts = [q for q, _ in questions]
+    targets = [idx for _, idx in questions]
+    dims = [int(d) for d in args.dims.split(",")]
+    full_dim = max(dims)
+
+    results = []
+    if args.method == "pca":
+        base = LocalEmbeddingFunction(dim=full_dim)
+        full_docs, full_queries = embed_all(base, texts), embed_all(base, query_texts)
+        baseline = brute_force_top_k(full_docs, full_queries)
+        for dim in dims:
+            if dim == full_dim:
+                docs, queries = full_docs, full_queries
+            else:
+                projection = PCAProjection.fit(full_docs[:args.fit_sample], dim)
+                docs, queries = projection.transform(full_docs), projection.transform(full_queries)
+            results.append(evaluate(docs, queries, baseline, targets))
+    else:
+        with FakeDashScopeServer() as server:
+            dashscope.base_http_api_url = server.base_url
+            dashscope.api_key = "sk-fake-bench"
+            baseline = None
+            for dim in sorted(dims, reverse=True):
+                embedding_function = QwenEmbeddingFunction(dimension=dim)
+                docs, queries = embed_all(embedding_function, texts), embed_all(embedding_function, query_texts)
+                if baseline is None:
+                    baseline = brute_force_top_k(docs, queries)
+                results.append(evaluate(docs, queries, baseline, targets))
+
+    print(f"\n{'维度':>6}{'召回(相对全宽)':>16}{'命中率':>10}{'暴力检索ms':>14}{'Chroma ms':>12}{'向量MB':>10}")
+    for r in results:
+        print(f"{r['dim']:>6}{r[f'recall@{TOP_K}_vs_full']:>16.3f}{r[f'hit@{TOP_K}']:>10.3f}"
+              f"{r['brute_force_ms_per_query']:>14.3f}{r['chroma_ms_per_query']:>12.3f}{r['vector_mb']:>10.2f}")
+    path = save_results(f"dimension_{args.method}", {str(r["dim"]): r for r in results})
+    print(f"\n💾 结果已保存: {path}")
+
+
+if __name__ == "__main__":
+    main()
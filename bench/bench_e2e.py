@@ -0,0 +1,143 @@
+"""
+    端到端基准：本地假 DashScope 服务 + 合成语料，测量入库吞吐、检索延迟、问答 QPS 与内存
+
+用法：
+    python -m bench.bench_e2e --sizes 1000,10000 --embed-latency-ms 5 --gen-latency-ms 50
+    python -m bench.bench_e2e --sizes 1000000 --queries 200    # 大规模（耗时较长）
+
+结果保存在 bench/results/，并自动与上一次结果对比。
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dashscope
+
+from bench.common import (current_rss_mb, load_previous, peak_rss_mb, percentiles,
+                          print_comparison, save_results)
+from bench.corpus import generate_questions, write_corpus
+from bench.fake_dashscope import FakeDashScopeServer
+from src import rag_core
+from src.metrics import metrics
+from src.router import route_report
+
+
+# ==================== 各项测量 ====================
+def measure_ingestion(corpus_path, collection_name):
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    collection = rag_core.initialize_vector_database(corpus_path, collection_name)
+    elapsed = time.perf_counter() - start
+    count = collection.count()
+    return collection, {
+        "chunks": count,
+        "seconds": elapsed,
+        "chunks_per_second": count / elapsed if elapsed else 0.0,
+        "rss_delta_mb": current_rss_mb() - rss_before,
+    }
+
+
+def measure_retrieval(collection, questions):
+    latencies = []
+    for question, _ in questions:
+        start = time.perf_counter()
+        rag_core.retrieve_context(collection, question)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"queries": len(latencies), "mean_ms": sum(latencies) / len(latencies),
+            **{f"{k}_ms": v for k, v in percentiles(latencies).items()}}
+
+
+def measure_qps(questions, concurrency, duration):
+    """在固定时长内以 concurrency 个线程不停调用 ask_question"""
+    deadline = time.perf_counter() + duration
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            rag_core.ask_question(questions[i % len(questions)][0])
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+            i += concurrency
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"concurrency": concurrency, "requests": len(latencies),
+            "qps": len(latencies) / elapsed,
+            **{f"{k}_ms": v for k, v in percentiles(latencies).items()}}
+
+
+# ==================== 主流程 ====================
+def run(sizes, queries, concurrency, duration, server):
+    results = {}
+    client = rag_core.get_client()
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            print(f"\n===== 语料规模: {size} 个段落 =====")
+            corpus_path = write_corpus(os.path.join(tmp, f"corpus_{size}.txt"), size)
+            collection_name = f"bench_{size}"
+            if collection_name in [c.name for c in client.list_collections()]:
+                client.delete_collection(collection_name)
+
+            server.reset_stats()
+            collection, ingest = measure_ingestion(corpus_path, collection_name)
+            ingest["api"] = server.snapshot_stats()
+            print(f"入库: {ingest['chunks_per_second']:.1f} 段/秒, 共 {ingest['seconds']:.1f} 秒")
+
+            paragraphs = rag_core.load_documents_from_file(corpus_path)
+            question_set = generate_questions(paragraphs, queries)
+            retrieval = measure_retrieval(collection, question_set)
+            print(f"检索: p50={retrieval['p50_ms']:.2f}ms p99={retrieval['p99_ms']:.2f}ms")
+
+            rag_core.collection = collection
+            metrics.reset()
+            e2e = measure_qps(question_set, concurrency, duration)
+            e2e["routes"] = route_report()
+            print(f"问答: {e2e['qps']:.1f} QPS, p95={e2e.get('p95_ms', 0):.1f}ms")
+
+            results[str(size)] = {"ingestion": ingest, "retrieval": retrieval, "end_to_end": e2e,
+                                  "peak_rss_mb": peak_rss_mb()}
+            client.delete_collection(collection_name)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG 端到端基准测试")
+    parser.add_argument("--sizes", default="1000,10000", help="语料规模列表，逗号分隔")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="QPS 测试时长（秒）")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--gen-latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.2)
+    parser.add_argument("--max-qps", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--name", default="e2e", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    server = FakeDashScopeServer(embed_latency_ms=args.embed_latency_ms,
+                                 gen_latency_ms=args.gen_latency_ms,
+                                 latency_jitter=args.latency_jitter, max_qps=args.max_qps,
+                                 error_rate=args.error_rate, dimension=args.dimension)
+    with server:
+        dashscope.base_http_api_url = server.base_url
+        dashscope.api_key = "sk-fake-bench"  # 配置中的占位 Key 含中文，无法放进请求头
+        sizes = [int(s) for s in args.sizes.split(",")]
+        results = run(sizes, args.queries, args.concurrency, args.duration, server)
+        results["config"] = vars(args)
+
+    path = save_results(args.name, results)
+    print(f"\n💾 结果已保存: {path}")
+    print_comparison(load_previous(args.name, exclude=path), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+    日志开销基准：对比旧的 print() 与新的队列日志在 1k QPS 请求路径上的额外耗时
+
+用法：
+    python -m bench.bench_logging --qps 1000 --requests 3000 --workers 8
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import logger as rag_logger
+
+SAMPLE_DOCS = [
+    "过拟合指模型在训练集表现好但在测试集差，解决方案包括：1)正则化 2)Dropout 3)增加数据 4)早停法。",
+    "交叉验证将数据分成k份，轮流作为验证集，减少评估结果的随机性。",
+    "RAG（检索增强生成）通过检索外部知识来增强LLM的回答准确性。",
+]
+
+
+# ==================== 两种请求路径 ====================
+def request_with_print(question, docs):
+    """旧实现：_get_embeddings 与 retrieve_context 中的同步 print"""
+    print(f"API 响应状态: 200")
+    print(f"\n🔍 检索到的文档:")
+    for i, doc in enumerate(docs, 1):
+        print(f"  {i}. {doc[:100]}...")
+    print()
+
+
+def make_request_with_logger(log):
+    """新实现：与 src/rag_core.py、src/embeddings.py 中的日志调用保持一致"""
+
+    def request_with_logger(question, docs):
+        with rag_logger.sampled_request():
+            if log.isEnabledFor(logging.DEBUG) and rag_logger.should_sample():
+                log.debug("API 响应状态: %s", 200)
+            if log.isEnabledFor(logging.DEBUG) and rag_logger.should_sample():
+                log.debug("🔍 检索到的文档: %s", question)
+                for i, doc in enumerate(docs, 1):
+                    log.debug("  %d. %s...", i, doc[:100])
+
+    return request_with_logger
+
+
+# ==================== 压测 ====================
+def run_paced(fn, qps, total, workers):
+    """按固定 QPS 发出请求，返回每个请求花在日志上的耗时（微秒）"""
+    costs = []
+    lock = threading.Lock()
+    interval = 1.0 / qps
+
+    def one(i):
+        start = time.perf_counter_ns()
+        fn(f"问题{i}", SAMPLE_DOCS)
+        cost = (time.perf_counter_ns() - start) / 1000
+        with lock:
+            costs.append(cost)
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i in range(total):
+            delay = begin + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, i)
+    return costs
+
+
+def summarize(name, costs):
+    costs = sorted(costs)
+    p99 = costs[int(len(costs) * 0.99) - 1]
+    print(f"{name:<28} mean={statistics.mean(costs):8.1f}us  "
+          f"p50={statistics.median(costs):8.1f}us  p99={p99:8.1f}us", file=sys.__stderr__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志开销基准测试")
+    parser.add_argument("--qps", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sink", default=os.devnull, help="日志输出目标，默认丢弃")
+    args = parser.parse_args()
+
+    with open(args.sink, "w", encoding="utf-8") as sink:
+        # 旧实现：print 直接写 stdout
+        real_stdout = sys.stdout
+        sys.stdout = sink
+        try:
+            costs = run_paced(request_with_print, args.qps, args.requests, args.workers)
+        finally:
+            sys.stdout = real_stdout
+        summarize("before: print()", costs)
+
+        # 新实现：不同级别与采样比例
+        for level, rate in (("INFO", 0.0), ("DEBUG", 0.01), ("DEBUG", 1.0)):
+            rag_logger.setup_logging(level=level, sample_rate=rate, stream=sink)
+            log = rag_logger.get_logger("bench")
+            costs = run_paced(make_request_with_logger(log), args.qps, args.requests, args.workers)
+            rag_logger.shutdown_logging()
+            summarize(f"after: {level} sample={rate}", costs)
+
+    print(f"队列满丢弃的日志条数: {rag_logger.dropped_count()}", file=sys.__stderr__)
+
+
+if __name__ == "__main__":
+    main()
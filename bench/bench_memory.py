@@ -0,0 +1,114 @@
+"""
+    内存扩展性报告：在不同语料规模下测量入库与查询各阶段的内存占用，换算成每段字节数，
+    并对比 embedding 以 Python float 列表（旧实现）和连续 float32 数组（当前实现）传递时的差异
+
+每个 (规模, 表示方式) 在独立子进程里运行，RSS 互不影响；使用本地哈希 embedding，不需要 API。
+开启 tracemalloc 后入库会慢几倍，1M 段需要较长时间和数 GB 内存：
+    python -m bench.bench_memory --sizes 10000,100000
+    python -m bench.bench_memory --sizes 10000,100000,1000000 --dim 1024
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from bench.common import load_previous, print_comparison, save_results
+from bench.corpus import generate_questions, write_corpus
+from src.embeddings import LocalEmbeddingFunction
+
+MODES = ("float32", "list")
+
+
+class ListEmbeddingFunction(LocalEmbeddingFunction):
+    """旧实现的返回形式：每个向量是一个 Python float 列表"""
+
+    def _get_embeddings(self, texts):
+        return super()._get_embeddings(texts).tolist()
+
+
+def measure(corpus_path, size, mode, dim, queries):
+    """子进程：入库 + 查询，返回各阶段内存统计"""
+    import chromadb
+
+    from src import memory_profile
+    from src.ingest_job import IngestionJob
+    from src.rag_core import load_documents_from_file, retrieve_documents
+    from src.vector_store import open_collection
+
+    embedding_function = ListEmbeddingFunction(dim) if mode == "list" else LocalEmbeddingFunction(dim)
+    collection = open_collection(f"memory_{size}_{mode}", embedding_function, chromadb.Client())
+    question_set = generate_questions(load_documents_from_file(corpus_path)[:1000], queries)
+
+    memory_profile.enable()
+    rss_before = memory_profile.rss_bytes()
+    start = time.perf_counter()
+    IngestionJob(corpus_path, collection).run()
+    ingest_seconds = time.perf_counter() - start
+    rss_after_ingest = memory_profile.rss_bytes()
+    for question, _ in question_set:
+        retrieve_documents(collection, question, 3, multi_query=False)
+    report = memory_profile.memory_report()
+    memory_profile.disable()
+
+    stages = report["stages"]
+    chunks = collection.count()
+    return {
+        "chunks": chunks,
+        "ingest_seconds": ingest_seconds,
+        "rss_bytes_per_chunk": (rss_after_ingest - rss_before) / chunks,
+        "ingest_peak_traced_mb": stages["ingest"]["peak_bytes"] / 1024 / 1024,
+        "embedding_peak_bytes_per_chunk": stages["embedding"]["mean_peak_bytes_per_item"],
+        "upsert_peak_bytes_per_chunk": stages["ingest.upsert"]["mean_peak_bytes_per_item"],
+        "query_peak_kb": stages["query.retrieve"]["peak_bytes"] / 1024,
+        "peak_rss_mb": report["peak_rss_bytes"] / 1024 / 1024,
+    }
+
+
+def run(sizes, dim, queries):
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            corpus_path = write_corpus(os.path.join(tmp, f"corpus_{size}.txt"), size)
+            for mode in MODES:
+                print(f"▶️ {size} 段 / {mode} ...", flush=True)
+                with context.Pool(1) as pool:
+                    results[f"{size}.{mode}"] = pool.apply(measure, (corpus_path, size, mode, dim, queries))
+    return results
+
+
+def print_report(results, sizes):
+    print(f"\n{'规模':>9}{'表示':>9}{'RSS/段':>10}{'embed峰值/段':>14}{'upsert峰值/段':>15}"
+          f"{'入库峰值MB':>12}{'查询峰值KB':>12}{'入库(s)':>9}")
+    for size in sizes:
+        for mode in MODES:
+            r = results[f"{size}.{mode}"]
+            print(f"{size:>9}{mode:>9}{r['rss_bytes_per_chunk']:>10.0f}{r['embedding_peak_bytes_per_chunk']:>14.0f}"
+                  f"{r['upsert_peak_bytes_per_chunk']:>15.0f}{r['ingest_peak_traced_mb']:>12.1f}"
+                  f"{r['query_peak_kb']:>12.1f}{r['ingest_seconds']:>9.1f}")
+        list_peak = results[f"{size}.list"]["embedding_peak_bytes_per_chunk"]
+        array_peak = results[f"{size}.float32"]["embedding_peak_bytes_per_chunk"]
+        print(f"{'':>9}embedding 峰值缩减 {list_peak / array_peak:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入库与查询的内存扩展性报告")
+    parser.add_argument("--sizes", default="10000,100000", help="语料规模列表，逗号分隔")
+    parser.add_argument("--dim", type=int, default=1024, help="embedding 维度（text-embedding-v3 默认 1024）")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--name", default="memory", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = run(sizes, args.dim, args.queries)
+    print_report(results, sizes)
+    results["config"] = vars(args)
+
+    path = save_results(args.name, results)
+    print(f"\n💾 结果已保存: {path}")
+    print_comparison(load_previous(args.name, exclude=path), results)
+
+
+if __name__ == "__main__":
+    main()
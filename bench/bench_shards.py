@@ -0,0 +1,110 @@
+"""
+    分片检索基准：同一份合成语料分别用 1..N 个分片进程检索，测量入库时间、单查询延迟与并发吞吐
+
+默认使用本地哈希 embedding（不需要 API），只衡量分片本身的扩展性：
+    python -m bench.bench_shards --size 100000 --shards 1,2,4,8 --concurrency 16
+
+结果保存在 bench/results/，并自动与上一次结果对比。
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import load_previous, percentiles, print_comparison, save_results
+from bench.corpus import generate_questions, write_corpus
+from src.sharding import ShardedCollection
+from src.utils import iter_paragraphs
+
+
+# ==================== 各项测量 ====================
+def measure_latency(collection, questions, top_k):
+    latencies = []
+    for question, _ in questions:
+        start = time.perf_counter()
+        collection.query([question], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"queries": len(latencies), "mean_ms": sum(latencies) / len(latencies),
+            **{f"{k}_ms": v for k, v in percentiles(latencies).items()}}
+
+
+def measure_throughput(collection, questions, top_k, concurrency, duration):
+    deadline = time.perf_counter() + duration
+    done = [0]
+    lock = threading.Lock()
+
+    def worker(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            collection.query([questions[i % len(questions)][0]], top_k)
+            with lock:
+                done[0] += 1
+            i += concurrency
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return {"concurrency": concurrency, "requests": done[0], "qps": done[0] / (time.perf_counter() - start)}
+
+
+# ==================== 主流程 ====================
+def run(size, shard_counts, queries, top_k, concurrency, duration, backend):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = write_corpus(os.path.join(tmp, "corpus.txt"), size)
+        paragraphs = [p for p, _ in iter_paragraphs(corpus_path)]
+        questions = generate_questions(paragraphs, queries)
+
+        for shards in shard_counts:
+            print(f"\n===== {shards} 个分片 / {size} 个段落 =====")
+            collection = ShardedCollection(f"bench_shards_{size}", shards, backend)
+            try:
+                start = time.perf_counter()
+                collection.ingest(corpus_path)
+                ingest_seconds = time.perf_counter() - start
+                latency = measure_latency(collection, questions, top_k)
+                throughput = measure_throughput(collection, questions, top_k, concurrency, duration)
+            finally:
+                collection.close()
+            print(f"入库 {ingest_seconds:.1f}s, 延迟 p50={latency['p50_ms']:.2f}ms p95={latency['p95_ms']:.2f}ms, "
+                  f"吞吐 {throughput['qps']:.1f} QPS")
+            results[str(shards)] = {"ingest_seconds": ingest_seconds, "latency": latency, "throughput": throughput}
+
+    base = results[str(shard_counts[0])]["throughput"]["qps"]
+    for shards in shard_counts:
+        results[str(shards)]["throughput"]["speedup"] = results[str(shards)]["throughput"]["qps"] / base
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片检索扩展性基准")
+    parser.add_argument("--size", type=int, default=20000, help="语料段落数")
+    parser.add_argument("--shards", default="1,2,4", help="分片数列表，逗号分隔")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="吞吐测试时长（秒）")
+    parser.add_argument("--backend", default="local", help="embedding 后端，默认本地哈希")
+    parser.add_argument("--name", default="shards", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    shard_counts = [int(s) for s in args.shards.split(",")]
+    results = run(args.size, shard_counts, args.queries, args.top_k, args.concurrency, args.duration,
+                  args.backend)
+    results["config"] = vars(args)
+
+    print(f"\n{'分片':<6}{'p50(ms)':>10}{'p95(ms)':>10}{'QPS':>10}{'加速比':>8}")
+    for shards in shard_counts:
+        r = results[str(shards)]
+        print(f"{shards:<6}{r['latency']['p50_ms']:>10.2f}{r['latency']['p95_ms']:>10.2f}"
+              f"{r['throughput']['qps']:>10.1f}{r['throughput']['speedup']:>8.2f}")
+
+    path = save_results(args.name, results)
+    print(f"\n💾 结果已保存: {path}")
+    print_comparison(load_previous(args.name, exclude=path), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+    版本回归基准：versions/ 下每个历史脚本和当前 src/ 流水线，用同一份合成语料与问题、
+    同一个本地假 DashScope 服务，对比入库耗时、API 调用次数、单问题延迟与峰值内存
+
+历史脚本在导入时就会建库、入库，还把语料和 API Key 写死在代码里，因此每个版本在独立子进程中运行：
+子进程先导入 chromadb / dashscope 并启动假服务，再把脚本源码中顶层的 documents / KNOWLEDGE_FILE
+赋值替换为共享语料后执行（__name__ 不是 "__main__"，脚本自带的测试不会运行）。
+v0.x 使用 Chroma 默认的 ONNX 模型，离线环境下无法下载，默认替换为假服务上的 text-embedding-v3（--onnx 保留原模型）。
+
+    python -m bench.bench_versions --size 200 --queries 20
+    python -m bench.bench_versions --only v1.1_Refactored_Better_Embedding,src
+"""
+import argparse
+import ast
+import contextlib
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.common import current_rss_mb, load_previous, peak_rss_mb, percentiles, print_comparison, save_results
+from bench.corpus import generate_questions, write_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERSIONS_DIR = os.path.join(REPO_ROOT, "versions")
+SRC_TARGET = "src"
+
+# 脚本顶层赋值 -> 注入的共享语料
+_INJECTED = {"documents": "__bench_documents__", "KNOWLEDGE_FILE": "__bench_corpus_path__"}
+
+
+def list_targets():
+    versions = sorted(os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(VERSIONS_DIR, "v*.py")))
+    return versions + [SRC_TARGET]
+
+
+# ==================== 子进程：加载各版本 ====================
+def prepare_source(source):
+    """把顶层的 documents = ... / KNOWLEDGE_FILE = ... 改为读取注入的共享语料，返回可执行的代码对象"""
+    tree = ast.parse(source)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            injected = _INJECTED.get(node.targets[0].id)
+            if injected:
+                node.value = ast.copy_location(ast.Name(id=injected, ctx=ast.Load()), node.value)
+    return compile(ast.fix_missing_locations(tree), "<bench>", "exec")
+
+
+def load_version(name, corpus_path, documents):
+    """执行历史脚本（其中包含入库），返回 ask_question"""
+    with open(os.path.join(VERSIONS_DIR, f"{name}.py"), encoding="utf-8") as f:
+        code = prepare_source(f.read())
+    namespace = {"__name__": f"bench_{name}", "__bench_documents__": documents, "__bench_corpus_path__": corpus_path}
+    exec(code, namespace)
+    if "collection" not in namespace and "initialize_vector_database" in namespace:
+        # v1.1 起入库放进了函数，原脚本在 __main__ 中调用并赋值给全局 collection
+        namespace["collection"] = namespace["initialize_vector_database"]()
+    return namespace["ask_question"]
+
+
+def load_src(corpus_path):
+    from src import rag_core
+
+    rag_core.collection = rag_core.initialize_vector_database(corpus_path, "bench_versions_src")
+    return rag_core.ask_question
+
+
+def run_target(target, corpus_path, questions, embed_latency_ms, gen_latency_ms, onnx):
+    """在当前（子）进程里跑一个版本，返回测量结果"""
+    import chromadb  # noqa: F401  先导入依赖，导入耗时不计入入库
+    import dashscope
+    from chromadb.utils import embedding_functions
+
+    from bench.fake_dashscope import FakeDashScopeServer
+    from src.embeddings import QwenEmbeddingFunction
+    from src.utils import iter_paragraphs
+
+    notes = []
+    if not onnx:
+        embedding_functions.DefaultEmbeddingFunction = QwenEmbeddingFunction
+        notes.append("默认 ONNX embedding 替换为假服务")
+    documents = [p for p, _ in iter_paragraphs(corpus_path)]
+    baseline_rss = current_rss_mb()
+
+    with FakeDashScopeServer(embed_latency_ms=embed_latency_ms, gen_latency_ms=gen_latency_ms) as server, \
+            open(os.devnull, "w") as devnull:
+        dashscope.base_http_api_url = server.base_url
+        dashscope.api_key = "sk-fake-bench"  # 历史脚本会改写成自己写死的 Key，假服务不校验
+
+        # 历史脚本用 print 打印调试信息，测量期间丢弃
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            ask = load_src(corpus_path) if target == SRC_TARGET else load_version(target, corpus_path, documents)
+            ingest_seconds = time.perf_counter() - start
+            ingest_api = server.snapshot_stats()
+            server.reset_stats()
+
+            latencies, failures = [], 0
+            for question in questions:
+                start = time.perf_counter()
+                answer = ask(question)
+                latencies.append((time.perf_counter() - start) * 1000)
+                failures += isinstance(answer, str) and answer.startswith("调用失败")
+        answer_api = server.snapshot_stats()
+
+    n = len(questions)
+    return {
+        "ingestion": {"seconds": ingest_seconds, "chunks": len(documents),
+                      "embedding_calls": ingest_api["embedding_calls"]},
+        "questions": {"count": n, "failures": failures, "mean_ms": sum(latencies) / n,
+                      **{f"{k}_ms": v for k, v in percentiles(latencies).items()},
+                      "embedding_calls_per_question": answer_api["embedding_calls"] / n,
+                      "generation_calls_per_question": answer_api["generation_calls"] / n,
+                      "input_tokens_per_question": answer_api["input_tokens"] / n},
+        "memory": {"baseline_rss_mb": baseline_rss, "peak_rss_mb": peak_rss_mb()},
+        "notes": notes,
+    }
+
+
+def _child_main(args):
+    with open(args.questions_file, encoding="utf-8") as f:
+        questions = json.load(f)
+    try:
+        result = run_target(args.child, args.corpus, questions, args.embed_latency_ms, args.gen_latency_ms,
+                            args.onnx)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+# ==================== 主进程 ====================
+def run(targets, size, queries, embed_latency_ms, gen_latency_ms, onnx=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = write_corpus(os.path.join(tmp, "corpus.txt"), size)
+        with open(corpus_path, encoding="utf-8") as f:
+            paragraphs = f.read().split("\n\n")
+        questions_file = os.path.join(tmp, "questions.json")
+        with open(questions_file, "w", encoding="utf-8") as f:
+            json.dump([q for q, _ in generate_questions(paragraphs, queries)], f, ensure_ascii=False)
+
+        for target in targets:
+            output = os.path.join(tmp, f"{target}.json")
+            command = [sys.executable, "-m", "bench.bench_versions", "--child", target, "--corpus", corpus_path,
+                       "--questions-file", questions_file, "--output", output,
+                       "--embed-latency-ms", str(embed_latency_ms), "--gen-latency-ms", str(gen_latency_ms)]
+            if onnx:
+                command.append("--onnx")
+            print(f"▶️ {target} ...", flush=True)
+            completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+            if os.path.exists(output):
+                with open(output, encoding="utf-8") as f:
+                    results[target] = json.load(f)
+            else:
+                results[target] = {"error": (completed.stderr.strip().splitlines() or ["子进程异常退出"])[-1]}
+    return results
+
+
+def print_report(results):
+    print(f"\n{'版本':<38}{'入库(s)':>9}{'入库调用':>9}{'p50(ms)':>9}{'p95(ms)':>9}"
+          f"{'embed/问':>9}{'gen/问':>8}{'峰值MB':>9}")
+    for target, r in results.items():
+        if "error" in r:
+            print(f"{target:<38}  ❌ {r['error']}")
+            continue
+        ingestion, questions = r["ingestion"], r["questions"]
+        print(f"{target:<38}{ingestion['seconds']:>9.2f}{ingestion['embedding_calls']:>9}"
+              f"{questions['p50_ms']:>9.1f}{questions['p95_ms']:>9.1f}"
+              f"{questions['embedding_calls_per_question']:>9.2f}{questions['generation_calls_per_question']:>8.2f}"
+              f"{r['memory']['peak_rss_mb']:>9.0f}")
+    notes = {note for r in results.values() for note in r.get("notes", [])}
+    for note in sorted(notes):
+        print(f"注: {note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史版本与当前流水线的回归基准")
+    parser.add_argument("--size", type=int, default=200, help="合成语料段落数")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--only", default=None, help="逗号分隔的版本名（不含 .py），src 表示当前流水线")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--gen-latency-ms", type=float, default=50.0)
+    parser.add_argument("--onnx", action="store_true", help="v0.x 保留 Chroma 默认 ONNX embedding（需已下载模型）")
+    parser.add_argument("--name", default="versions", help="结果文件名前缀")
+    # 子进程参数
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--questions-file", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child_main(args)
+        return
+
+    targets = args.only.split(",") if args.only else list_targets()
+    results = run(targets, args.size, args.queries, args.embed_latency_ms, args.gen_latency_ms, args.onnx)
+    print_report(results)
+    results["config"] = vars(args)
+
+    path = save_results(args.name, results)
+    print(f"\n💾 结果已保存: {path}")
+    print_comparison(load_previous(args.name, exclude=path), results)
+
+
+if __name__ == "__main__":
+    main()
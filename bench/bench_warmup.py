@@ -0,0 +1,108 @@
+"""
+    启动预热基准：用上一次部署的查询日志（热门问题按 Zipf 分布重复出现）预热后，
+    对比冷启动、预热后与稳态三种情况下同一段流量的问答延迟和 API 调用次数
+
+    python -m bench.bench_warmup --size 500 --questions 40 --requests 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import dashscope
+
+from bench.common import load_previous, percentiles, print_comparison, save_results
+from bench.corpus import generate_questions, write_corpus
+from bench.fake_dashscope import FakeDashScopeServer
+from src import query_cache, rag_core
+from src.warmup import QueryLog, WarmupJob
+
+
+def zipf_traffic(questions, n, s=1.1, seed=0):
+    """热门问题占大头：第 k 个问题的权重为 1 / k^s"""
+    weights = [1 / (k ** s) for k in range(1, len(questions) + 1)]
+    return random.Random(seed).choices(questions, weights=weights, k=n)
+
+
+def replay(traffic, server):
+    server.reset_stats()
+    latencies = []
+    for question in traffic:
+        start = time.perf_counter()
+        rag_core.ask_question(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+    stats = server.snapshot_stats()
+    return {"requests": len(traffic), "mean_ms": sum(latencies) / len(latencies),
+            **{f"{k}_ms": v for k, v in percentiles(latencies).items()},
+            "embedding_calls": stats["embedding_calls"], "generation_calls": stats["generation_calls"]}
+
+
+def clear_caches():
+    query_cache.get_query_embedding_cache().clear()
+    query_cache.get_answer_cache().clear()
+
+
+def run(size, n_questions, n_requests, top_n, server):
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = write_corpus(os.path.join(tmp, "corpus.txt"), size)
+        with open(corpus_path, encoding="utf-8") as f:
+            paragraphs = f.read().split("\n\n")
+        questions = [q for q, _ in generate_questions(paragraphs, n_questions)]
+        rag_core.collection = rag_core.initialize_vector_database(corpus_path, "bench_warmup")
+
+        # 上一次部署的流量写成查询日志；本次部署的流量换一个随机种子
+        query_log = QueryLog(os.path.join(tmp, "query_log.jsonl"))
+        for question in zipf_traffic(questions, n_requests * 5, seed=1):
+            query_log.record(question)
+        query_log.close()
+        traffic = zipf_traffic(questions, n_requests, seed=2)
+
+        results = {}
+        clear_caches()
+        results["cold"] = replay(traffic, server)
+        results["steady"] = replay(traffic, server)   # 缓存已被同一段流量填满
+
+        clear_caches()
+        server.reset_stats()
+        warmup_questions = [key for key, _ in query_log.top_questions(top_n)]
+        state = WarmupJob(warmup_questions, rate=0).run()
+        results["warmup"] = {**state, **server.snapshot_stats()}
+        results["warmed"] = replay(traffic, server)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动预热基准")
+    parser.add_argument("--size", type=int, default=500, help="合成语料段落数")
+    parser.add_argument("--questions", type=int, default=40, help="不同问题的个数")
+    parser.add_argument("--requests", type=int, default=200, help="每轮重放的请求数")
+    parser.add_argument("--top-n", type=int, default=20, help="预热的热门问题数")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--gen-latency-ms", type=float, default=200.0)
+    parser.add_argument("--name", default="warmup", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    # 答案缓存默认关闭，基准里打开才能看到生成调用的节省
+    query_cache.ANSWER_CACHE_SIZE = 1024
+    with FakeDashScopeServer(embed_latency_ms=args.embed_latency_ms, gen_latency_ms=args.gen_latency_ms) as server:
+        dashscope.base_http_api_url = server.base_url
+        dashscope.api_key = "sk-fake-bench"
+        results = run(args.size, args.questions, args.requests, args.top_n, server)
+    results["config"] = vars(args)
+
+    warmup = results["warmup"]
+    print(f"\n预热: {warmup['done']} 个问题，{warmup['seconds']:.1f} 秒，"
+          f"embedding {warmup['embedding_calls']} 次，生成 {warmup['generation_calls']} 次")
+    print(f"{'阶段':<8}{'p50(ms)':>10}{'p95(ms)':>10}{'embedding':>11}{'生成':>7}")
+    for phase in ("cold", "warmed", "steady"):
+        r = results[phase]
+        print(f"{phase:<8}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['embedding_calls']:>11}{r['generation_calls']:>7}")
+
+    path = save_results(args.name, results)
+    print(f"\n💾 结果已保存: {path}")
+    print_comparison(load_previous(args.name, exclude=path), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+    启动时间回归检查：用 python -X importtime 冷启动轻量命令，导入耗时超过预算或导入了重量级模块时以非零状态退出
+
+另外用离线 embedding（local 后端、内存集合、临时语料）真正跑一遍 query / clear，
+检查只检索、只清理的命令没有把生成客户端、requests、分片等用不到的模块导入进来。
+
+用法（可放进 CI）：
+    python -m bench.check_startup
+    python -m bench.check_startup --budget-ms 150 --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只看帮助、解析参数的命令不应该触发这些模块的导入
+LIGHT_COMMANDS = [
+    ["--help"],
+    ["ingest", "--help"],
+    ["query", "--help"],
+    ["ask", "--help"],
+    ["serve", "--help"],
+    ["bench", "--help"],
+]
+HEAVY_MODULES = ("chromadb", "dashscope", "numpy", "requests")
+
+# 真正执行的轻量命令（语料路径由 REAL_DRIVER 的第一个参数给出），以及它们不应导入的模块
+REAL_COMMANDS = [
+    ["query", "机器学习", "--top-k", "1"],
+    ["clear"],
+]
+REAL_FORBIDDEN_MODULES = ("src.generation", "requests", "src.sharding", "dashscope", "src.compression")
+# 先改配置再导入 main：离线 embedding、内存集合，运行结束后把已导入的违禁模块写到 stderr 最后一行
+REAL_DRIVER = """
+import json, sys
+from src import config
+config.EMBEDDING_BACKEND = "local"
+config.CHROMA_PERSIST_DIR = None
+config.CHUNK_STORE_DIR = None
+config.KNOWLEDGE_FILE = sys.argv[1]
+import main
+args = main.build_parser().parse_args(sys.argv[2:])
+args.func(args)
+print(json.dumps(sorted(m for m in {forbidden!r} if m in sys.modules)), file=sys.stderr)
+"""
+
+
+def measure_import_time(command):
+    """返回 (顶层模块累计导入耗时 ms, 导入的全部模块名)"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "main.py", *command], cwd=ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    total_us, modules = 0, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules.add(name.strip())
+            if not name.startswith("  "):  # 缩进为 0 的是顶层导入，累计值已包含其子模块
+                total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def run_real_command(command, corpus_path):
+    """返回 (耗时 ms, 导入了的违禁模块)；命令失败时抛出 RuntimeError"""
+    driver = REAL_DRIVER.format(forbidden=REAL_FORBIDDEN_MODULES)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", driver, corpus_path, *command], cwd=ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    lines = proc.stderr.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"main.py {' '.join(command)} 运行失败:\n{proc.stderr[-2000:]}")
+    return elapsed, json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI 冷启动导入耗时检查")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="单条命令的导入耗时预算")
+    parser.add_argument("--runs", type=int, default=3, help="每条命令运行次数，取最小值以排除抖动")
+    args = parser.parse_args()
+
+    failures = []
+    for command in LIGHT_COMMANDS:
+        samples = [measure_import_time(command) for _ in range(args.runs)]
+        elapsed = min(ms for ms, _ in samples)
+        heavy = sorted(m for m in samples[0][1] if m.split(".")[0] in HEAVY_MODULES and "." not in m)
+        status = "✅" if elapsed <= args.budget_ms and not heavy else "❌"
+        print(f"{status} main.py {' '.join(command):<16} {elapsed:>8.1f} ms"
+              + (f"  导入了重量级模块: {', '.join(heavy)}" if heavy else ""))
+        if status == "❌":
+            failures.append(command)
+
+    from bench.corpus import write_corpus
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = write_corpus(os.path.join(tmp, "corpus.txt"), 50)
+        for command in REAL_COMMANDS:
+            elapsed, forbidden = run_real_command(command, corpus_path)
+            status = "✅" if not forbidden else "❌"
+            print(f"{status} main.py {' '.join(command):<16} {elapsed:>8.1f} ms（实际运行，离线 embedding）"
+                  + (f"  导入了用不到的模块: {', '.join(forbidden)}" if forbidden else ""))
+            if forbidden:
+                failures.append(command)
+
+    if failures:
+        print(f"\n{len(failures)} 条命令超出启动预算 {args.budget_ms:.0f} ms 或导入了用不到的模块")
+        sys.exit(1)
+    print(f"\n全部命令在预算 {args.budget_ms:.0f} ms 以内，实际运行的命令没有导入用不到的模块")
+
+
+if __name__ == "__main__":
+    main()
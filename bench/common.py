@@ -0,0 +1,107 @@
+"""
+    基准测试公共工具 - 统计、内存、结果保存与回归对比
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+# ==================== 统计 ====================
+def percentiles(values, points=(50, 95, 99)):
+    """返回 {"p50": ..., "p95": ..., ...}，values 为空时返回空字典"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        result[f"p{p}"] = ordered[idx]
+    return result
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）
+
+    POSIX 用 ru_maxrss（Linux 单位为 KB，macOS 为字节）；Windows 没有 resource 模块，
+    装了 psutil 时取峰值工作集，否则退回 tracemalloc 记录的 Python 分配峰值（未开启跟踪时为 0）。
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+
+
+def current_rss_mb():
+    """当前常驻内存（MB），读取 /proc，不可用时退回峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, AttributeError):  # 没有 /proc（macOS）或没有 os.sysconf（Windows）
+        return peak_rss_mb()
+
+
+# ==================== 结果保存 ====================
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(name, results):
+    """保存到 bench/results/<name>_<时间>_<提交>.json，并返回路径"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    revision = git_revision()
+    payload = {"name": name, "revision": revision, "timestamp": time.time(), "results": results}
+    path = os.path.join(RESULTS_DIR, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{revision}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_previous(name, exclude=None):
+    """读取同名基准的上一次结果，没有则返回 None"""
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, f"{name}_*.json")) if p != exclude)
+    if not paths:
+        return None
+    with open(paths[-1], encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def print_comparison(previous, current):
+    """逐项打印本次与上次结果的差异，便于发现提交之间的性能回归"""
+    if previous is None:
+        print("（没有历史结果可对比）")
+        return
+    print(f"\n📊 与上次结果对比（{previous['revision']} → {git_revision()}）:")
+    old, new = _flatten(previous["results"]), _flatten(current)
+    for key in sorted(new):
+        if key.startswith("config.") or not old.get(key):
+            continue
+        change = (new[key] - old[key]) / abs(old[key]) * 100
+        print(f"  {key:<50} {old[key]:>12.3f} → {new[key]:>12.3f}  ({change:+.1f}%)")
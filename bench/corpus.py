@@ -0,0 +1,66 @@
+"""
+    合成语料生成 - 仿照 data/your_notes.txt 的风格批量生成知识段落与对应问题
+"""
+import argparse
+import random
+
+TOPICS = [
+    "过拟合", "欠拟合", "正则化", "交叉验证", "梯度下降", "损失函数", "激活函数", "卷积神经网络",
+    "循环神经网络", "Transformer", "注意力机制", "Embedding", "RAG", "向量数据库", "知识蒸馏",
+    "迁移学习", "强化学习", "决策树", "随机森林", "支持向量机", "聚类", "主成分分析", "批归一化",
+    "Dropout", "学习率", "早停法", "数据增强", "特征工程", "召回率", "准确率",
+]
+VERBS = ["用于", "能够", "通过", "依赖", "改善", "衡量", "减少", "增强", "描述", "结合"]
+OBJECTS = [
+    "模型的泛化能力", "训练过程的稳定性", "高维数据的结构", "序列中的长距离依赖", "图像中的局部特征",
+    "预测与真实值的差距", "参数更新的方向", "样本之间的相似度", "外部知识的检索", "计算资源的消耗",
+    "标注数据的数量", "特征之间的相关性", "推理阶段的延迟", "噪声对结果的影响", "离散变量的表示",
+]
+CONNECTORS = ["同时", "此外", "因此", "通常", "在实践中"]
+
+
+def generate_paragraph(rng, index):
+    """生成一个知识段落，段落编号写入文本以保证每段唯一"""
+    topic = rng.choice(TOPICS)
+    sentences = [f"{topic}（条目{index}）{rng.choice(VERBS)}{rng.choice(OBJECTS)}。"]
+    for _ in range(rng.randint(1, 3)):
+        sentences.append(f"{rng.choice(CONNECTORS)}，{topic}{rng.choice(VERBS)}{rng.choice(OBJECTS)}。")
+    return "".join(sentences)
+
+
+def generate_corpus(n, seed=42):
+    """生成 n 个段落（生成器，避免一次性占用大量内存）"""
+    rng = random.Random(seed)
+    for i in range(n):
+        yield generate_paragraph(rng, i)
+
+
+def write_corpus(path, n, seed=42):
+    """写成与 load_documents_from_file 兼容的格式：段落之间空一行"""
+    with open(path, "w", encoding="utf-8") as f:
+        for i, paragraph in enumerate(generate_corpus(n, seed)):
+            if i:
+                f.write("\n\n")
+            f.write(paragraph)
+    return path
+
+
+def generate_questions(paragraphs, n, seed=7):
+    """从语料中抽样生成问题，返回 [(问题, 相关段落下标)]"""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(n):
+        idx = rng.randrange(len(paragraphs))
+        first_sentence = paragraphs[idx].split("。")[0]
+        questions.append((f"{first_sentence}是什么意思？", idx))
+    return questions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成语料")
+    parser.add_argument("path")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    write_corpus(args.path, args.chunks, args.seed)
+    print(f"✅ 已生成 {args.chunks} 个段落: {args.path}")
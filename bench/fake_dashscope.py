@@ -0,0 +1,233 @@
+"""
+    本地假 DashScope 服务 - 模拟 Embedding 与文本生成接口，用于离线压测
+
+支持：可配置延迟、QPS 上限（超出返回 429）、随机错误率、确定性的伪 embedding、模拟前缀缓存。
+伪 embedding 复用 src.embeddings.hash_embedding（字符 n-gram 哈希），文字重叠越多向量越接近，检索结果有意义。
+
+单独启动：
+    python -m bench.fake_dashscope --port 8089 --embed-latency-ms 20 --gen-latency-ms 300
+然后在被测进程中设置：
+    dashscope.base_http_api_url = "http://127.0.0.1:8089/api/v1"
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.embeddings import hash_embedding
+
+EMBEDDING_PATH = "/api/v1/services/embeddings/text-embedding/text-embedding"
+GENERATION_PATH = "/api/v1/services/aigc/text-generation/generation"
+DEFAULT_DIMENSION = 1024
+PREFIX_CACHE_BLOCK = 64  # 模拟前缀缓存的粒度（字符数），与真实服务按块缓存 KV 的方式类似
+
+
+# ==================== 限流 ====================
+class TokenBucket:
+    """简单令牌桶，rate<=0 表示不限流"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+# ==================== 服务端 ====================
+class FakeDashScopeServer:
+    """本地假 DashScope 服务，可作为上下文管理器在后台线程中运行"""
+
+    def __init__(self, host="127.0.0.1", port=0, embed_latency_ms=0.0, gen_latency_ms=0.0,
+                 latency_jitter=0.0, max_qps=0, error_rate=0.0, dimension=DEFAULT_DIMENSION, seed=0,
+                 prefix_cache=True):
+        self.embed_latency_ms = embed_latency_ms
+        self.gen_latency_ms = gen_latency_ms
+        self.latency_jitter = latency_jitter  # 延迟的相对抖动，0.2 表示 ±20%
+        self.error_rate = error_rate
+        self.dimension = dimension
+        self.prefix_cache = prefix_cache
+        self.prefix_blocks = set()  # 见过的提示词前缀（按块）的哈希
+        self.bucket = TokenBucket(max_qps)
+        self.random = random.Random(seed)
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {"embedding_calls": 0, "embedding_texts": 0, "generation_calls": 0,
+                          "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "throttled": 0,
+                          "errors": 0}
+
+    def snapshot_stats(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def _count(self, **deltas):
+        with self.stats_lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _sleep(self, latency_ms):
+        if latency_ms <= 0:
+            return
+        jitter = 1.0 + self.random.uniform(-self.latency_jitter, self.latency_jitter)
+        time.sleep(latency_ms * jitter / 1000)
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- 业务处理 ----------
+    def handle_embedding(self, body):
+        texts = body["input"]["texts"]
+        dim = body.get("parameters", {}).get("dimension") or self.dimension
+        self._sleep(self.embed_latency_ms)
+        self._count(embedding_calls=1, embedding_texts=len(texts))
+        embeddings = [{"text_index": i, "embedding": hash_embedding(t, dim).tolist()}
+                      for i, t in enumerate(texts)]
+        tokens = sum(len(t) for t in texts)
+        return {"output": {"embeddings": embeddings}, "usage": {"total_tokens": tokens}}
+
+    def _cached_prefix(self, prompt):
+        """返回与之前某个请求逐字相同的前缀长度（整块计），并登记本次请求的所有前缀块"""
+        if not self.prefix_cache:
+            return 0
+        hashes = [hash(prompt[:end]) for end in range(PREFIX_CACHE_BLOCK, len(prompt) + 1, PREFIX_CACHE_BLOCK)]
+        with self.stats_lock:
+            cached = 0
+            for h in hashes:
+                if h not in self.prefix_blocks:
+                    break
+                cached += PREFIX_CACHE_BLOCK
+            self.prefix_blocks.update(hashes)
+        return cached
+
+    def handle_generation(self, body):
+        data = body["input"]
+        if "messages" in data:
+            prompt = "\n".join(m.get("content", "") for m in data["messages"])
+            user_content = [m.get("content", "") for m in data["messages"] if m.get("role") == "user"]
+            question_part = user_content[-1] if user_content else prompt
+        else:
+            prompt = question_part = data.get("prompt", "")
+        cached = self._cached_prefix(prompt)
+        # 命中缓存的前缀不需要重新计算，按比例缩短首 token 前的处理时间（最多省一半）
+        self._sleep(self.gen_latency_ms * (1 - 0.5 * cached / max(len(prompt), 1)))
+
+        # 回答取用户消息中背景知识（第一个以"："结尾的标题行之后）的第一句，保证输出确定且和检索结果相关
+        match = re.search(r"：\n+(.+?[。！？；\n])", question_part)
+        answer = "根据资料：" + (match.group(1).strip() if match else question_part[:50])
+        input_tokens, output_tokens = len(prompt), len(answer)
+        self._count(generation_calls=1, input_tokens=input_tokens, cached_tokens=cached,
+                    output_tokens=output_tokens)
+        return {
+            "output": {"choices": [{"finish_reason": "stop",
+                                    "message": {"role": "assistant", "content": answer}}]},
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                      "total_tokens": input_tokens + output_tokens,
+                      "prompt_tokens_details": {"cached_tokens": cached}},
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # 头和体分两次写，不关 Nagle 会叠加 40ms 的延迟 ACK
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, status, payload):
+                payload.setdefault("request_id", uuid.uuid4().hex)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                routes = {EMBEDDING_PATH: server.handle_embedding,
+                          GENERATION_PATH: server.handle_generation}
+                handler = routes.get(self.path.split("?")[0])
+                if handler is None:
+                    self._reply(404, {"code": "NotFound", "message": self.path})
+                    return
+                if not server.bucket.try_acquire():
+                    server._count(throttled=1)
+                    self._reply(429, {"code": "Throttling", "message": "Requests rate limit exceeded"})
+                    return
+                if server.error_rate > 0 and server.random.random() < server.error_rate:
+                    server._count(errors=1)
+                    self._reply(500, {"code": "InternalError", "message": "injected error"})
+                    return
+                self._reply(200, handler(body))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 DashScope 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--gen-latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--max-qps", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION)
+    args = parser.parse_args()
+
+    server = FakeDashScopeServer(args.host, args.port, args.embed_latency_ms, args.gen_latency_ms,
+                                 args.latency_jitter, args.max_qps, args.error_rate, args.dimension)
+    print(f"🚀 假 DashScope 服务已启动: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,22 +6,26 @@ git版本1.2.0
 
 使用前需要安装：
 pip install dashscope chromadb
-"""
-import chromadb
 
-from src.rag_core import (
-    initialize_vector_database,
-    ask_question,
-    ask_question_with_history,
-    conversation_history,
-    get_recent_history,
-    VECTOR_DB_NAME
-)
+命令行（各子命令只在运行时才导入自己需要的重量级模块，查看帮助几乎不花启动时间）：
+    python main.py                      运行演示问题集
+    python main.py ingest [--rebuild]   入库（--rebuild 蓝绿重建并切换）
+    python main.py query "问题"          只检索，打印命中的段落
+    python main.py ask "问题"            检索 + 生成答案；不带问题时进入交互模式
+    python main.py serve --port 8000    启动 HTTP 服务
+    python main.py bench e2e --sizes 1000
+    python main.py clear                清理向量数据库
+"""
+import argparse
+import sys
 
 
 # ==================== 测试函数 ====================
 def run_test_questions(questions, use_history=False):
     """运行测试问题集"""
+    from src.generation import GenerationError
+    from src.rag_core import ask_question, ask_question_with_history, get_recent_history
+
     print("\n" + "=" * 60)
     print("🤖 RAG 问答系统测试开始")
     print("=" * 60 + "\n")
@@ -29,10 +33,14 @@ def run_test_questions(questions, use_history=False):
     for i, q in enumerate(questions, 1):
         print(f"\n[{i}/{len(questions)}] 问题: {q}")
 
-        if use_history:
-            answer = ask_question_with_history(q)
-        else:
-            answer = ask_question(q)
+        try:
+            if use_history:
+                answer = ask_question_with_history(q)
+            else:
+                answer = ask_question(q)
+        except GenerationError as e:
+            print(f"❌ 调用失败: {e}")
+            continue
 
         print(f"💡 答案: {answer}")
         print("-" * 50)
@@ -43,20 +51,24 @@ def run_test_questions(questions, use_history=False):
 
 # ==================== 清理函数 ====================
 def clear_vector_database():
-    """清理向量数据库"""
-    global collection
-    client = chromadb.Client()
+    """清理向量数据库：别名的当前版本和所有已下线的旧版本（集合、检查点、段落文本库）"""
+    from src.config import VECTOR_DB_NAME
+    from src.index_registry import get_index_registry
 
+    global collection
     try:
-        client.delete_collection(name=VECTOR_DB_NAME)
+        versions = get_index_registry().drop_alias(VECTOR_DB_NAME)
         collection = None
-        print(f"🗑️  已清理集合: {VECTOR_DB_NAME}")
+        print(f"🗑️  已清理集合: {', '.join(versions)}")
     except Exception as e:
         print(f"清理失败: {e}")
 
 
-# ==================== 主程序 ====================
-if __name__ == "__main__":
+# ==================== 演示 ====================
+def run_demo():
+    from src.rag_core import conversation_history, initialize_vector_database
+
+    global collection
 
     # 重新开始时清理：
     clear_vector_database()
@@ -86,3 +98,106 @@ if __name__ == "__main__":
     run_test_questions(test_questions[:3], use_history=True)  # 只测试前3个
 
     print("\n🎉 测试完成！")
+
+
+# ==================== 子命令 ====================
+def cmd_ingest(args):
+    from src.config import KNOWLEDGE_FILE, VECTOR_DB_NAME
+
+    file_path, collection_name = args.file or KNOWLEDGE_FILE, args.collection or VECTOR_DB_NAME
+    if args.rebuild:
+        from src.index_registry import rebuild_index
+        report = rebuild_index(collection_name, file_path)
+        print(f"🔀 {report['alias']} → {report['version']}（{report['count']} 段）")
+    else:
+        from src.rag_core import initialize_vector_database
+        collection = initialize_vector_database(file_path, collection_name)
+        print(f"📦 {collection.name}: {collection.count()} 段")
+
+
+def cmd_query(args):
+    from src.rag_core import get_collection, retrieve_documents
+
+    results = retrieve_documents(get_collection(), args.question, args.top_k)
+    for rank, (doc_id, doc, distance) in enumerate(
+            zip(results["ids"][0], results["documents"][0], results["distances"][0]), 1):
+        print(f"{rank}. [{doc_id}] ({distance:.4f}) {doc[:100]}")
+
+
+def cmd_ask(args):
+    if args.question:
+        run_test_questions(args.question)
+        return
+    from src.generation import GenerationError
+    from src.rag_core import ask_question_with_history
+
+    print("💬 输入问题后回车，Ctrl-D 退出")
+    for line in sys.stdin:
+        question = line.strip()
+        if not question:
+            continue
+        try:
+            print(f"💡 {ask_question_with_history(question)}")
+        except GenerationError as e:
+            print(f"❌ 调用失败: {e}")
+
+
+def cmd_serve(args):
+    from src.server import serve
+    serve(args.host, args.port)
+
+
+def cmd_bench(args):
+    import importlib
+
+    module = importlib.import_module(f"bench.bench_{args.name}")
+    sys.argv = [f"bench.bench_{args.name}", *args.bench_args]
+    module.main()
+
+
+def cmd_clear(args):
+    clear_vector_database()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="基于文档的 RAG 问答系统；不带子命令时运行演示")
+    subparsers = parser.add_subparsers(dest="command")
+
+    # 默认值在这里写死而不是从 src.config 读取，避免查看帮助时也要导入配置之外的模块
+    ingest = subparsers.add_parser("ingest", help="把知识文件写入向量数据库")
+    ingest.add_argument("--file", default=None, help="知识文件，默认 KNOWLEDGE_FILE")
+    ingest.add_argument("--collection", default=None, help="集合（别名），默认 VECTOR_DB_NAME")
+    ingest.add_argument("--rebuild", action="store_true", help="蓝绿重建：建新版本、校验后切换别名")
+    ingest.set_defaults(func=cmd_ingest)
+
+    query = subparsers.add_parser("query", help="只检索，不调用生成模型")
+    query.add_argument("question")
+    query.add_argument("--top-k", type=int, default=3)
+    query.set_defaults(func=cmd_query)
+
+    ask = subparsers.add_parser("ask", help="问答；不带问题时从标准输入逐行读取")
+    ask.add_argument("question", nargs="*")
+    ask.set_defaults(func=cmd_ask)
+
+    serve = subparsers.add_parser("serve", help="启动 HTTP 服务")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.set_defaults(func=cmd_serve)
+
+    bench = subparsers.add_parser("bench", help="运行 bench/bench_<name>.py，其余参数原样传递")
+    bench.add_argument("name", help="e2e / logging / dimension / shards ...")
+    bench.add_argument("bench_args", nargs=argparse.REMAINDER)
+    bench.set_defaults(func=cmd_bench)
+
+    clear = subparsers.add_parser("clear", help="清理向量数据库")
+    clear.set_defaults(func=cmd_clear)
+    return parser
+
+
+# ==================== 主程序 ====================
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    if args.command is None:
+        run_demo()
+    else:
+        args.func(args)
@@ -0,0 +1,271 @@
+"""
+    离线批量问答 - 批量检索 → 写 JSONL 批处理文件 → 提交批处理任务 → 轮询 → 按 custom_id 取回答案
+
+适合夜间预计算 FAQ：吞吐由服务商的批处理能力决定，而不是我们逐条请求的往返延迟。
+批处理文件使用 OpenAI 兼容格式（DashScope 批处理接口同样接受）。
+
+    python -m src.batch data/faq_questions.txt --output data/faq_answers.jsonl              # 本地替身
+    python -m src.batch data/faq_questions.txt --output data/faq_answers.jsonl --backend dashscope
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import (BATCH_COMPLETION_WINDOW, BATCH_DIR, BATCH_POLL_INTERVAL, DASHSCOPE_API_KEY,
+                        DASHSCOPE_COMPATIBLE_BASE_URL, INGEST_BATCH_SIZE, TEACHER_PROMPT_TEMPLATE,
+                        TOP_K_RESULTS)
+from src.generation import GenerationError, get_generation_client
+from src.logger import get_logger
+from src.prompts import build_messages, order_chunks
+from src.quota import LANE_BULK, quota_lane
+from src.router import ROUTE_EXTRACTIVE, get_router
+
+logger = get_logger("batch")
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchJobError(Exception):
+    """批处理任务失败、过期或被取消"""
+
+
+# ==================== 批处理文件 ====================
+def read_questions(path):
+    """每行一个问题；.jsonl 文件则读取每行的 question 字段"""
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                questions.append(json.loads(line)["question"] if path.endswith(".jsonl") else line)
+    return questions
+
+
+def retrieve_all(collection, questions, top_k=TOP_K_RESULTS, batch_size=INGEST_BATCH_SIZE):
+    """问题按批查询：一次 embedding 调用、一次索引查询处理 batch_size 个问题，避免逐条往返"""
+    results = []
+    for start in range(0, len(questions), batch_size):
+        batch = questions[start:start + batch_size]
+        with quota_lane(LANE_BULK):
+            found = collection.query(query_texts=batch, n_results=top_k)
+        for i in range(len(batch)):
+            results.append({key: [found[key][i]] for key in ("ids", "documents", "distances")})
+    return results
+
+
+def build_batch_requests(questions, retrieved, prompt_template=TEACHER_PROMPT_TEMPLATE):
+    """返回 (批处理请求列表, 已直接得出的答案 {custom_id: 记录})；抽取式路由的问题不进入批处理"""
+    router = get_router()
+    requests, answered = [], {}
+    for i, (question, results) in enumerate(zip(questions, retrieved)):
+        custom_id = f"q-{i}"
+        decision = router.route(question, results, prompt_template)
+        if decision.route == ROUTE_EXTRACTIVE:
+            answered[custom_id] = {"question": question, "answer": results["documents"][0][0],
+                                   "route": decision.route, "model": None, "error": None}
+            continue
+        documents = order_chunks(results["ids"][0], results["documents"][0])
+        requests.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {"model": decision.model,
+                     "messages": build_messages("\n".join(documents), question, prompt_template)},
+        })
+    return requests, answered
+
+
+def write_jsonl(path, records):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+
+def read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ==================== 批处理后端 ====================
+class LocalBatchBackend:
+    """本地替身：在后台线程里用生成客户端并发处理批处理文件，输出格式与服务商一致，便于测试整个流程"""
+
+    def __init__(self, client=None, workers=4, work_dir=BATCH_DIR):
+        self.client = client or get_generation_client()
+        self.workers = workers
+        self.work_dir = work_dir
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, input_path):
+        job_id = f"local-{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.jobs[job_id] = {"status": "in_progress", "output_path": None, "completed": 0, "failed": 0}
+        threading.Thread(target=self._run, args=(job_id, input_path), name=f"batch-{job_id}", daemon=True).start()
+        return job_id
+
+    def status(self, job_id):
+        with self.lock:
+            return dict(self.jobs[job_id])
+
+    def download(self, job_id, output_path):
+        with open(self.status(job_id)["output_path"], 'r', encoding='utf-8') as src, \
+                open(output_path, 'w', encoding='utf-8') as dst:
+            dst.write(src.read())
+        return output_path
+
+    def _run(self, job_id, input_path):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                outputs = list(pool.map(self._answer, read_jsonl(input_path)))
+            output_path = write_jsonl(os.path.join(self.work_dir, f"{job_id}.output.jsonl"), outputs)
+            failed = sum(1 for o in outputs if o["error"])
+            with self.lock:
+                self.jobs[job_id].update(status="completed", output_path=output_path,
+                                         completed=len(outputs) - failed, failed=failed)
+        except Exception as e:
+            logger.exception("本地批处理任务 %s 失败", job_id)
+            with self.lock:
+                self.jobs[job_id].update(status="failed", error=str(e))
+
+    def _answer(self, request):
+        body = request["body"]
+        try:
+            with quota_lane(LANE_BULK):  # 线程池里的线程不继承调用方的通道，这里单独设置
+                result = self.client.generate(messages=body["messages"], model=body["model"])
+        except GenerationError as e:
+            return {"custom_id": request["custom_id"], "response": None,
+                    "error": {"code": type(e).__name__, "message": str(e)}}
+        return {"custom_id": request["custom_id"], "error": None, "response": {
+            "status_code": 200,
+            "body": {"model": result.model, "usage": result.usage,
+                     "choices": [{"message": {"role": "assistant", "content": result.text}}]},
+        }}
+
+
+class DashScopeBatchBackend:
+    """DashScope 的 OpenAI 兼容批处理接口；需要 pip install openai"""
+
+    def __init__(self, api_key=DASHSCOPE_API_KEY, base_url=DASHSCOPE_COMPATIBLE_BASE_URL,
+                 completion_window=BATCH_COMPLETION_WINDOW):
+        try:
+            from openai import OpenAI
+        except ImportError as e:
+            raise ImportError("DashScope 批处理需要 openai SDK（pip install openai）") from e
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.completion_window = completion_window
+
+    def submit(self, input_path):
+        with open(input_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        job = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                         completion_window=self.completion_window)
+        return job.id
+
+    def status(self, job_id):
+        job = self.client.batches.retrieve(job_id)
+        counts = job.request_counts
+        return {"status": job.status, "output_file_id": job.output_file_id, "error_file_id": job.error_file_id,
+                "completed": counts.completed if counts else 0, "failed": counts.failed if counts else 0}
+
+    def download(self, job_id, output_path):
+        state = self.status(job_id)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for file_id in (state["output_file_id"], state["error_file_id"]):
+                if file_id:
+                    f.write(self.client.files.content(file_id).text)
+        return output_path
+
+
+def get_batch_backend(name="local"):
+    if name == "local":
+        return LocalBatchBackend()
+    if name == "dashscope":
+        return DashScopeBatchBackend()
+    raise ValueError(f"未知的批处理后端: {name}")
+
+
+# ==================== 批量问答流程 ====================
+def wait_for_job(backend, job_id, poll_interval=BATCH_POLL_INTERVAL, timeout=None):
+    """轮询直到任务结束；失败/过期/取消时抛出 BatchJobError"""
+    started = time.monotonic()
+    while True:
+        state = backend.status(job_id)
+        if state["status"] in TERMINAL_STATUSES:
+            break
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise BatchJobError(f"批处理任务 {job_id} 等待超时（{timeout}s）")
+        logger.info("⏳ 批处理任务 %s: %s（完成 %d，失败 %d）", job_id, state["status"],
+                    state.get("completed", 0), state.get("failed", 0))
+        time.sleep(poll_interval)
+    if state["status"] != "completed":
+        raise BatchJobError(f"批处理任务 {job_id} 结束状态为 {state['status']}: {state.get('error', '')}")
+    return state
+
+
+def parse_batch_output(records):
+    """{custom_id: (答案, 模型, 错误信息)}"""
+    parsed = {}
+    for record in records:
+        response, error = record.get("response"), record.get("error")
+        if response and response.get("status_code") == 200:
+            body = response["body"]
+            parsed[record["custom_id"]] = (body["choices"][0]["message"]["content"], body.get("model"), None)
+        else:
+            parsed[record["custom_id"]] = (None, None, (error or {}).get("message") or str(response))
+    return parsed
+
+
+def run_batch(questions, collection=None, backend=None, prompt_template=TEACHER_PROMPT_TEMPLATE,
+              work_dir=BATCH_DIR, poll_interval=BATCH_POLL_INTERVAL, timeout=None):
+    """返回与 questions 一一对应的 [{"question", "answer", "route", "model", "error"}]"""
+    if collection is None:
+        from src.rag_core import get_collection
+        collection = get_collection()
+    backend = backend or LocalBatchBackend(work_dir=work_dir)
+
+    retrieved = retrieve_all(collection, questions)
+    requests, answered = build_batch_requests(questions, retrieved, prompt_template)
+    logger.info("📝 %d 个问题：%d 个直接抽取作答，%d 个进入批处理", len(questions), len(answered), len(requests))
+
+    if requests:
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        input_path = write_jsonl(os.path.join(work_dir, f"batch_{stamp}.input.jsonl"), requests)
+        job_id = backend.submit(input_path)
+        logger.info("🚚 已提交批处理任务 %s: %s", job_id, input_path)
+        wait_for_job(backend, job_id, poll_interval, timeout)
+        output_path = backend.download(job_id, os.path.join(work_dir, f"batch_{stamp}.output.jsonl"))
+        parsed = parse_batch_output(read_jsonl(output_path))
+        for request in requests:
+            custom_id = request["custom_id"]
+            answer, model, error = parsed.get(custom_id, (None, None, "批处理结果中缺少该请求"))
+            answered[custom_id] = {"question": questions[int(custom_id[2:])], "answer": answer,
+                                   "route": "batch", "model": model or request["body"]["model"], "error": error}
+
+    return [answered[f"q-{i}"] for i in range(len(questions))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量问答")
+    parser.add_argument("questions", help="问题文件：每行一个问题，或 .jsonl（question 字段）")
+    parser.add_argument("--output", required=True, help="答案输出 JSONL")
+    parser.add_argument("--backend", default="local", choices=["local", "dashscope"])
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    results = run_batch(questions, backend=get_batch_backend(args.backend), poll_interval=args.poll_interval)
+    write_jsonl(args.output, results)
+    failed = sum(1 for r in results if r["error"])
+    print(f"✅ {len(results)} 个问题已作答（失败 {failed}）: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+    只读段落文本库 - 所有段落的 UTF-8 字节拼成一个 blob 文件 + 一个偏移数组，用 mmap 打开
+
+多个 worker 进程打开同一份文件时共享操作系统页缓存，不会各自复制一份语料；
+打开时不解析任何内容，按 id 取文本只是一次二分查找 + 切片 + 解码，几 GB 的语料也能秒级启动。
+
+文本库从集合里实际存着的段落生成（不管它们来自哪个文件、后台入库还是快照），
+并在元数据里记下生成时的集合与条数；条数对不上说明集合之后又写入过，需要重建。
+库里找不到的 id 由调用方回退到 Chroma 读取。
+
+每个集合一个目录，每次生成写一组新的带代号文件，写完后原子替换 CURRENT 指针：
+    CHUNK_STORE_DIR/<集合>/CURRENT                 当前代号
+    CHUNK_STORE_DIR/<集合>/<代号>.chunks.bin       段落 UTF-8 字节
+    CHUNK_STORE_DIR/<集合>/<代号>.ids.npy          按 id 排序的 id 数组
+    CHUNK_STORE_DIR/<集合>/<代号>.offsets.npy      (条数, 2) 的起止偏移
+    CHUNK_STORE_DIR/<集合>/<代号>.meta.json        {collection, count, chunks, bytes}
+读取方只通过指针打开同一代的文件，并核对各文件的条数与字节数，对不上时拒绝使用、回退到 Chroma，
+不会把新 id 和旧偏移拼在一起返回错误的段落。
+
+为某个集合（别名）建库：
+    python -m src.chunk_store --collection my_docs
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from src.config import CHUNK_STORE_DIR, VECTOR_DB_NAME
+from src.logger import get_logger
+
+logger = get_logger("chunk_store")
+
+CURRENT_FILE = "CURRENT"
+BLOB_SUFFIX = ".chunks.bin"
+OFFSETS_SUFFIX = ".offsets.npy"
+IDS_SUFFIX = ".ids.npy"
+META_SUFFIX = ".meta.json"
+_SUFFIXES = (BLOB_SUFFIX, OFFSETS_SUFFIX, IDS_SUFFIX, META_SUFFIX)
+_PAGE_SIZE = 5000        # 从集合分页读取段落的每页条数
+_OLD_GENERATION_KEEP = 60  # 旧代号的文件至少保留多少秒再删，刚读到旧指针的进程还来得及打开
+
+
+class ChunkStoreError(ValueError):
+    """文本库文件缺失或彼此对不上（例如读到了一半新一半旧的文件）"""
+
+
+# ==================== 路径 ====================
+def chunk_store_path(collection_name):
+    """文本库目录；未配置 CHUNK_STORE_DIR 时返回 None（段落文本仍从 Chroma 读取）"""
+    if not CHUNK_STORE_DIR:
+        return None
+    return os.path.join(CHUNK_STORE_DIR, collection_name)
+
+
+def current_generation(path):
+    """当前代号的文件前缀；还没有生成过时返回 None"""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            generation = f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return os.path.join(path, generation) if generation else None
+
+
+def _read_meta(prefix):
+    with open(prefix + META_SUFFIX, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# ==================== 构建 ====================
+def build_chunk_store(collection, path):
+    """把集合里的段落流式写出为新一代的 blob + 按 id 排序的 id 数组与偏移数组，写完后原子切换 CURRENT，
+    正在读旧文件的进程不受影响
+
+    排序后第 i 个 id 的文本是 blob[offsets[i, 0]:offsets[i, 1]]。没有原文的记录不写入。
+    """
+    os.makedirs(path, exist_ok=True)
+    generation = str(time.time_ns())
+    prefix = os.path.join(path, generation)
+    rows = []   # (id, 在 blob 中的起点, 终点)
+    position = 0
+    with open(prefix + BLOB_SUFFIX, "wb") as blob:
+        offset = 0
+        while True:
+            page = collection.get(limit=_PAGE_SIZE, offset=offset, include=["documents"])
+            if not page["ids"]:
+                break
+            for doc_id, document in zip(page["ids"], page["documents"]):
+                if document is None:
+                    continue
+                data = document.encode("utf-8")
+                blob.write(data)
+                rows.append((doc_id, position, position + len(data)))
+                position += len(data)
+            offset += len(page["ids"])
+        blob.flush()
+        os.fsync(blob.fileno())
+
+    # 按 id 排序后写成连续数组：读取时二分查找，不需要在打开时建字典
+    rows.sort()
+    ids = np.array([r[0] for r in rows], dtype=str if rows else "U1")
+    bounds = np.array([(r[1], r[2]) for r in rows], dtype=np.uint64).reshape(-1, 2)
+    for suffix, array in ((IDS_SUFFIX, ids), (OFFSETS_SUFFIX, bounds)):
+        with open(prefix + suffix, "wb") as f:
+            np.save(f, array)
+    with open(prefix + META_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump({"collection": collection.name, "count": collection.count(), "chunks": len(rows),
+                   "bytes": position}, f)
+
+    # 同一代的文件都写完后才切换指针：读取方要么看到完整的旧一代，要么看到完整的新一代
+    tmp_path = os.path.join(path, CURRENT_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(tmp_path, os.path.join(path, CURRENT_FILE))
+    _remove_old_generations(path, generation)
+    logger.info("📦 已生成段落文本库: %s (%d 段, %d 字节)", prefix, len(rows), position)
+    return path
+
+
+def _remove_old_generations(path, keep):
+    for name in os.listdir(path):
+        generation = name.split(".", 1)[0]
+        if name.startswith(CURRENT_FILE) or generation == keep:
+            continue
+        file_path = os.path.join(path, name)
+        try:
+            if time.time() - os.path.getmtime(file_path) > _OLD_GENERATION_KEEP:
+                os.remove(file_path)
+        except OSError:
+            pass  # Windows 上其它进程还映射着旧文件时删不掉，下次生成再删
+
+
+def remove_chunk_store(path):
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def chunk_store_exists(path):
+    return bool(path) and current_generation(path) is not None
+
+
+def chunk_store_is_current(path, collection):
+    """文本库由这个集合生成、且之后集合没有再增删段落"""
+    prefix = current_generation(path) if path else None
+    if prefix is None:
+        return False
+    try:
+        meta = _read_meta(prefix)
+    except (OSError, ValueError):
+        return False
+    return meta.get("collection") == collection.name and meta.get("count") == collection.count()
+
+
+# ==================== 读取 ====================
+class ChunkStore:
+    """按 id 读取段落文本；blob 与偏移数组都是只读映射，可被多个进程共享"""
+
+    def __init__(self, path):
+        """打开 path 目录当前一代的文件；文件缺失或彼此对不上时抛出 ChunkStoreError"""
+        self.path = path
+        self.prefix = current_generation(path)
+        if self.prefix is None:
+            raise ChunkStoreError(f"{path} 没有文本库")
+        try:
+            meta = _read_meta(self.prefix)
+            self.ids = np.load(self.prefix + IDS_SUFFIX, mmap_mode="r")
+            self.offsets = np.load(self.prefix + OFFSETS_SUFFIX, mmap_mode="r")
+            self._file = open(self.prefix + BLOB_SUFFIX, "rb")
+        except (OSError, ValueError) as e:
+            raise ChunkStoreError(f"{self.prefix} 无法打开: {e}") from e
+        size = os.fstat(self._file.fileno()).st_size
+        chunks = len(self.ids)
+        if (self.offsets.ndim != 2 or self.offsets.shape != (chunks, 2) or meta.get("chunks") != chunks
+                or meta.get("bytes", size) != size or (chunks and int(self.offsets[:, 1].max()) > size)):
+            self._file.close()
+            raise ChunkStoreError(f"{self.prefix} 的 id、偏移与 blob 对不上（{chunks} 个 id，"
+                                  f"偏移 {self.offsets.shape}，元数据 {meta.get('chunks')} 段，blob {size} 字节）")
+        # 空文件无法 mmap，用空字节串代替
+        self.blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_bytes(self, doc_id):
+        """库里没有该 id 时返回 None"""
+        i = int(np.searchsorted(self.ids, doc_id))
+        if i == len(self.ids) or self.ids[i] != doc_id:
+            return None
+        start, end = self.offsets[i]
+        return self.blob[int(start):int(end)]
+
+    def get(self, doc_id):
+        data = self.get_bytes(doc_id)
+        return data.decode("utf-8") if data is not None else None
+
+    def get_many(self, doc_ids):
+        """按顺序返回文本，库里没有的 id 对应 None"""
+        return [self.get(doc_id) for doc_id in doc_ids]
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+        self._file.close()
+
+
+_stores = {}  # 目录 -> (CURRENT 指针的 (inode, mtime), ChunkStore 或 None)
+_stores_lock = threading.Lock()
+
+
+def _pointer_key(path):
+    try:
+        stat = os.stat(os.path.join(path, CURRENT_FILE))
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def get_chunk_store(collection_name):
+    """按集合名缓存已打开的文本库；未配置、文件不存在或文件对不上时返回 None（调用方回退到 Chroma）
+
+    其它进程重新生成后指针会变，下一次调用打开新一代；旧一代不主动关闭，正在读它的线程不受影响。
+    """
+    path = chunk_store_path(collection_name)
+    if not path:
+        return None
+    key = _pointer_key(path)
+    if key is None:
+        return None
+    cached = _stores.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _stores_lock:
+        cached = _stores.get(path)
+        if cached is None or cached[0] != key:
+            try:
+                store = ChunkStore(path)
+            except ChunkStoreError as e:
+                logger.warning("⚠️ 段落文本库不可用，改从 Chroma 读取: %s", e)
+                store = None
+            cached = _stores[path] = (key, store)
+    return cached[1]
+
+
+def close_chunk_store(collection_name):
+    path = chunk_store_path(collection_name)
+    with _stores_lock:
+        cached = _stores.pop(path, None)
+    if cached is not None and cached[1] is not None:
+        cached[1].close()
+
+
+def main():
+    from src.index_registry import get_index_registry
+    from src.vector_store import open_collection
+
+    parser = argparse.ArgumentParser(description="从集合生成 mmap 段落文本库")
+    parser.add_argument("--collection", default=VECTOR_DB_NAME, help="集合别名，使用它当前上线的版本")
+    parser.add_argument("--output", default=None, help="文本库目录，默认 CHUNK_STORE_DIR/<版本名>")
+    args = parser.parse_args()
+
+    version = get_index_registry().resolve(args.collection)
+    path = args.output or chunk_store_path(version)
+    if not path:
+        parser.error("未配置 CHUNK_STORE_DIR，请用 --output 指定文本库目录")
+    build_chunk_store(open_collection(version), path)
+    store = ChunkStore(path)
+    print(f"📦 {path}: {len(store)} 段")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+    抽取式上下文压缩 - 把检索到的段落切成句子，按与问题的相似度只保留最相关的句子，
+    在字数预算内拼成上下文，减少送进大模型的 prompt tokens
+
+句子 embedding 存在有上限的 LRU（COMPRESSION_CACHE_SIZE）里，同一段落被反复检索到时不会重复调用 API；
+问题向量走 embed_query，直接命中检索时已经算好的问题向量缓存。打分是一次矩阵乘法。
+"""
+import json
+import re
+
+import numpy as np
+
+from src.config import COMPRESSION_BUDGET_CHARS, COMPRESSION_MIN_SENTENCES, INGEST_BATCH_SIZE
+from src.embeddings import get_embedding_function
+from src.logger import get_logger
+from src.metrics import metrics
+from src.query_cache import get_sentence_embedding_cache
+
+logger = get_logger("compression")
+
+# 句末标点（中英文）之后断句，标点保留在句子里；换行也视为句子边界
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;])|\n+")
+
+
+# ==================== 分句 ====================
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+# ==================== 压缩器 ====================
+class ContextCompressor:
+    """按问题相关度挑选句子；保留句子在原文中的先后顺序，读起来仍然连贯"""
+
+    def __init__(self, embedding_function=None, budget_chars=COMPRESSION_BUDGET_CHARS,
+                 min_sentences=COMPRESSION_MIN_SENTENCES):
+        self.embedding_function = embedding_function or get_embedding_function()
+        self.budget_chars = budget_chars
+        self.min_sentences = min_sentences
+
+    def _embed(self, texts):
+        """已缓存的句子不会再请求；其余去重后按 API 单次上限分批"""
+        cache = get_sentence_embedding_cache()
+        model = json.dumps(self.embedding_function.embedding_metadata(), sort_keys=True)
+        rows = {text: cache.get((model, text)) for text in texts}
+        missing = [text for text, row in rows.items() if row is None]
+        for start in range(0, len(missing), INGEST_BATCH_SIZE):
+            batch = missing[start:start + INGEST_BATCH_SIZE]
+            for text, row in zip(batch, self.embedding_function.embed_documents(batch)):
+                rows[text] = np.asarray(row, dtype=np.float32)
+                cache.set((model, text), rows[text])
+        return np.stack([rows[text] for text in texts])
+
+    def compress(self, question, documents, budget_chars=None):
+        """返回 (压缩后的上下文, 统计信息)"""
+        budget_chars = budget_chars or self.budget_chars
+        original = "\n".join(documents)
+        sentences = [(d, s) for d, doc in enumerate(documents) for s in split_sentences(doc)]
+        if len(original) <= budget_chars or len(sentences) <= self.min_sentences:
+            return original, self._stats(original, original, len(sentences), len(sentences))
+
+        texts = [s for _, s in sentences]
+        vectors = self._embed(texts)
+        query = np.asarray(self.embedding_function.embed_query([question])[0], dtype=np.float32)
+        # 余弦相似度：一次矩阵乘法给所有句子打分
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = vectors @ query / np.where(norms > 0, norms, 1.0)
+
+        kept, used = [], 0
+        for i in np.argsort(-scores):
+            length = len(texts[i])
+            if len(kept) >= self.min_sentences and used + length > budget_chars:
+                continue
+            kept.append(i)
+            used += length
+
+        kept.sort()
+        # 同一段落的句子接在一起，不同段落之间换行，与原来的上下文格式一致
+        paragraphs = {}
+        for i in kept:
+            doc_index, sentence = sentences[i]
+            paragraphs.setdefault(doc_index, []).append(sentence)
+        compressed = "\n".join("".join(paragraph) for paragraph in paragraphs.values())
+        return compressed, self._stats(original, compressed, len(kept), len(sentences))
+
+    @staticmethod
+    def _stats(original, compressed, kept, total):
+        ratio = len(compressed) / len(original) if original else 1.0
+        metrics.observe("compression.ratio_pct", ratio * 100)
+        return {"original_chars": len(original), "compressed_chars": len(compressed), "ratio": ratio,
+                "sentences_kept": kept, "sentences_total": total}
+
+
+_compressor = None
+
+
+def get_compressor():
+    global _compressor
+    if _compressor is None:
+        _compressor = ContextCompressor()
+    return _compressor
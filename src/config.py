@@ -34,15 +34,191 @@ TEACHER_PROMPT_TEMPLATE = """你是一个优秀的学习助手，请基于下面
 
 请开始回答："""
 
+# 前缀缓存友好的布局：固定指令单独作为 system 消息放在最前面，可变的背景知识和问题放在后面，
+# 服务端的前缀缓存（KV cache）才能在不同请求之间复用同一段前缀
+BASIC_SYSTEM_PROMPT = """你是一个专业的问答助手。请仔细阅读用户提供的文档内容，从中提取信息回答用户的问题。
+
+回答要求：
+1. 如果文档中明确提到了答案，请直接回答
+2. 如果文档中有相关信息但不够完整，请基于已有信息回答
+3. 只有在文档完全没有相关信息时，才说"文档中没有找到相关信息"
+
+请用中文简洁回答。"""
+
+TEACHER_SYSTEM_PROMPT = """你是一个优秀的学习助手，请基于用户提供的知识库内容，用自然、易懂的方式回答问题。
+
+请按照以下要求回答：
+1. 首先理解文档中的核心概念
+2. 用你自己的话解释，而不是直接复制原文
+3. 如果文档中有例子，可以用自己的话重述例子
+4. 保持回答简洁明了，适合学习者理解
+5. 如果文档信息不足，可以基于常识补充，但要注明"基于一般知识"
+"""
+
+USER_PROMPT_TEMPLATE = """相关背景知识：
+{context}
+
+用户问题：{question}"""
+
+PROMPT_LAYOUT = "prefix_cache"  # prefix_cache：system + user 两条消息、段落按 id 排序；template：旧的单条提示词
+
 # 文件路径常量
 KNOWLEDGE_FILE = "data/your_notes.txt"
 VECTOR_DB_NAME = "my_docs"
+EVAL_QUESTIONS_FILE = "data/eval_questions.jsonl"  # 检索评测用的标注问题集
+
+# Chroma 持久化目录，None 表示内存模式（进程退出后索引丢失，入库也无法续跑）
+CHROMA_PERSIST_DIR = None
+
+# 段落文本库目录（mmap 只读 blob，多进程共享页缓存），None 表示段落文本直接从 Chroma 读取
+CHUNK_STORE_DIR = None
+
+# Embedding 快照（python -m src.snapshot）：设置为快照目录后，空集合启动时直接装载快照里的向量，不调用 embedding API
+SNAPSHOT_PATH = None
+SNAPSHOT_BATCH_SIZE = 5000    # 导出/装载每批条数（不超过 Chroma 单批上限）
+
+# 入库参数
+INGEST_BATCH_SIZE = 10        # 每批写入的段落数（text_embedding_v3 单次最多 10 条）
+INGEST_CHECKPOINT_EVERY = 10  # 每写入多少批保存一次检查点
+INGEST_CLEAR_BATCH_SIZE = 5000  # 来源文件变化、replace=True 时清空集合每批删除的条数
+
+# 索引蓝绿重建：新版本校验通过后切换别名，旧版本排空后回收
+INDEX_VALIDATION_SAMPLE = 20        # 校验时抽样查询的段落数
+INDEX_VALIDATION_MIN_RECALL = 0.9   # 抽样段落用原文查询能找回自己的最低比例
+INDEX_GC_GRACE_SECONDS = 5          # 旧版本下线后至少保留多久再删除
+
+# 多租户：每个租户一个持久化目录 TENANT_ROOT/<租户>/，首次查询时加载，总驻留量超出预算时按 LRU 卸载
+TENANT_ROOT = "data/tenants"
+TENANT_COLLECTION_NAME = "knowledge"
+TENANT_MEMORY_BUDGET_BYTES = 2 * 1024 ** 3
+TENANT_LOAD_WORKERS = 2
+TENANT_RETIRED_KEEP_SECONDS = 3600  # 快照导入换下的旧租户目录保留多久再删除（服务进程可能还在用）
 
 # 检索参数
 TOP_K_RESULTS = 3
+MAX_TOP_K = 50  # HTTP /query 允许请求的最大 top_k
+# 抽取式上下文压缩：只把与问题最相关的句子送进大模型（开启前先用 python -m src.evaluation --compression 看对答案质量的影响）
+CONTEXT_COMPRESSION = False
+COMPRESSION_BUDGET_CHARS = 300  # 压缩后上下文的字数预算
+COMPRESSION_MIN_SENTENCES = 2   # 无论预算多少至少保留的句子数
+COMPRESSION_CACHE_SIZE = 8192   # 句子向量 LRU 条数，反复检索到的段落不再重复调用 API；0 关闭
+RETRIEVAL_SHARDS = 1            # >1 时按 id 哈希分片，每个分片由独立进程检索，结果合并为全局 top-k
+SHARD_QUERY_DEADLINE = 2.0      # 分片查询的总期限（秒），超时的分片不参与合并
+SHARD_START_TIMEOUT = 120       # 等待分片进程打开集合的上限（秒），超时或启动失败时报错
+SHARD_CALL_TIMEOUT = 60         # count / 入库等分片调用的超时（秒）
+# 多查询检索：问题改写成几个变体一起检索，结果按倒数排名融合；变体超过期限未返回时只用原问题的结果
+MULTI_QUERY_RETRIEVAL = False
+MULTI_QUERY_MAX_VARIANTS = 4        # 除原问题外最多几个变体
+MULTI_QUERY_DEADLINE = 1.5          # 等待大模型改写的期限（秒），超过就只用规则变体
+MULTI_QUERY_RRF_K = 60              # 倒数排名融合的平滑常数
+MULTI_QUERY_PRIMARY_WEIGHT = 2.0    # 融合时原问题排名的权重（变体为 1）
+MULTI_QUERY_LLM_PARAPHRASE = False  # 额外让快速模型改写问题（会增加一次生成调用）
+MULTI_QUERY_PARAPHRASE_MODEL = "qwen-turbo"
+# 同义词表：同一组里的词互相替换生成变体（中英文缩写、常见别称）
+MULTI_QUERY_SYNONYMS = {
+    "过拟合": ["overfitting", "泛化能力差"],
+    "Embedding": ["嵌入", "向量表示"],
+    "CNN": ["卷积神经网络"],
+    "RNN": ["循环神经网络"],
+    "RAG": ["检索增强生成"],
+    "LLM": ["大模型", "大语言模型"],
+    "深度学习": ["神经网络"],
+    "梯度下降": ["优化算法"],
+    "损失函数": ["目标函数", "代价函数"],
+}
 HISTORY_WINDOW_SIZE = 3  # 对话历史窗口大小
 
+# ==================== 入库去重 ====================
+DEDUP_ENABLED = True       # 入库前去掉重复/近似重复的段落，省下 embedding 调用和索引空间
+DEDUP_THRESHOLD = 0.85     # MinHash 估计的 Jaccard 相似度达到该值视为近似重复
+DEDUP_NUM_PERM = 128       # MinHash 排列数，越大估计越准、越慢
+DEDUP_SHINGLE_SIZE = 3     # 字符 shingle 长度
+DEDUP_MAX_INDEXED = 1_000_000  # 去重索引最多登记的段落数（约 1.1 KB/段，即最多约 1.1 GB），超出后不再增长
+
+# ==================== Embedding配置 ====================
+EMBEDDING_BACKEND = "qwen"     # qwen：调用通义千问 API；local：本地哈希 embedding（离线评测用）
+EMBEDDING_CACHE_PATH = None    # 设置为 .npz 路径后按文本缓存 embedding，例如 "data/embedding_cache.npz"
+LOCAL_EMBEDDING_DIM = 512      # 本地 embedding 的维度
+# 输出维度，None 表示模型默认维度。API 原生支持的维度直接请求低维向量，其它维度用本地拟合的 PCA 投影
+EMBEDDING_DIMENSION = None
+API_EMBEDDING_DIMENSIONS = (1024, 768, 512, 256, 128, 64)  # text_embedding_v3 支持的 dimension 参数
+QWEN_DEFAULT_DIMENSION = 1024
+PCA_PROJECTION_PATH = "data/pca_projection.npz"  # python -m src.projection 拟合生成
+
+# ==================== 生成配置 ====================
+GENERATION_MODEL = "qwen-plus"
+GENERATION_FALLBACK_MODELS = ["qwen-turbo"]  # 主模型熔断或重试耗尽后依次尝试
+GENERATION_TIMEOUT = 30            # 单次 HTTP 请求超时（秒）
+GENERATION_DEADLINE = 60           # 一次问答的总时限（秒），包含重试、对冲和降级
+GENERATION_MAX_RETRIES = 2         # 每个模型在瞬时错误（429/5xx/超时）上的重试次数
+GENERATION_BACKOFF_BASE = 0.5      # 指数退避基数（秒）
+GENERATION_BACKOFF_MAX = 8.0       # 单次退避上限（秒）
+GENERATION_HEDGE_PERCENTILE = 95   # 超过该分位延迟仍未返回时发出对冲请求，None 表示关闭
+GENERATION_HEDGE_MIN_SAMPLES = 20  # 至少积累这么多次延迟样本后才启用对冲
+HTTP_POOL_SIZE = 16                # 复用的 keep-alive 连接数
+CIRCUIT_FAILURE_THRESHOLD = 5      # 连续失败多少次后熔断
+CIRCUIT_RESET_TIMEOUT = 30         # 熔断多少秒后放行一个试探请求
+
+# 离线批量问答（OpenAI 兼容批处理接口）
+BATCH_DIR = "data/batch"              # 批处理输入/输出文件目录
+BATCH_POLL_INTERVAL = 30              # 轮询任务状态的间隔（秒）
+BATCH_COMPLETION_WINDOW = "24h"
+
+# ==================== API 配额 ====================
+# 本机所有进程共享的令牌桶（文件锁），避免多个进程合起来超过账号的 QPS / TPM 限制
+QUOTA_ENABLED = False
+QUOTA_DIR = "data/quota"           # 共享桶状态文件所在目录，所有进程必须指向同一目录
+QUOTA_BUDGETS = {                  # None 表示该维度不限
+    "embedding": {"requests_per_second": 20, "tokens_per_minute": 600000},
+    "generation": {"requests_per_second": 5, "tokens_per_minute": 300000},
+}
+QUOTA_BURST_SECONDS = 1.0          # 桶容量 = 每秒补充量 × 该秒数，允许的突发大小
+QUOTA_BULK_RESERVE = 0.3           # 入库等 bulk 请求不能把桶用到容量的这一比例以下，留给在线问答
+QUOTA_WAIT_TIMEOUT = 60            # 等待配额的上限（秒）
+QUOTA_GENERATION_OUTPUT_TOKENS = 500  # 生成调用预先扣除的输出 tokens，返回后按实际用量校正
+QUOTA_THROTTLED_BACKOFF = 1.0      # 服务端返回 429 后所有进程暂停该预算的秒数
+
+# ==================== 路由配置 ====================
+ROUTING_POLICY = "adaptive"  # adaptive：按难度分流；always_full：全部用大模型；always_fast：全部用快速模型
+ROUTING_THRESHOLDS = {
+    "extractive_max_distance": 0.8,  # 定义型问题直接返回第一段：第一段距离不超过该值
+    "extractive_min_margin": 0.3,    # 且比第二段近至少这么多
+    "fast_min_margin": 0.15,         # 第一、二段距离差大于该值说明检索结果明确
+    "fast_max_question_len": 20,     # 不超过该长度的问题视为简单问题
+    "fast_model": "qwen-turbo",
+    "full_model": GENERATION_MODEL,
+}
+# 模型单价（元/千 tokens：输入, 输出），用于估算每条路由的费用
+MODEL_PRICES = {
+    "qwen-plus": (0.0008, 0.002),
+    "qwen-turbo": (0.0003, 0.0006),
+}
+
+# ==================== 查询缓存与启动预热 ====================
+QUERY_EMBEDDING_CACHE_SIZE = 1024   # 问题向量 LRU 条数（同一问题不再调用 embedding API），0 关闭
+ANSWER_CACHE_SIZE = 0               # 答案 LRU 条数，0 关闭；开启后同一问题在 TTL 内直接返回上次的答案
+ANSWER_CACHE_TTL = 3600             # 答案缓存有效期（秒）；索引切换到新版本后旧答案自动失效
+# 服务把每个 /ask、/query 的问题追加到查询日志，启动时按频次取前 N 个在后台重放，预热上面两个缓存与索引页
+QUERY_LOG_PATH = "data/query_log.jsonl"  # None 表示不记录
+QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024   # 超出后轮转为 .1，只保留一份旧日志
+WARMUP_ON_START = True
+WARMUP_TOP_N = 50
+WARMUP_RATE = 2.0                   # 每秒最多重放的问题数，预热走 bulk 配额通道，不挤占在线请求
+
+# ==================== 内存剖析 ====================
+MEMORY_PROFILING = False        # 按阶段记录 tracemalloc 峰值与 RSS（有明显开销，只在排查时开启）
+MEMORY_PROFILING_TOP_LINES = 0  # >0 时每个阶段保存分配最多的代码行
+
+# ==================== 日志配置 ====================
+LOG_LEVEL = "INFO"             # DEBUG / INFO / WARNING / ERROR
+LOG_DEBUG_SAMPLE_RATE = 0.01   # 逐请求 DEBUG 日志的采样比例（0~1）
+LOG_QUEUE_SIZE = 10000         # 异步日志队列容量，队列满时丢弃新日志而不是阻塞请求
+
 # ==================== API配置 ====================
 
 # 设置 API Key
-DASHSCOPE_API_KEY = "请输入你的千问3API"
\ No newline at end of file
+DASHSCOPE_API_KEY = "请输入你的千问3API"
+
+# API 地址，None 表示使用官方地址；压测时可指向 bench/fake_dashscope.py 启动的本地假服务
+DASHSCOPE_BASE_URL = None
+DASHSCOPE_COMPATIBLE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"  # OpenAI 兼容接口（批处理用）
\ No newline at end of file
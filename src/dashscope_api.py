@@ -0,0 +1,26 @@
+"""
+    DashScope SDK 延迟加载 - 第一次真正调用 API 时才导入 SDK 并设置 Key / 地址，
+    只查看帮助或只做本地计算的命令不必为导入 SDK 付出启动时间
+"""
+import threading
+
+from src.config import DASHSCOPE_API_KEY, DASHSCOPE_BASE_URL
+
+_configured = False
+_lock = threading.Lock()
+
+
+def get_dashscope():
+    """返回已配置好的 dashscope 模块；调用方事先手动设置过的 api_key 不会被覆盖"""
+    global _configured
+    import dashscope
+
+    if not _configured:
+        with _lock:
+            if not _configured:
+                if dashscope.api_key is None:
+                    dashscope.api_key = DASHSCOPE_API_KEY
+                if DASHSCOPE_BASE_URL:
+                    dashscope.base_http_api_url = DASHSCOPE_BASE_URL
+                _configured = True
+    return dashscope
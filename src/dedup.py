@@ -0,0 +1,217 @@
+"""
+    入库去重 - 归一化哈希精确去重 + MinHash/LSH 近似去重（字符 shingle，适合中文）
+
+去重索引在整个入库过程中常驻内存，每个保留的段落约占：
+    签名 num_perm × 2 字节（128 排列为 256 字节，连续 uint16 矩阵）
+    + 精确哈希与每个 LSH band 各一个字典项（约 90 字节 × (bands + 1)，128 排列、阈值 0.85 时 9 项）
+合计约 1.1 KB/段，100 万段约 1.1 GB；超过 DEDUP_MAX_INDEXED 段后不再登记新段落，
+之后的段落仍与已登记的段落比较，内存不再增长。
+
+查看某个文件的去重效果：
+    python -m src.dedup data/your_notes.txt --threshold 0.8
+"""
+import argparse
+import hashlib
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+from src.config import DEDUP_MAX_INDEXED, DEDUP_NUM_PERM, DEDUP_SHINGLE_SIZE, DEDUP_THRESHOLD
+from src.logger import get_logger
+
+logger = get_logger("dedup")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_IGNORED_CHARS = re.compile(r"[\s\W_]+", re.UNICODE)
+_MAX_EXAMPLES = 1000  # 报告里最多保留的重复示例数
+
+
+# ==================== 文本归一化 ====================
+def normalize_text(text):
+    """全角转半角、统一小写、去掉空白和标点，只保留内容本身"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _IGNORED_CHARS.sub("", text)
+
+
+def shingles(text, size=DEDUP_SHINGLE_SIZE):
+    """字符级 shingle：中文没有空格分词，用连续字符片段表示内容"""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+# ==================== MinHash ====================
+class MinHasher:
+    """用 num_perm 个随机线性哈希 (a*x + b) mod p 近似随机排列"""
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, shingle_size=DEDUP_SHINGLE_SIZE, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.b = rng.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, normalized_text):
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles(normalized_text, self.shingle_size)],
+                          dtype=np.uint64)
+        # (len(shingles), num_perm) 一次性算完所有排列，再按列取最小值
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def choose_bands(num_perm, threshold):
+    """选择 LSH 的 (bands, rows)，使 S 曲线拐点 (1/b)^(1/r) 最接近阈值"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+# ==================== 去重报告 ====================
+class DedupReport:
+    """去重统计：省下了多少次 embedding 调用和多少字节"""
+
+    def __init__(self):
+        self.total = 0
+        self.kept = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.bytes_total = 0
+        self.bytes_saved = 0
+        self.duplicates = []  # [(被丢弃的下标, 保留的下标, 估计相似度)]，只保留前 _MAX_EXAMPLES 组
+
+    @property
+    def embeddings_saved(self):
+        return self.exact_duplicates + self.near_duplicates
+
+    def summary(self):
+        return (f"去重: {self.total} 段 → 保留 {self.kept} 段（精确重复 {self.exact_duplicates}，"
+                f"近似重复 {self.near_duplicates}），省下 {self.embeddings_saved} 次 embedding、"
+                f"{self.bytes_saved}/{self.bytes_total} 字节")
+
+    def to_dict(self):
+        return {"total": self.total, "kept": self.kept, "exact_duplicates": self.exact_duplicates,
+                "near_duplicates": self.near_duplicates, "embeddings_saved": self.embeddings_saved,
+                "bytes_total": self.bytes_total, "bytes_saved": self.bytes_saved}
+
+
+# ==================== 去重器 ====================
+class Deduplicator:
+    """流式去重：逐段调用 add()，返回该段是否应跳过
+
+    为控制常驻内存，已登记段落只保存：签名低 16 位（估计相似度时误判概率约 1/65536，可忽略）、
+    归一化文本的 64 位哈希、每个 band 的 64 位桶键；桶里存的是签名矩阵的行号。
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, shingle_size=DEDUP_SHINGLE_SIZE,
+                 max_indexed=DEDUP_MAX_INDEXED):
+        self.threshold = threshold
+        self.max_indexed = max_indexed
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self.exact = {}                                   # 归一化文本哈希 -> 行号
+        self.buckets = [{} for _ in range(self.bands)]    # 每个 band 一张桶表：桶键 -> 行号或行号列表
+        self.signatures = np.empty((1024, num_perm), dtype=np.uint16)  # 行号 -> 签名（按需倍增）
+        self.indices = []                                 # 行号 -> 段落下标
+        self.report = DedupReport()
+
+    @property
+    def indexed(self):
+        return len(self.indices)
+
+    def add(self, index, text):
+        """返回 (是否重复, 与哪一段重复, 估计相似度)；不重复的段落会被登记"""
+        size = len(text.encode("utf-8"))
+        self.report.total += 1
+        self.report.bytes_total += size
+
+        normalized = normalize_text(text)
+        digest = int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+        if digest in self.exact:
+            return self._mark(index, self.indices[self.exact[digest]], 1.0, size, exact=True)
+
+        signature = self.hasher.signature(normalized)
+        keys = [hash(signature[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+        candidates = set()
+        for band, key in zip(self.buckets, keys):
+            rows = band.get(key)
+            if isinstance(rows, list):
+                candidates.update(rows)
+            elif rows is not None:
+                candidates.add(rows)
+        best, best_similarity = None, 0.0
+        if candidates:
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarities = (self.signatures[rows] == signature.astype(np.uint16)).mean(axis=1)
+            top = int(similarities.argmax())
+            best, best_similarity = int(rows[top]), float(similarities[top])
+        if best is not None and best_similarity >= self.threshold:
+            return self._mark(index, self.indices[best], best_similarity, size, exact=False)
+
+        self.report.kept += 1
+        if self.indexed < self.max_indexed:
+            self._register(index, digest, signature, keys)
+            if self.indexed == self.max_indexed:
+                logger.warning("去重索引已登记 %d 段，达到上限，之后的段落只与已登记段落比较", self.indexed)
+        return False, None, 0.0
+
+    def _register(self, index, digest, signature, keys):
+        row = self.indexed
+        if row == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[row] = signature
+        self.indices.append(index)
+        self.exact[digest] = row
+        for band, key in zip(self.buckets, keys):
+            rows = band.get(key)
+            if rows is None:
+                band[key] = row
+            elif isinstance(rows, list):
+                rows.append(row)
+            else:
+                band[key] = [rows, row]
+
+    def _mark(self, index, kept_index, similarity, size, exact):
+        if exact:
+            self.report.exact_duplicates += 1
+        else:
+            self.report.near_duplicates += 1
+        self.report.bytes_saved += size
+        if len(self.report.duplicates) < _MAX_EXAMPLES:
+            self.report.duplicates.append((index, kept_index, similarity))
+        return True, kept_index, similarity
+
+
+def deduplicate(documents, threshold=DEDUP_THRESHOLD):
+    """对段落列表去重，返回 ([(原始下标, 段落)], DedupReport)，保留每组中最先出现的段落"""
+    deduplicator = Deduplicator(threshold)
+    kept = [(i, doc) for i, doc in enumerate(documents) if not deduplicator.add(i, doc)[0]]
+    return kept, deduplicator.report
+
+
+def main():
+    from src.rag_core import load_documents_from_file
+
+    parser = argparse.ArgumentParser(description="段落去重报告")
+    parser.add_argument("file")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument("--show", type=int, default=10, help="打印前几组重复")
+    args = parser.parse_args()
+
+    documents = load_documents_from_file(args.file)
+    _, report = deduplicate(documents, args.threshold)
+    print(report.summary())
+    for index, kept_index, similarity in report.duplicates[:args.show]:
+        print(f"  [{index}] ≈ [{kept_index}] ({similarity:.2f}): {documents[index][:60]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,264 @@
 """
     管理embedding类
 """
-import dashscope
-from dashscope import TextEmbedding
-from src.config import DASHSCOPE_API_KEY  # 导入配置
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+from src.config import (API_EMBEDDING_DIMENSIONS, EMBEDDING_BACKEND, EMBEDDING_CACHE_PATH, EMBEDDING_DIMENSION,
+                        LOCAL_EMBEDDING_DIM, PCA_PROJECTION_PATH, QUOTA_THROTTLED_BACKOFF,
+                        QWEN_DEFAULT_DIMENSION)  # 导入配置
+from src.dashscope_api import get_dashscope
+from src.projection import PCAProjection
+from src.logger import get_logger, should_sample
+from src.memory_profile import profile_stage
+from src.query_cache import get_query_embedding_cache
+from src.quota import get_bucket
+
+logger = get_logger("embeddings")
 
-# 设置API Key
-dashscope.api_key = DASHSCOPE_API_KEY
 
 # ==================== Embedding类 ====================
 class QwenEmbeddingFunction:
     """通义千问 Embedding 函数封装"""
 
+    def __init__(self, dimension=None):
+        self.dimension = dimension  # None 表示使用模型默认维度
+
+    @staticmethod
+    def name():
+        """新版 Chroma 用它校验集合绑定的 embedding 函数是否一致"""
+        return "qwen_text_embedding"
+
+    def embedding_metadata(self):
+        """写入集合元数据的 embedding 信息，入库与查询必须一致"""
+        return {"embedding_model": self.name(),
+                "embedding_dim": self.dimension or QWEN_DEFAULT_DIMENSION,
+                "embedding_projection": "none"}
+
     def _get_embeddings(self, texts):
-        """调用通义千问 API 获取 embeddings"""
+        """调用通义千问 API 获取 embeddings，返回 (条数, 维度) 的连续 float32 数组"""
         if isinstance(texts, str):
             texts = [texts]
 
+        bucket = get_bucket("embedding")
+        if bucket is not None:
+            # 与其它进程共享 embedding 配额，按字数近似 tokens
+            bucket.acquire(sum(len(t) for t in texts))
+
         try:
+            kwargs = {"dimension": self.dimension} if self.dimension else {}
+            TextEmbedding = get_dashscope().TextEmbedding
             response = TextEmbedding.call(
                 model=TextEmbedding.Models.text_embedding_v3,
-                input=texts
+                input=texts,
+                **kwargs
             )
 
-            print(f"API 响应状态: {response.status_code}")
+            if logger.isEnabledFor(logging.DEBUG) and should_sample():
+                logger.debug("API 响应状态: %s", response.status_code)
             if response.status_code != 200:
-                print(f"API 错误: {response.code} - {response.message}")
+                logger.error("API 错误: %s - %s", response.code, response.message)
+                if response.status_code == 429 and bucket is not None:
+                    bucket.backoff(QUOTA_THROTTLED_BACKOFF)
                 raise Exception(f"Embedding API 调用失败: {response.message}")
 
-            return [item['embedding'] for item in response.output['embeddings']]
+            # 响应里的 Python float 列表每个数约 32 字节，立即转成 4 字节的 float32 并释放
+            return np.array([item['embedding'] for item in response.output['embeddings']], dtype=np.float32)
         except Exception as e:
-            print(f"❌ Embedding 调用出错: {e}")
+            logger.error("❌ Embedding 调用出错: %s", e)
             raise
 
     def __call__(self, input):
         """Chroma 会调用这个方法"""
-        return self._get_embeddings(input)
+        with profile_stage("embedding", len(input)):
+            return self._get_embeddings(input)
 
     def embed_documents(self, texts):
         """存储文档时调用"""
-        return self._get_embeddings(texts)
+        with profile_stage("embedding", len(texts)):
+            return self._get_embeddings(texts)
 
     def embed_query(self, input):
-        """查询时调用 - 注意 Chroma 可能传入列表"""
+        """查询时调用 - Chroma 传入的是列表，多个问题在一次调用里一起算"""
         if isinstance(input, list):
-            if len(input) > 0:
-                query_text = input[0]
-            else:
+            if len(input) == 0:
                 raise ValueError("input 列表为空")
+            query_texts = [text if isinstance(text, str) else str(text) for text in input]
         else:
-            query_text = input
+            query_texts = [input if isinstance(input, str) else str(input)]
+
+        # 热门问题的向量从缓存取，只有没见过的问题才调用 API
+        cache = get_query_embedding_cache()
+        if not cache.enabled:
+            with profile_stage("embedding", len(query_texts)):
+                return self._get_embeddings(query_texts)
+        model = json.dumps(self.embedding_metadata(), sort_keys=True)
+        rows = [cache.get((model, text)) for text in query_texts]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            with profile_stage("embedding", len(missing)):
+                computed = self._get_embeddings([query_texts[i] for i in missing])
+            for i, row in zip(missing, computed):
+                rows[i] = row.copy()
+                cache.set((model, query_texts[i]), rows[i])
+        return np.stack(rows)
+
+
+# ==================== 本地 Embedding ====================
+def hash_embedding(text, dim=LOCAL_EMBEDDING_DIM):
+    """确定性的本地 embedding：字符 1-gram/2-gram 哈希到 dim 维并做 L2 归一化"""
+    vec = np.zeros(dim, dtype=np.float32)
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    for gram in grams:
+        h = zlib.crc32(gram.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm > 0 else vec
+
+
+class LocalEmbeddingFunction(QwenEmbeddingFunction):
+    """不调用 API 的本地 embedding，用于离线评测与压测"""
+
+    def __init__(self, dim=LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+
+    @staticmethod
+    def name():
+        return "local_hash_embedding"
+
+    def embedding_metadata(self):
+        return {"embedding_model": self.name(), "embedding_dim": self.dim, "embedding_projection": "none"}
+
+    def _get_embeddings(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            vectors[i] = hash_embedding(text, self.dim)
+        return vectors
+
+
+# ==================== 带缓存的 Embedding ====================
+class CachedEmbeddingFunction(QwenEmbeddingFunction):
+    """按文本内容缓存 embedding，可选持久化到 .npz 文件，重复评测无需重复调用 API"""
+
+    def __init__(self, base, cache_path=None):
+        self.base = base
+        self.cache_path = cache_path
+        self.cache = {}
+        self.lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            data = np.load(cache_path)
+            self.cache = dict(zip(data["keys"].tolist(), data["vectors"]))
+            logger.info("已加载 %d 条缓存 embedding: %s", len(self.cache), cache_path)
+
+    def name(self):
+        return self.base.name()
+
+    def embedding_metadata(self):
+        return self.base.embedding_metadata()
+
+    def _key(self, text):
+        # 键里带上后端名和维度，同一个缓存文件可以安全地被不同配置共用
+        prefix = json.dumps(self.embedding_metadata(), sort_keys=True)
+        return hashlib.sha1(f"{prefix}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_embeddings(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        keys = [self._key(t) for t in texts]
+        with self.lock:
+            missing = [(k, t) for k, t in zip(keys, texts) if k not in self.cache]
+        if missing:
+            # 同一批中的重复文本只请求一次
+            unique = dict(missing)
+            vectors = self.base._get_embeddings(list(unique.values()))
+            with self.lock:
+                for key, vec in zip(unique, vectors):
+                    self.cache[key] = np.asarray(vec, dtype=np.float32)
+        with self.lock:
+            return np.stack([self.cache[k] for k in keys])
+
+    def save(self):
+        """把缓存写回 cache_path"""
+        if not self.cache_path:
+            return
+        with self.lock:
+            keys = list(self.cache)
+            vectors = np.stack([self.cache[k] for k in keys]) if keys else np.zeros((0, 0), np.float32)
+        tmp_path = self.cache_path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys), vectors=vectors)
+        os.replace(tmp_path, self.cache_path)
+
+
+# ==================== 降维投影 ====================
+class ProjectedEmbeddingFunction(QwenEmbeddingFunction):
+    """先取全宽 embedding，再用本地拟合的 PCA 投影降维"""
+
+    def __init__(self, base, projection):
+        base_dim = base.embedding_metadata()["embedding_dim"]
+        if projection.input_dim != base_dim:
+            raise ValueError(f"投影输入维度 {projection.input_dim} 与 embedding 维度 {base_dim} 不一致")
+        self.base = base
+        self.projection = projection
+
+    def name(self):
+        return self.base.name()
+
+    def embedding_metadata(self):
+        return dict(self.base.embedding_metadata(),
+                    embedding_dim=self.projection.output_dim,
+                    embedding_projection=self.projection.fingerprint)
+
+    def _get_embeddings(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        return np.ascontiguousarray(self.projection.transform(self.base._get_embeddings(texts)))
+
+
+class EmbeddingMismatchError(ValueError):
+    """集合入库时用的 embedding 配置与当前配置不一致"""
+
+
+def check_embedding_metadata(collection, embedding_function):
+    """校验集合元数据中记录的模型/维度/投影与当前 embedding 函数一致"""
+    expected = embedding_function.embedding_metadata()
+    recorded = collection.metadata or {}
+    mismatched = {k: (recorded[k], v) for k, v in expected.items() if k in recorded and recorded[k] != v}
+    if mismatched:
+        raise EmbeddingMismatchError(
+            f"集合 {collection.name} 的 embedding 配置不一致（已记录, 当前）: {mismatched}，请重建集合")
+
+
+def get_embedding_function(backend=None, cache_path=None, dimension=None):
+    """根据配置创建 embedding 函数：qwen（默认，调用 API）或 local（离线）
+
+    dimension 为 None 时读取 EMBEDDING_DIMENSION，为 0 时强制使用模型原始维度（拟合投影时用）。
+    """
+    backend = backend or EMBEDDING_BACKEND
+    dimension = EMBEDDING_DIMENSION if dimension is None else dimension
+    if backend == "qwen":
+        # API 原生支持的维度直接请求低维向量，省去本地投影
+        api_dimension = dimension if dimension in API_EMBEDDING_DIMENSIONS else None
+        embedding_function = QwenEmbeddingFunction(api_dimension)
+    elif backend == "local":
+        embedding_function = LocalEmbeddingFunction()
+    else:
+        raise ValueError(f"未知的 embedding 后端: {backend}")
 
-        if not isinstance(query_text, str):
-            query_text = str(query_text)
+    cache_path = cache_path or EMBEDDING_CACHE_PATH
+    if cache_path:
+        embedding_function = CachedEmbeddingFunction(embedding_function, cache_path)
 
-        embeddings = self._get_embeddings([query_text])
-        return embeddings
+    if dimension and embedding_function.embedding_metadata()["embedding_dim"] != dimension:
+        projection = PCAProjection.load(PCA_PROJECTION_PATH)
+        if projection.output_dim != dimension:
+            raise ValueError(f"{PCA_PROJECTION_PATH} 是 {projection.output_dim} 维投影，"
+                             f"与配置的 {dimension} 维不一致，请重新拟合")
+        embedding_function = ProjectedEmbeddingFunction(embedding_function, projection)
+    return embedding_function
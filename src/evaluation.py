@@ -0,0 +1,256 @@
+"""
+    检索评测 - 基于标注问题集计算 recall@k / MRR / nDCG，并对比不同后端与参数下的检索延迟
+
+用法（在仓库根目录）：
+    python -m src.evaluation --backends local --top-k 1,3,5
+    python -m src.evaluation --backends qwen --cache data/embedding_cache.npz --plot eval.png
+    python -m src.evaluation --compression 150,300 --compression-answers   # 上下文压缩的压缩率与质量影响
+    python -m src.evaluation --multi-query                                 # 对比单查询与多查询检索
+"""
+import argparse
+import json
+import math
+import time
+from functools import partial
+
+from src.config import EVAL_QUESTIONS_FILE, KNOWLEDGE_FILE, TEACHER_PROMPT_TEMPLATE
+from src.embeddings import get_embedding_function
+from src.rag_core import get_client, initialize_vector_database, retrieve_documents
+
+
+# ==================== 标注数据 ====================
+def load_labeled_set(path=EVAL_QUESTIONS_FILE):
+    """读取 JSONL 标注集：每行 {"question", "relevant_ids", "expected_keywords"(可选)}"""
+    labeled = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                labeled.append(json.loads(line))
+    return labeled
+
+
+# ==================== 指标 ====================
+def recall_at_k(retrieved, relevant, k):
+    """前 k 个结果覆盖了多少比例的相关段落"""
+    if not relevant:
+        return 0.0
+    return len(set(retrieved[:k]) & set(relevant)) / len(relevant)
+
+
+def reciprocal_rank(retrieved, relevant):
+    """第一个相关结果排名的倒数，没有命中为 0"""
+    for rank, doc_id in enumerate(retrieved, 1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(retrieved, relevant, k):
+    """二值相关性下的 nDCG@k"""
+    dcg = sum(1.0 / math.log2(rank + 1)
+              for rank, doc_id in enumerate(retrieved[:k], 1) if doc_id in relevant)
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+# ==================== 评测流程 ====================
+def evaluate_retrieval(collection, labeled_set, top_k, retrieve_fn=retrieve_documents):
+    """对一个集合跑完整个标注集，返回平均指标和检索延迟"""
+    recalls, rrs, ndcgs, latencies = [], [], [], []
+    for item in labeled_set:
+        relevant = set(item["relevant_ids"])
+        start = time.perf_counter()
+        results = retrieve_fn(collection, item["question"], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        retrieved = results["ids"][0]
+
+        recalls.append(recall_at_k(retrieved, relevant, top_k))
+        rrs.append(reciprocal_rank(retrieved, relevant))
+        ndcgs.append(ndcg_at_k(retrieved, relevant, top_k))
+
+    n = len(labeled_set)
+    return {
+        "top_k": top_k,
+        "recall": sum(recalls) / n,
+        "mrr": sum(rrs) / n,
+        "ndcg": sum(ndcgs) / n,
+        "latency_mean_ms": sum(latencies) / n,
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p95_ms": _percentile(latencies, 95),
+    }
+
+
+def build_collection(backend, file_path=KNOWLEDGE_FILE, cache_path=None):
+    """为某个 embedding 后端重新建一个评测用集合"""
+    name = f"eval_{backend}"
+    client = get_client()
+    if name in [c.name for c in client.list_collections()]:
+        client.delete_collection(name)
+    embedding_function = get_embedding_function(backend, cache_path)
+    collection = initialize_vector_database(file_path, name, embedding_function)
+    return collection, embedding_function
+
+
+def run_evaluation(backends, top_ks, labeled_set, file_path=KNOWLEDGE_FILE, cache_path=None, multi_query=False):
+    """遍历 后端 × top_k 的所有组合；multi_query 为 True 时每个组合再跑一遍多查询检索（后端名加 +mq）"""
+    modes = [("", partial(retrieve_documents, multi_query=False))]
+    if multi_query:
+        modes.append(("+mq", partial(retrieve_documents, multi_query=True)))
+    results = []
+    for backend in backends:
+        collection, embedding_function = build_collection(backend, file_path, cache_path)
+        for top_k in top_ks:
+            for suffix, retrieve_fn in modes:
+                metrics = evaluate_retrieval(collection, labeled_set, top_k, retrieve_fn)
+                metrics["backend"] = backend + suffix
+                results.append(metrics)
+        if hasattr(embedding_function, "save"):
+            embedding_function.save()
+    return results
+
+
+# ==================== 上下文压缩评测 ====================
+def keyword_recall(text, keywords):
+    """expected_keywords 中出现在文本里的比例，作为上下文/答案质量的近似指标"""
+    if not keywords:
+        return 1.0
+    return sum(1 for k in keywords if k in text) / len(keywords)
+
+
+def evaluate_compression(collection, labeled_set, top_k, compressor, budget_chars, generate=False):
+    """对比压缩前后：上下文字数、关键词保留率；generate=True 时再比较答案的关键词覆盖与输入 tokens"""
+    ratios, full_recalls, compressed_recalls = [], [], []
+    answers = {"full": [], "compressed": []}
+    input_tokens = {"full": 0, "compressed": 0}
+    client = None
+    if generate:
+        from src.generation import get_generation_client
+        client = get_generation_client()
+
+    for item in labeled_set:
+        keywords = item.get("expected_keywords", [])
+        documents = retrieve_documents(collection, item["question"], top_k)["documents"][0]
+        contexts = {"full": "\n".join(documents)}
+        contexts["compressed"], stats = compressor.compress(item["question"], documents, budget_chars)
+        ratios.append(stats["ratio"])
+        full_recalls.append(keyword_recall(contexts["full"], keywords))
+        compressed_recalls.append(keyword_recall(contexts["compressed"], keywords))
+
+        if client is not None:
+            for name, context in contexts.items():
+                result = client.generate(prompt=TEACHER_PROMPT_TEMPLATE.format(context=context, question=item["question"]))
+                answers[name].append(keyword_recall(result.text, keywords))
+                input_tokens[name] += result.usage.get("input_tokens", 0)
+
+    n = len(labeled_set)
+    report = {
+        "top_k": top_k,
+        "budget_chars": budget_chars,
+        "compression_ratio": sum(ratios) / n,
+        "context_keyword_recall_full": sum(full_recalls) / n,
+        "context_keyword_recall_compressed": sum(compressed_recalls) / n,
+    }
+    if client is not None:
+        report.update({
+            "answer_keyword_recall_full": sum(answers["full"]) / n,
+            "answer_keyword_recall_compressed": sum(answers["compressed"]) / n,
+            "input_tokens_full": input_tokens["full"],
+            "input_tokens_compressed": input_tokens["compressed"],
+        })
+    return report
+
+
+def run_compression_evaluation(budgets, top_k, labeled_set, file_path=KNOWLEDGE_FILE, cache_path=None,
+                               generate=False, backend="local"):
+    from src.compression import ContextCompressor
+
+    collection, embedding_function = build_collection(backend, file_path, cache_path)
+    compressor = ContextCompressor(embedding_function)
+    return [evaluate_compression(collection, labeled_set, top_k, compressor, budget, generate) for budget in budgets]
+
+
+# ==================== 输出 ====================
+def print_report(results):
+    print(f"\n{'后端':<10}{'k':>4}{'recall':>10}{'MRR':>8}{'nDCG':>8}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for r in results:
+        print(f"{r['backend']:<10}{r['top_k']:>4}{r['recall']:>10.3f}{r['mrr']:>8.3f}"
+              f"{r['ndcg']:>8.3f}{r['latency_p50_ms']:>10.2f}{r['latency_p95_ms']:>10.2f}")
+
+
+def print_compression_report(results):
+    print(f"\n{'预算':>6}{'k':>4}{'压缩率':>8}{'关键词(原)':>12}{'关键词(压缩)':>14}{'答案(原)':>10}{'答案(压缩)':>12}")
+    for r in results:
+        answers = [r.get("answer_keyword_recall_full"), r.get("answer_keyword_recall_compressed")]
+        answer_full, answer_compressed = ["-" if a is None else f"{a:.3f}" for a in answers]
+        print(f"{r['budget_chars']:>6}{r['top_k']:>4}{r['compression_ratio']:>8.2f}"
+              f"{r['context_keyword_recall_full']:>12.3f}{r['context_keyword_recall_compressed']:>14.3f}"
+              f"{answer_full:>10}{answer_compressed:>12}")
+
+
+def plot_tradeoff(results, path, quality_key="ndcg"):
+    """画 质量-延迟 散点图；未安装 matplotlib 时跳过"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ 未安装 matplotlib，跳过绘图（pip install matplotlib）")
+        return None
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    for r in results:
+        ax.scatter(r["latency_p50_ms"], r[quality_key])
+        ax.annotate(f"{r['backend']}@{r['top_k']}", (r["latency_p50_ms"], r[quality_key]))
+    ax.set_xlabel("retrieval p50 latency (ms)")
+    ax.set_ylabel(quality_key)
+    ax.set_title("quality vs latency")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索质量与延迟评测")
+    parser.add_argument("--labels", default=EVAL_QUESTIONS_FILE)
+    parser.add_argument("--corpus", default=KNOWLEDGE_FILE)
+    parser.add_argument("--backends", default="local", help="逗号分隔：qwen,local")
+    parser.add_argument("--top-k", default="1,3,5")
+    parser.add_argument("--cache", default=None, help="embedding 缓存文件（.npz），离线复用 API 结果")
+    parser.add_argument("--plot", default=None, help="保存质量-延迟图的路径")
+    parser.add_argument("--output", default=None, help="把结果保存为 JSON")
+    parser.add_argument("--compression", default=None, help="评测上下文压缩，逗号分隔的字数预算，如 150,300")
+    parser.add_argument("--compression-answers", action="store_true", help="同时生成答案比较质量（会调用生成模型）")
+    parser.add_argument("--multi-query", action="store_true", help="同时评测多查询检索（问题改写 + 结果融合）")
+    args = parser.parse_args()
+
+    labeled_set = load_labeled_set(args.labels)
+    if args.compression:
+        budgets = [int(b) for b in args.compression.split(",")]
+        top_k = int(args.top_k.split(",")[-1])
+        results = run_compression_evaluation(budgets, top_k, labeled_set, args.corpus, args.cache,
+                                             args.compression_answers, args.backends.split(",")[0])
+        print_compression_report(results)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        return
+
+    results = run_evaluation(args.backends.split(","), [int(k) for k in args.top_k.split(",")],
+                             labeled_set, args.corpus, args.cache, args.multi_query)
+    print_report(results)
+
+    if args.plot and plot_tradeoff(results, args.plot):
+        print(f"📈 已保存: {args.plot}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
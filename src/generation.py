@@ -0,0 +1,282 @@
+"""
+    生成客户端 - 连接池、超时、重试退避、熔断、对冲请求与模型降级
+"""
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.config import (CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, GENERATION_BACKOFF_BASE,
+                        GENERATION_BACKOFF_MAX, GENERATION_DEADLINE, GENERATION_FALLBACK_MODELS,
+                        GENERATION_HEDGE_MIN_SAMPLES, GENERATION_HEDGE_PERCENTILE,
+                        GENERATION_MAX_RETRIES, GENERATION_MODEL, GENERATION_TIMEOUT, HTTP_POOL_SIZE,
+                        QUOTA_GENERATION_OUTPUT_TOKENS, QUOTA_THROTTLED_BACKOFF)
+from src.dashscope_api import get_dashscope
+from src.logger import get_logger
+from src.metrics import metrics
+from src.prompts import cached_tokens
+from src.quota import QuotaTimeoutError, get_bucket
+
+logger = get_logger("generation")
+
+# 这些 HTTP 状态码视为瞬时错误，可以重试
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+# ==================== 异常 ====================
+class GenerationError(Exception):
+    """生成调用失败（重试、降级都用尽后抛出）"""
+
+
+class TransientGenerationError(GenerationError):
+    """可重试的瞬时错误：限流、服务端错误、超时、连接中断"""
+
+
+class CircuitOpenError(GenerationError):
+    """模型处于熔断状态，暂不接受请求"""
+
+
+# ==================== 熔断器 ====================
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，冷却后放行一个试探请求（half-open）"""
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def record_rejected(self):
+        """请求本身有问题（参数错误、内容不合规等）：服务是通的，不计入失败，只结束试探"""
+        with self.lock:
+            self.probing = False
+
+
+# ==================== 生成结果 ====================
+class GenerationResult:
+    """一次生成调用的结果"""
+
+    def __init__(self, text, model, usage=None, latency_ms=0.0, hedged=False):
+        self.text = text
+        self.model = model
+        self.usage = usage or {}
+        self.latency_ms = latency_ms
+        self.hedged = hedged
+
+
+# ==================== 生成客户端 ====================
+class GenerationClient:
+    """对 dashscope.Generation.call 的可靠性封装"""
+
+    def __init__(self, models=None, timeout=GENERATION_TIMEOUT, deadline=GENERATION_DEADLINE,
+                 max_retries=GENERATION_MAX_RETRIES, hedge_percentile=GENERATION_HEDGE_PERCENTILE,
+                 pool_size=HTTP_POOL_SIZE):
+        self.models = models or [GENERATION_MODEL, *GENERATION_FALLBACK_MODELS]
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self.breakers = {model: CircuitBreaker() for model in self.models}
+
+        # 复用 keep-alive 连接，避免每次请求都重新握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="generation")
+
+    def generate(self, prompt=None, messages=None, deadline=None, model=None, **kwargs):
+        """按模型优先级依次尝试，返回 GenerationResult；全部失败时抛出 GenerationError
+
+        指定 model 时先用该模型，失败后再按默认顺序降级。
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        last_error = None
+        models = self.models if model is None else [model] + [m for m in self.models if m != model]
+
+        for i, model in enumerate(models):
+            breaker = self.breakers.setdefault(model, CircuitBreaker())
+            if not breaker.allow():
+                last_error = CircuitOpenError(f"{model} 已熔断")
+                continue
+            if i > 0:
+                metrics.inc(f"generation.fallback.{model}")
+                logger.warning("降级到备用模型 %s（原因: %s）", model, last_error)
+            try:
+                result = self._call_with_retries(model, prompt, messages, deadline_at, kwargs)
+            except TransientGenerationError as e:
+                # 只有限流、5xx、超时、网络错误说明模型不可用，才计入熔断
+                breaker.record_failure()
+                last_error = e
+                continue
+            except GenerationError as e:
+                breaker.record_rejected()
+                last_error = e
+                continue
+            breaker.record_success()
+            return result
+
+        metrics.inc("generation.failures")
+        raise GenerationError(f"所有模型调用失败: {last_error}")
+
+    def _call_with_retries(self, model, prompt, messages, deadline_at, kwargs):
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise TransientGenerationError(f"{model} 超出总时限")
+            try:
+                return self._call_hedged(model, prompt, messages, min(self.timeout, remaining), kwargs)
+            except TransientGenerationError as e:
+                if attempt == self.max_retries:
+                    raise
+                # 指数退避 + 抖动，且不能睡过总时限
+                backoff = min(GENERATION_BACKOFF_MAX, GENERATION_BACKOFF_BASE * 2 ** attempt)
+                backoff *= random.uniform(0.5, 1.0)
+                metrics.inc("generation.retries")
+                logger.warning("%s 瞬时错误，%.2f 秒后重试（第 %d 次）: %s", model, backoff, attempt + 1, e)
+                time.sleep(max(0.0, min(backoff, deadline_at - time.monotonic())))
+
+    def _hedge_delay(self, model):
+        """返回发出对冲请求前要等待的秒数，样本不足或关闭时返回 None"""
+        if self.hedge_percentile is None:
+            return None
+        histogram = metrics.histogram(f"generation.latency_ms.{model}")
+        if histogram.count < GENERATION_HEDGE_MIN_SAMPLES:
+            return None
+        return histogram.percentile(self.hedge_percentile) / 1000
+
+    def _call_hedged(self, model, prompt, messages, timeout, kwargs):
+        hedge_delay = self._hedge_delay(model)
+        if hedge_delay is None or hedge_delay >= timeout:
+            return self._call_once(model, prompt, messages, timeout, kwargs)
+
+        start = time.monotonic()
+        # 对冲线程沿用调用方的上下文（配额通道等）
+        futures = [self.executor.submit(contextvars.copy_context().run, self._call_once,
+                                        model, prompt, messages, timeout, kwargs)]
+        done, _ = wait(futures, timeout=hedge_delay)
+        if not done:
+            # 主请求慢于历史分位延迟，再发一个相同请求，谁先成功用谁
+            metrics.inc("generation.hedged")
+            futures.append(self.executor.submit(contextvars.copy_context().run, self._call_once,
+                                                model, prompt, messages, timeout - hedge_delay, kwargs))
+
+        last_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, timeout - (time.monotonic() - start)),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    result = future.result()
+                except GenerationError as e:
+                    last_error = e
+                    continue
+                result.hedged = len(futures) > 1
+                return result
+        raise last_error or TransientGenerationError(f"{model} 请求超时")
+
+    def _call_once(self, model, prompt, messages, timeout, kwargs):
+        start = time.perf_counter()
+        call_kwargs = dict(kwargs)
+        if messages is not None:
+            call_kwargs["messages"] = messages
+        else:
+            call_kwargs["prompt"] = prompt
+
+        # 与其它进程共享生成配额；预扣 输入字数 + 预估输出，返回后按实际 tokens 校正
+        bucket = get_bucket("generation")
+        estimate = 0
+        if bucket is not None:
+            text = prompt if messages is None else "".join(m.get("content") or "" for m in messages)
+            estimate = len(text or "") + QUOTA_GENERATION_OUTPUT_TOKENS
+            try:
+                bucket.acquire(estimate, timeout=timeout)
+            except QuotaTimeoutError as e:
+                raise TransientGenerationError(f"{model} {e}") from e
+            start = time.perf_counter()  # 排队时间不计入模型延迟，否则会误触发对冲
+        try:
+            response = get_dashscope().Generation.call(
+                model=model,
+                result_format='message',
+                session=self.session,
+                request_timeout=timeout,
+                **call_kwargs
+            )
+        except requests.exceptions.RequestException as e:
+            metrics.inc(f"generation.errors.{model}")
+            raise TransientGenerationError(f"{model} 网络错误: {e}") from e
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        if response.status_code == 200:
+            metrics.observe(f"generation.latency_ms.{model}", latency_ms)
+            usage = dict(response.usage) if response.usage else {}
+            # 命中服务端前缀缓存的输入 tokens，与总输入 tokens 之比就是缓存命中率
+            metrics.inc(f"generation.input_tokens.{model}", usage.get("input_tokens", 0))
+            metrics.inc(f"generation.cached_tokens.{model}", cached_tokens(usage))
+            if bucket is not None:
+                used = usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+                bucket.adjust(used - estimate)
+            return GenerationResult(response.output.choices[0].message.content, model, usage, latency_ms)
+
+        metrics.inc(f"generation.errors.{model}")
+        if response.status_code == 429 and bucket is not None:
+            bucket.backoff(QUOTA_THROTTLED_BACKOFF)
+        message = f"{model} 调用失败 [{response.status_code}] {response.code}: {response.message}"
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise TransientGenerationError(message)
+        raise GenerationError(message)
+
+
+# ==================== 全局客户端 ====================
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_generation_client():
+    """获取进程内共享的生成客户端（连接池在所有请求间复用）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GenerationClient()
+    return _client
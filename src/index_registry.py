@@ -0,0 +1,328 @@
+"""
+    索引版本管理 - 蓝绿重建：后台建新版本 → 校验 → 原子切换别名 → 旧版本排空后回收
+
+命令行重建（需配置 CHROMA_PERSIST_DIR，别名才能跨进程生效）：
+    python -m src.index_registry --file data/your_notes.txt
+    python -m src.index_registry --gc          # 没有服务在运行时，立即回收已下线的旧版本
+
+别名（如 VECTOR_DB_NAME）指向某个具体版本的集合名（如 my_docs_v20260119220100）。
+没有别名记录时，别名就是集合名本身，兼容重建之前的老集合。
+
+别名和已下线版本记录在 CHROMA_PERSIST_DIR/index_aliases.json，多个进程共用：写入时加文件锁，
+读取时按文件的 mtime 判断是否被其它进程改过。查询租约只在进程内可见，所以旧版本只由服务进程
+（enable_garbage_collection()）回收；命令行重建只把旧版本标记为下线，由服务进程或 --gc 稍后回收。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from src.chunk_store import build_chunk_store, chunk_store_path, close_chunk_store, remove_chunk_store
+from src.config import (CHROMA_PERSIST_DIR, INDEX_GC_GRACE_SECONDS, INDEX_VALIDATION_MIN_RECALL,
+                        INDEX_VALIDATION_SAMPLE, KNOWLEDGE_FILE, VECTOR_DB_NAME)
+from src.ingest_job import IngestionJob, clear_checkpoint
+from src.logger import get_logger
+from src.utils import locked_file
+from src.vector_store import checkpoint_path_for, get_client, open_collection
+
+logger = get_logger("index_registry")
+
+
+class IndexValidationError(Exception):
+    """新版本索引没有通过校验，不会被切换上线"""
+
+
+# ==================== 别名注册表 ====================
+class IndexRegistry:
+    """维护 别名 → 版本 的映射，并统计每个版本上正在进行的查询"""
+
+    def __init__(self, alias_path=None):
+        self.alias_path = alias_path
+        self.aliases = {}
+        self.retired = {}    # 已下线的版本名 -> 下线时间（time.time()，各进程共用）
+        self.inflight = {}   # 版本名 -> 本进程中正在使用它的查询数
+        self.listeners = []
+        self.collecting = alias_path is None  # 内存模式只有一个进程，可以直接回收
+        self.loaded_stat = None
+        self.lock = threading.Lock()
+        self._reload()
+
+    # ---------- 共享文件 ----------
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.alias_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self):
+        """返回 (别名, 已下线版本)；兼容只有 {别名: 版本} 的旧格式"""
+        try:
+            with open(self.alias_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}, {}
+        if "aliases" not in data:
+            return data, {}
+        return data["aliases"], data.get("retired", {})
+
+    def _write_file(self, aliases, retired):
+        tmp_path = f"{self.alias_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"aliases": aliases, "retired": retired}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.alias_path)
+
+    @contextmanager
+    def _update(self):
+        """跨进程读改写：持有文件锁读出最新内容，yield (别名, 已下线版本) 供修改，退出时落盘"""
+        if not self.alias_path:
+            with self.lock:
+                yield self.aliases, self.retired
+            return
+        with locked_file(f"{self.alias_path}.lock"), self.lock:
+            aliases, retired = self._read_file()
+            yield aliases, retired
+            self._write_file(aliases, retired)
+            self.aliases, self.retired, self.loaded_stat = aliases, retired, self._file_stat()
+
+    def _reload(self):
+        """文件被其它进程改过时重新读取，返回发生变化的 {别名: 新版本}"""
+        if not self.alias_path:
+            return {}
+        stat = self._file_stat()
+        with self.lock:
+            if stat == self.loaded_stat:
+                return {}
+            aliases, retired = self._read_file()
+            changed = {alias: version for alias, version in aliases.items()
+                       if self.aliases.get(alias, alias) != version}
+            self.aliases, self.retired, self.loaded_stat = aliases, retired, stat
+        return changed
+
+    def refresh(self):
+        """同步其它进程的切换（一次 stat，足够便宜，可以每次查询调用）；别名变了就通知监听者"""
+        changed = self._reload()
+        for alias, version in changed.items():
+            logger.info("🔀 其它进程切换了别名 %s → %s", alias, version)
+            self._notify(alias, version)
+        if changed:
+            self.schedule_garbage_collection()
+        return changed
+
+    # ---------- 别名 ----------
+    def resolve(self, alias):
+        self.refresh()
+        with self.lock:
+            return self.aliases.get(alias, alias)
+
+    def add_listener(self, callback):
+        """切换时回调 callback(alias, version)"""
+        self.listeners.append(callback)
+
+    def _notify(self, alias, version):
+        for callback in self.listeners:
+            callback(alias, version)
+
+    @staticmethod
+    def new_version_name(alias):
+        return f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}{random.randint(0, 99):02d}"
+
+    @contextmanager
+    def lease(self, version):
+        """查询期间占用某个版本，保证它不会在查询进行中被本进程回收"""
+        with self.lock:
+            self.inflight[version] = self.inflight.get(version, 0) + 1
+        try:
+            yield version
+        finally:
+            with self.lock:
+                self.inflight[version] -= 1
+            if version in self.retired:
+                self.collect_garbage()
+
+    def switch(self, alias, version):
+        """原子切换别名：持锁落盘（临时文件 + os.replace），旧版本记为下线，再通知本进程的监听者"""
+        with self._update() as (aliases, retired):
+            old = aliases.get(alias, alias)
+            aliases[alias] = version
+            retired.pop(version, None)
+            if old != version:
+                retired[old] = time.time()
+        self._notify(alias, version)
+        logger.info("🔀 别名 %s: %s → %s", alias, old, version)
+        return old
+
+    def remove_alias(self, alias):
+        with self._update() as (aliases, _):
+            aliases.pop(alias, None)
+
+    @staticmethod
+    def owns_version(alias, version):
+        """version 是 alias 的某个版本（new_version_name 生成的名字，或别名同名的老集合）"""
+        return version == alias or re.fullmatch(re.escape(alias) + r"_v\d{16}", version) is not None
+
+    def drop_alias(self, alias):
+        """删除别名以及它的当前版本和所有已下线版本（集合、检查点、文本库），返回被删除的版本名
+
+        用于清空索引：不等宽限期，调用方确认没有服务在使用这些版本。
+        """
+        with self._update() as (aliases, retired):
+            versions = [aliases.pop(alias, alias)]
+            versions += [v for v in list(retired) if self.owns_version(alias, v) and v not in versions]
+            for version in versions:
+                retired.pop(version, None)
+        with self.lock:
+            for version in versions:
+                self.inflight.pop(version, None)
+        self._delete_versions(versions)
+        return versions
+
+    @staticmethod
+    def _delete_versions(versions):
+        client = get_client()
+        for version in versions:
+            try:
+                client.delete_collection(version)
+            except Exception as e:  # 集合可能已经不存在，其余文件照样清理
+                logger.warning("删除集合 %s 失败: %s", version, e)
+            clear_checkpoint(checkpoint_path_for(version))
+            close_chunk_store(version)
+            remove_chunk_store(chunk_store_path(version))
+            logger.info("🗑️ 已删除索引版本: %s", version)
+
+    # ---------- 回收 ----------
+    def enable_garbage_collection(self):
+        """声明本进程负责回收旧版本（服务进程调用）：它持有查询租约，知道哪些版本还在用"""
+        self.collecting = True
+        self.schedule_garbage_collection()
+
+    def collect_garbage(self, grace_seconds=INDEX_GC_GRACE_SECONDS, force=False):
+        """删除已下线、本进程已排空且超过宽限期的旧版本；返回被删除的版本名
+
+        不负责回收的进程（命令行）直接返回，除非 force=True（确认没有服务在使用这些版本）。
+        其它服务进程的请求会在下一次查询时 refresh() 切到新版本，宽限期覆盖它们手上的查询。
+        """
+        if not (self.collecting or force):
+            return []
+        self._reload()
+        now = time.time()
+        with self.lock:
+            current = set(self.aliases.values())
+            drained = [v for v, retired_at in self.retired.items()
+                       if self.inflight.get(v, 0) == 0 and now - retired_at >= grace_seconds and v not in current]
+        if not drained:
+            return []
+        with self._update() as (_, retired):
+            for version in drained:
+                retired.pop(version, None)
+        with self.lock:
+            for version in drained:
+                self.inflight.pop(version, None)
+
+        self._delete_versions(drained)
+        return drained
+
+    def schedule_garbage_collection(self, grace_seconds=INDEX_GC_GRACE_SECONDS):
+        """宽限期结束后再检查一次（之后每次查询归还时也会检查）；不负责回收的进程什么也不做，
+        下线记录留在共享文件里，由服务进程稍后回收"""
+        if not self.collecting:
+            return
+        timer = threading.Timer(grace_seconds + 0.1, self.collect_garbage, args=(grace_seconds,))
+        timer.daemon = True
+        timer.start()
+
+
+# ==================== 校验 ====================
+def validate_index(collection, expected_count=None, sample_size=INDEX_VALIDATION_SAMPLE,
+                   min_recall=INDEX_VALIDATION_MIN_RECALL, top_k=3):
+    """检查文档数，并抽样用段落原文查询，看能否在 top_k 内找回它自己"""
+    count = collection.count()
+    report = {"count": count, "expected_count": expected_count}
+    if count == 0:
+        raise IndexValidationError(f"{collection.name} 是空的")
+    if expected_count is not None and count != expected_count:
+        raise IndexValidationError(f"{collection.name} 文档数 {count} ≠ 预期 {expected_count}")
+
+    sample = collection.get(limit=sample_size, include=["documents"])
+    if sample["ids"]:
+        hits = 0
+        for doc_id, document in zip(sample["ids"], sample["documents"]):
+            results = collection.query(query_texts=[document], n_results=min(top_k, count))
+            hits += doc_id in results["ids"][0]
+        report["sample_recall"] = hits / len(sample["ids"])
+        if report["sample_recall"] < min_recall:
+            raise IndexValidationError(
+                f"{collection.name} 抽样召回 {report['sample_recall']:.2f} < {min_recall}")
+    return report
+
+
+# ==================== 蓝绿重建 ====================
+def rebuild_index(alias=VECTOR_DB_NAME, file_path=KNOWLEDGE_FILE, embedding_function=None, registry=None):
+    """建新版本 → 校验 → 切换别名 → 安排回收旧版本；校验失败时删除新版本，线上不受影响"""
+    registry = registry or get_index_registry()
+    version = registry.new_version_name(alias)
+    logger.info("🏗️ 开始构建新索引版本: %s", version)
+
+    new_collection = open_collection(version, embedding_function)
+    try:
+        state = IngestionJob(file_path, new_collection, checkpoint_path_for(version)).run()
+        if chunk_store_path(version):
+            build_chunk_store(new_collection, chunk_store_path(version))
+        report = validate_index(new_collection, expected_count=state["ingested"])
+    except Exception:
+        get_client().delete_collection(version)
+        remove_chunk_store(chunk_store_path(version))
+        raise
+    logger.info("✅ 新版本校验通过: %s", report)
+
+    old = registry.switch(alias, version)
+    registry.schedule_garbage_collection()
+    return {"alias": alias, "version": version, "previous": old, **report}
+
+
+def start_rebuild(alias=VECTOR_DB_NAME, file_path=KNOWLEDGE_FILE, embedding_function=None):
+    """在后台线程执行 rebuild_index，重建期间查询继续使用当前版本"""
+    thread = threading.Thread(target=rebuild_index, args=(alias, file_path, embedding_function),
+                              name="index-rebuild", daemon=True)
+    thread.start()
+    return thread
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_index_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                alias_path = os.path.join(CHROMA_PERSIST_DIR, "index_aliases.json") if CHROMA_PERSIST_DIR else None
+                _registry = IndexRegistry(alias_path)
+    return _registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="蓝绿重建索引并切换别名")
+    parser.add_argument("--file", default=KNOWLEDGE_FILE)
+    parser.add_argument("--alias", default=VECTOR_DB_NAME)
+    parser.add_argument("--gc", action="store_true",
+                        help="不重建，立即回收已下线的旧版本（只在没有服务使用这些版本时运行）")
+    args = parser.parse_args()
+
+    registry = get_index_registry()
+    if args.gc:
+        print(f"🗑️ 已回收: {registry.collect_garbage(force=True) or '无'}")
+        return
+    report = rebuild_index(args.alias, args.file)
+    print(f"🔀 {report['alias']} → {report['version']}（上一版本 {report['previous']}，"
+          f"{report['count']} 段，抽样召回 {report.get('sample_recall', 0):.2f}）")
+    print("旧版本已标记下线，由运行中的服务排空后回收（没有服务在运行时可执行 --gc）")
+
+
+if __name__ == "__main__":
+    main()
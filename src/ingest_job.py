@@ -0,0 +1,281 @@
+"""
+    后台入库任务 - 分批写入、定期保存检查点、中断后从检查点续跑、进度与 ETA
+
+段落 id 为 doc_<段落序号>，只在同一个来源文件内唯一。检查点记着来源文件的指纹（大小 + sha256），
+来源变了不会再从 doc_0 开始覆盖已有段落：默认拒绝入库（换文件请用 main.py ingest --rebuild 蓝绿重建），
+replace=True 时先清空集合（只用于不在线服务的集合，例如租户重新入库）。
+
+命令行运行（需配置 CHROMA_PERSIST_DIR 才能跨进程续跑）：
+    python -m src.ingest_job --file data/your_notes.txt
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from src.config import (DEDUP_ENABLED, INGEST_BATCH_SIZE, INGEST_CHECKPOINT_EVERY, INGEST_CLEAR_BATCH_SIZE,
+                        KNOWLEDGE_FILE, VECTOR_DB_NAME)
+from src.dedup import Deduplicator
+from src.logger import get_logger
+from src.memory_profile import profile_stage
+from src.quota import LANE_BULK, quota_lane
+from src.utils import iter_paragraphs
+
+logger = get_logger("ingest_job")
+
+
+# ==================== 检查点 ====================
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    """先写临时文件再原子替换，进程在任意时刻被杀都不会留下半个检查点"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def has_unfinished_checkpoint(path):
+    state = load_checkpoint(path)
+    return state is not None and state.get("status") != "done"
+
+
+def file_fingerprint(path):
+    """大小 + 全文 sha256，识别来源文件是否变化"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(4 * 1024 * 1024), b''):
+            digest.update(block)
+    return f"{os.path.getsize(path)}:{digest.hexdigest()}"
+
+
+class SourceChangedError(Exception):
+    """集合里已有来自其它文件（或已变化文件）的段落，继续入库会按 doc_<序号> 覆盖它们"""
+
+
+# ==================== 入库任务 ====================
+class IngestionJob:
+    """把一个知识文件分批写入集合；可前台 run()，也可 start() 放到后台线程"""
+
+    def __init__(self, file_path, collection, checkpoint_path=None, batch_size=INGEST_BATCH_SIZE,
+                 checkpoint_every=INGEST_CHECKPOINT_EVERY, dedup=DEDUP_ENABLED, replace=False):
+        self.file_path = os.path.abspath(file_path)
+        self.collection = collection
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.dedup = dedup
+        self.replace = replace
+
+        self.file_size = os.path.getsize(self.file_path)
+        self.fingerprint = file_fingerprint(self.file_path)
+        self.state = {"file": self.file_path, "file_size": self.file_size, "fingerprint": self.fingerprint,
+                      "offset": 0, "next_index": 0, "ingested": 0, "skipped": 0, "status": "pending"}
+        self.started_at = None
+        self.start_offset = 0
+        self.error = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        """在后台线程运行，查询可以同时继续使用已有索引"""
+        self.thread = threading.Thread(target=self._run_safely, name="ingestion-job", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """请求在当前批次完成并保存检查点后停止"""
+        self.stop_event.set()
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return not self.is_running()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run_safely(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = e
+            logger.exception("❌ 入库任务失败，可从检查点续跑: %s", e)
+
+    # ---------- 主流程 ----------
+    def run(self):
+        self._resume()
+        self.started_at = time.monotonic()
+        self.start_offset = self.state["offset"]
+        self.state["status"] = "running"
+        try:
+            # 入库走 bulk 通道，在线问答的 embedding 调用优先拿配额
+            with quota_lane(LANE_BULK), profile_stage("ingest"):
+                return self._run_batches()
+        except Exception:
+            # 记录最后一个已提交批次的位置，下次从这里续跑
+            self.state["status"] = "failed"
+            self._checkpoint()
+            raise
+
+    def _run_batches(self):
+        deduplicator = self._rebuild_deduplicator()
+
+        # 跳过数随批次一起提交：续跑会重新处理未提交的部分，提前计数会重复累加
+        batch_ids, batch_docs, batch_skipped, batches = [], [], 0, 0
+        index = self.state["next_index"]
+        for paragraph, end_offset in iter_paragraphs(self.file_path, self.state["offset"]):
+            if deduplicator is not None and deduplicator.add(index, paragraph)[0]:
+                batch_skipped += 1
+            else:
+                batch_ids.append(f"doc_{index}")
+                batch_docs.append(paragraph)
+            index += 1
+
+            if len(batch_docs) >= self.batch_size:
+                self._commit(batch_ids, batch_docs, index, end_offset, batch_skipped)
+                batch_ids, batch_docs, batch_skipped = [], [], 0
+                batches += 1
+                if batches % self.checkpoint_every == 0:
+                    self._checkpoint()
+                if self.stop_event.is_set():
+                    self.state["status"] = "stopped"
+                    self._checkpoint()
+                    logger.info("⏸️ 入库任务已暂停: %s", self.progress_text())
+                    return self.state
+
+        self._commit(batch_ids, batch_docs, index, self.file_size, batch_skipped)
+        self.state["status"] = "done"
+        self._checkpoint()
+        if deduplicator is not None:
+            logger.info(deduplicator.report.summary())
+        logger.info("✅ 入库完成: 写入 %d 段，跳过重复 %d 段", self.state["ingested"], self.state["skipped"])
+        return self.state
+
+    def _resume(self):
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        same_source = (checkpoint is not None and checkpoint.get("file") == self.file_path
+                       and checkpoint.get("file_size") == self.file_size
+                       and checkpoint.get("fingerprint", self.fingerprint) == self.fingerprint)
+        if not same_source:
+            self._check_empty(checkpoint)
+            return
+        self.state.update(checkpoint)
+        if checkpoint.get("status") != "done":
+            logger.info("🔁 从检查点续跑: 偏移 %d / %d 字节，已写入 %d 段",
+                        checkpoint["offset"], self.file_size, checkpoint["ingested"])
+
+    def _check_empty(self, checkpoint):
+        """从头入库前集合必须是空的，否则新文件的 doc_0... 会覆盖已有段落"""
+        count = self.collection.count()
+        if count == 0:
+            return
+        source = checkpoint.get("file") if checkpoint else "未知（没有检查点）"
+        if not self.replace:
+            raise SourceChangedError(f"集合 {self.collection.name} 已有 {count} 段，来源 {source} 与 "
+                                     f"{self.file_path} 不同；请用 main.py ingest --rebuild 建新版本")
+        logger.warning("来源文件已变化（%s → %s），清空集合 %s 的 %d 段后重新入库",
+                       source, self.file_path, self.collection.name, count)
+        while True:
+            ids = self.collection.get(limit=INGEST_CLEAR_BATCH_SIZE, include=[])["ids"]
+            if not ids:
+                break
+            self.collection.delete(ids=ids)
+
+    def _rebuild_deduplicator(self):
+        """续跑时用已处理部分重建去重状态（纯本地计算，不调用 API）"""
+        if not self.dedup:
+            return None
+        deduplicator = Deduplicator()
+        if self.state["offset"]:
+            for i, (paragraph, end_offset) in enumerate(iter_paragraphs(self.file_path)):
+                if end_offset > self.state["offset"]:
+                    break
+                deduplicator.add(i, paragraph)
+        return deduplicator
+
+    def _commit(self, ids, documents, next_index, offset, skipped=0):
+        """写入一批；upsert 保证崩溃后重放同一批不会产生重复"""
+        if documents:
+            with profile_stage("ingest.upsert", len(documents)):
+                self.collection.upsert(ids=ids, documents=documents)
+        with self.lock:
+            self.state["ingested"] += len(documents)
+            self.state["skipped"] += skipped
+            self.state["next_index"] = next_index
+            self.state["offset"] = offset
+
+    def _checkpoint(self):
+        if self.checkpoint_path:
+            with self.lock:
+                state = dict(self.state, updated_at=time.time())
+            save_checkpoint(self.checkpoint_path, state)
+
+    # ---------- 进度 ----------
+    def progress(self):
+        """按已处理字节估算进度和剩余时间"""
+        with self.lock:
+            state = dict(self.state)
+        done_bytes = state["offset"]
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        rate = (done_bytes - self.start_offset) / elapsed if elapsed > 0 else 0.0
+        remaining = self.file_size - done_bytes
+        return {
+            "status": "failed" if self.error else state["status"],
+            "ingested": state["ingested"],
+            "skipped": state["skipped"],
+            "bytes_done": done_bytes,
+            "bytes_total": self.file_size,
+            "percent": 100.0 * done_bytes / self.file_size if self.file_size else 100.0,
+            "bytes_per_second": rate,
+            "eta_seconds": remaining / rate if rate > 0 else None,
+            "error": str(self.error) if self.error else None,
+        }
+
+    def progress_text(self):
+        p = self.progress()
+        eta = f"{p['eta_seconds']:.0f}s" if p["eta_seconds"] is not None else "-"
+        return (f"{p['percent']:.1f}% ({p['ingested']} 段, 跳过 {p['skipped']}) "
+                f"{p['bytes_per_second'] / 1024:.1f} KB/s, 剩余约 {eta}")
+
+
+def main():
+    from src.index_registry import get_index_registry
+    from src.vector_store import checkpoint_path_for, open_collection
+
+    parser = argparse.ArgumentParser(description="可续跑的后台入库任务")
+    parser.add_argument("--file", default=KNOWLEDGE_FILE)
+    parser.add_argument("--collection", default=VECTOR_DB_NAME, help="集合别名，写入它当前上线的版本")
+    parser.add_argument("--interval", type=float, default=5.0, help="进度打印间隔（秒）")
+    args = parser.parse_args()
+
+    version = get_index_registry().resolve(args.collection)
+    job = IngestionJob(args.file, open_collection(version), checkpoint_path_for(version))
+    job.start()
+    try:
+        while not job.wait(args.interval):
+            print(f"⏳ {job.progress_text()}")
+    except KeyboardInterrupt:
+        job.stop()
+        job.wait()
+    print(f"📦 {job.progress_text()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+    日志模块 - 分级日志 + 逐请求采样 + 基于队列的非阻塞输出
+"""
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextlib import contextmanager
+
+from src.config import LOG_LEVEL, LOG_DEBUG_SAMPLE_RATE, LOG_QUEUE_SIZE
+
+ROOT_LOGGER_NAME = "rag"
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener = None
+_handler = None
+_sample_rate = LOG_DEBUG_SAMPLE_RATE
+_request_sampled = contextvars.ContextVar("request_sampled", default=None)  # 当前请求的采样决定
+
+
+# ==================== 非阻塞队列Handler ====================
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """请求线程只负责把日志放进队列，队列满时丢弃，绝不阻塞请求路径"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# ==================== 初始化与获取 ====================
+def setup_logging(level=None, sample_rate=None, stream=None, queue_size=None):
+    """初始化日志系统（可重复调用，后一次调用会替换前一次的配置）"""
+    global _listener, _handler, _sample_rate
+
+    shutdown_logging()
+
+    if sample_rate is not None:
+        _sample_rate = sample_rate
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(level or LOG_LEVEL)
+    root.propagate = False
+
+    # 真正写 stdout 的 handler 运行在后台监听线程中
+    output_handler = logging.StreamHandler(stream or sys.stdout)
+    output_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.Queue(maxsize=queue_size or LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    root.handlers = [_handler]
+
+    _listener = logging.handlers.QueueListener(log_queue, output_handler)
+    _listener.start()
+    return root
+
+
+def shutdown_logging():
+    """停止后台监听线程，并把队列中剩余的日志全部写出"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    """获取 rag.<name> 子日志器，首次调用时自动初始化"""
+    if _listener is None:
+        setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def _decide():
+    return _sample_rate >= 1.0 or random.random() < _sample_rate
+
+
+@contextmanager
+def sampled_request():
+    """在请求入口调用：整个请求只做一次采样决定，其中各处的 should_sample() 结果一致，
+    被采样请求的日志是完整的；嵌套调用沿用外层的决定"""
+    if _request_sampled.get() is not None:
+        yield _request_sampled.get()
+        return
+    token = _request_sampled.set(_decide())
+    try:
+        yield _request_sampled.get()
+    finally:
+        _request_sampled.reset(token)
+
+
+def should_sample():
+    """当前请求是否输出 DEBUG 日志；不在 sampled_request() 内时逐次随机决定"""
+    sampled = _request_sampled.get()
+    return _decide() if sampled is None else sampled
+
+
+def dropped_count():
+    """因队列已满而被丢弃的日志条数"""
+    return _handler.dropped if _handler is not None else 0
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,129 @@
+"""
+    内存剖析 - 按流水线阶段（入库、embedding、检索、生成）记录 tracemalloc 分配峰值与进程 RSS
+
+默认关闭：tracemalloc 会让每次分配变慢数倍，只在排查 OOM 或跑扩展性报告时开启。
+阶段可以嵌套，内层阶段的峰值同时计入外层；tracemalloc 的峰值是全进程的，
+多线程同时进入不同阶段时数字会互相混入，剖析时请单线程运行。
+
+    from src import memory_profile
+    memory_profile.enable(top_lines=5)
+    ...                                   # 跑入库或查询
+    print(memory_profile.memory_report())
+
+    python -m bench.bench_memory --sizes 10000,100000
+"""
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from src.config import MEMORY_PROFILING, MEMORY_PROFILING_TOP_LINES
+from src.metrics import metrics
+
+_enabled = False
+_top_lines = MEMORY_PROFILING_TOP_LINES
+_lock = threading.Lock()
+_stack = []   # 正在进行的阶段：[已观察到的峰值, 进入时的已分配字节数]
+_stages = {}
+
+
+def rss_bytes():
+    """当前常驻内存；没有 /proc 时退回峰值 RSS，都不可用时为 0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux 下单位为 KB
+
+
+# ==================== 开关 ====================
+def enable(top_lines=MEMORY_PROFILING_TOP_LINES):
+    """开始跟踪分配；top_lines > 0 时每个阶段额外保存分配最多的代码行（快照比较，开销更大）"""
+    global _enabled, _top_lines
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(1)
+    _top_lines = top_lines
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+# ==================== 阶段 ====================
+@contextmanager
+def profile_stage(name, items=None):
+    """统计一个阶段的分配峰值（相对进入时）、净增量与 RSS；items 为本次处理的条数，用于算每条字节数"""
+    if not _enabled:
+        yield
+        return
+
+    with _lock:
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            _stack[-1][0] = max(_stack[-1][0], peak)
+        tracemalloc.reset_peak()
+        _stack.append([current, current])
+    before = tracemalloc.take_snapshot() if _top_lines else None
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot() if _top_lines else None
+        with _lock:
+            current, peak = tracemalloc.get_traced_memory()
+            observed_peak, started_at = _stack.pop()
+            peak = max(peak, observed_peak)
+            if _stack:
+                _stack[-1][0] = max(_stack[-1][0], peak)
+            _record(name, peak - started_at, current - started_at, items, before, after)
+
+
+def _record(name, peak_bytes, net_bytes, items, before, after):
+    stats = _stages.setdefault(name, {"calls": 0, "items": 0, "peak_bytes": 0, "net_bytes": 0,
+                                      "mean_peak_bytes_per_item": 0.0, "rss_bytes": 0, "top": [],
+                                      "_item_peaks": 0})
+    stats["calls"] += 1
+    stats["peak_bytes"] = max(stats["peak_bytes"], peak_bytes)
+    stats["net_bytes"] += net_bytes
+    if items:
+        # 按调用平均，首次调用里的一次性分配（导入、缓存）不会主导结果
+        stats["items"] += items
+        stats["_item_peaks"] += peak_bytes
+        stats["mean_peak_bytes_per_item"] = stats["_item_peaks"] / stats["items"]
+    stats["rss_bytes"] = rss_bytes()
+    if before is not None and after is not None:
+        stats["top"] = [str(diff) for diff in after.compare_to(before, "lineno")[:_top_lines]]
+    metrics.observe(f"memory.{name}.peak_kb", peak_bytes / 1024)
+
+
+def memory_report():
+    """{阶段: 统计}，另附进程当前与峰值 RSS"""
+    with _lock:
+        stages = {name: {key: list(value) if key == "top" else value for key, value in stats.items()
+                         if not key.startswith("_")}
+                  for name, stats in _stages.items()}
+    return {"enabled": _enabled, "rss_bytes": rss_bytes(), "peak_rss_bytes": peak_rss_bytes(), "stages": stages}
+
+
+if MEMORY_PROFILING:
+    enable()
@@ -0,0 +1,91 @@
+"""
+    运行指标 - 进程内的计数器与延迟直方图（线程安全）
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+HISTOGRAM_WINDOW = 2048  # 每个直方图只保留最近的观测值
+
+
+# ==================== 直方图 ====================
+class Histogram:
+    """保留最近 window 个观测值，用于计算滑动窗口内的分位数"""
+
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.values.append(value)
+            self.count += 1
+            self.total += value
+
+    def percentile(self, p):
+        with self.lock:
+            ordered = sorted(self.values)
+        if not ordered:
+            return None
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return ordered[idx]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+# ==================== 注册表 ====================
+class MetricsRegistry:
+    """按名字管理计数器和直方图"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def histogram(self, name):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            return self.histograms[name]
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        """以毫秒记录代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        return {"counters": counters,
+                "histograms": {name: h.snapshot() for name, h in histograms.items()}}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
@@ -0,0 +1,158 @@
+"""
+    多查询检索 - 把一个问题改写成几个变体（同义词替换、关键词抽取，可选大模型改写），
+    原问题与规则变体一次批量 embedding、一次索引查询，各自的排名用倒数排名融合（RRF）合并
+
+检索在调用方线程上执行，不会排在别的请求的变体后面。只有可选的大模型改写放在单独的小线程池里，
+期限内没有返回就取消或跳过、只用规则变体；改写出的问题再做一次批量查询
+（改写要等生成模型返回，与原问题合成一次调用就得让原问题也等它，所以这里多一次 embedding 调用）。
+"""
+import contextvars
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from src.config import (MULTI_QUERY_DEADLINE, MULTI_QUERY_LLM_PARAPHRASE, MULTI_QUERY_MAX_VARIANTS,
+                        MULTI_QUERY_PARAPHRASE_MODEL, MULTI_QUERY_PRIMARY_WEIGHT,
+                        MULTI_QUERY_RRF_K, MULTI_QUERY_SYNONYMS, TOP_K_RESULTS)
+from src.logger import get_logger
+from src.metrics import metrics
+
+logger = get_logger("multi_query")
+
+# 提问用语，抽关键词时去掉
+_QUESTION_WORDS = re.compile(r"什么是|是什么|有哪些|有什么|分别|如何|怎么样|怎么|怎样|为什么|为何|哪些|请问|介绍一下|吗|呢|[？?！!。，,、]")
+
+PARAPHRASE_PROMPT = "把下面的问题换一种说法改写{n}次，每行一个，只输出改写后的问题：\n{question}"
+
+# 只跑大模型改写；线程少，超期的改写被取消或在开始前跳过，不会越积越多
+_paraphrase_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="multi-query-paraphrase")
+
+
+# ==================== 查询改写 ====================
+def _synonym_groups():
+    """同义词表展开成双向查找：词 -> 同组的其它词"""
+    lookup = {}
+    for term, synonyms in MULTI_QUERY_SYNONYMS.items():
+        group = [term, *synonyms]
+        for word in group:
+            lookup.setdefault(word, []).extend(w for w in group if w != word)
+    return lookup
+
+
+def extract_keywords(question):
+    """去掉提问用语后剩下的关键词串，例如 “什么是过拟合？如何解决？” -> “过拟合 解决”"""
+    return " ".join(part for part in _QUESTION_WORDS.split(question) if part.strip()).strip()
+
+
+def expand_query(question, max_variants=MULTI_QUERY_MAX_VARIANTS):
+    """基于规则的本地改写，不调用任何接口；返回不含原问题的变体列表"""
+    variants = []
+    keywords = extract_keywords(question)
+    if keywords:
+        variants.append(keywords)
+    for word, synonyms in _synonym_groups().items():
+        if word in question:
+            for synonym in synonyms:
+                variants.append(question.replace(word, synonym))
+                if keywords:
+                    variants.append(keywords.replace(word, synonym))
+    return _dedupe(variants, exclude=question)[:max_variants]
+
+
+def paraphrase_query(question, n, deadline):
+    """让快速模型改写问题；失败或超时返回空列表，多查询退化为规则改写"""
+    from src.generation import GenerationError, get_generation_client
+
+    try:
+        result = get_generation_client().generate(prompt=PARAPHRASE_PROMPT.format(n=n, question=question),
+                                                  model=MULTI_QUERY_PARAPHRASE_MODEL, deadline=deadline)
+    except GenerationError as e:
+        logger.warning("问题改写失败，只使用规则改写: %s", e)
+        return []
+    lines = [re.sub(r"^\s*(\d+[.、)]|[-*])\s*", "", line).strip() for line in result.text.splitlines()]
+    return [line for line in lines if line][:n]
+
+
+def _dedupe(texts, exclude=None):
+    seen, unique = {exclude}, []
+    for text in texts:
+        if text and text not in seen:
+            seen.add(text)
+            unique.append(text)
+    return unique
+
+
+# ==================== 结果融合 ====================
+def reciprocal_rank_fusion(results, top_k, rrf_k=MULTI_QUERY_RRF_K, primary_weight=MULTI_QUERY_PRIMARY_WEIGHT):
+    """results 是 Chroma 的多查询结果（第一行是原问题，其余每个变体一行）；按 sum(权重 / (rrf_k + 排名)) 重新排序
+
+    返回单查询的 Chroma 结构，distances 取该段落在各变体中的最小距离，供路由判断检索是否明确。
+    """
+    scores, best = {}, {}
+    rows = zip(results["ids"], results["documents"], results["distances"])
+    for row, (row_ids, row_docs, row_distances) in enumerate(rows):
+        weight = primary_weight if row == 0 else 1.0  # 变体可能偏离原意，原问题的排名更可信
+        for rank, (doc_id, doc, distance) in enumerate(zip(row_ids, row_docs, row_distances), 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rrf_k + rank)
+            if doc_id not in best or distance < best[doc_id][1]:
+                best[doc_id] = (doc, distance)
+    fused = sorted(scores, key=lambda doc_id: (-scores[doc_id], best[doc_id][1]))[:top_k]
+    return {
+        "ids": [fused],
+        "documents": [[best[doc_id][0] for doc_id in fused]],
+        "distances": [[best[doc_id][1] for doc_id in fused]],
+    }
+
+
+def _concat(first, second):
+    """把两次查询的结果按行拼接（原问题在第一行）"""
+    return {key: first[key] + second[key] for key in ("ids", "documents", "distances")}
+
+
+# ==================== 多查询检索 ====================
+def _paraphrase_before(question, n, deadline_at):
+    """排队到期限之后才轮到的改写直接跳过"""
+    remaining = deadline_at - time.perf_counter()
+    if remaining <= 0:
+        return []
+    return paraphrase_query(question, n, remaining)
+
+
+def multi_query_retrieve(query_fn, question, top_k=TOP_K_RESULTS, deadline=MULTI_QUERY_DEADLINE,
+                         max_variants=MULTI_QUERY_MAX_VARIANTS, paraphrase=MULTI_QUERY_LLM_PARAPHRASE):
+    """query_fn(query_texts, top_k) 返回 Chroma 结构的多查询结果（rag_core.query_collection）
+
+    原问题与规则变体合在一次 query_fn 调用里（一次批量 embedding、一次索引查询），在调用方线程执行。
+    开启大模型改写时，改写超过 deadline 秒就放弃，只融合原问题与规则变体的结果。
+    """
+    start = time.perf_counter()
+    paraphrased = None
+    if paraphrase:
+        # 在调用方的上下文里执行：日志采样决定与配额通道随请求一起传到线程池
+        paraphrased = _paraphrase_executor.submit(contextvars.copy_context().run, _paraphrase_before,
+                                                  question, max_variants, start + deadline)
+
+    variants = expand_query(question, max_variants)
+    results = query_fn([question, *variants], top_k)
+
+    extra = []
+    if paraphrased is not None:
+        try:
+            extra = paraphrased.result(timeout=max(deadline - (time.perf_counter() - start), 0.0))
+        except FutureTimeoutError:
+            paraphrased.cancel()
+            metrics.inc("multi_query.fallbacks")
+            logger.warning("问题改写超过期限 %.2fs，只使用规则变体", deadline)
+        except Exception as e:
+            metrics.inc("multi_query.fallbacks")
+            logger.warning("问题改写失败，只使用规则变体: %s", e)
+        extra = _dedupe(extra, exclude=question)
+        extra = [text for text in extra if text not in variants][:max_variants]
+        if extra:
+            results = _concat(results, query_fn(extra, top_k))
+
+    metrics.observe("multi_query.variants", len(variants) + len(extra))
+    if not variants and not extra:
+        return results
+    metrics.observe("multi_query.latency_ms", (time.perf_counter() - start) * 1000)
+    return reciprocal_rank_fusion(results, top_k)
@@ -0,0 +1,93 @@
+"""
+    PCA 降维投影 - 在本地拟合，把全宽 embedding 投影到更低维度（API 不支持目标维度时使用）
+
+拟合：
+    python -m src.projection --dimension 200 --backend qwen
+"""
+import argparse
+import hashlib
+import itertools
+
+import numpy as np
+
+from src.config import EMBEDDING_BACKEND, KNOWLEDGE_FILE, PCA_PROJECTION_PATH
+
+
+class PCAProjection:
+    """x -> normalize((x - mean) @ components.T)"""
+
+    def __init__(self, mean, components):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def input_dim(self):
+        return self.components.shape[1]
+
+    @property
+    def output_dim(self):
+        return self.components.shape[0]
+
+    @property
+    def fingerprint(self):
+        """投影矩阵的指纹，记录在集合元数据里，防止入库和查询用了不同的投影"""
+        digest = hashlib.sha1(self.mean.tobytes() + self.components.tobytes()).hexdigest()
+        return digest[:12]
+
+    @classmethod
+    def fit(cls, vectors, dimension):
+        """用 SVD 拟合前 dimension 个主成分"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dimension > min(vectors.shape):
+            raise ValueError(f"样本数/维度不足以拟合 {dimension} 维投影: {vectors.shape}")
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dimension])
+
+    def transform(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        projected = (vectors - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def save(self, path=PCA_PROJECTION_PATH):
+        np.savez(path, mean=self.mean, components=self.components)
+        return path
+
+    @classmethod
+    def load(cls, path=PCA_PROJECTION_PATH):
+        data = np.load(path)
+        return cls(data["mean"], data["components"])
+
+
+def fit_projection(texts, embedding_function, dimension, path=PCA_PROJECTION_PATH, batch_size=10):
+    """用 embedding_function 对样本文本做全宽 embedding，拟合并保存投影"""
+    vectors = np.concatenate([embedding_function(texts[start:start + batch_size])
+                              for start in range(0, len(texts), batch_size)])
+    projection = PCAProjection.fit(vectors, dimension)
+    projection.save(path)
+    return projection
+
+
+def main():
+    from src.embeddings import get_embedding_function
+    from src.rag_core import load_documents_from_file
+
+    parser = argparse.ArgumentParser(description="拟合 PCA 降维投影")
+    parser.add_argument("--dimension", type=int, required=True)
+    parser.add_argument("--corpus", default=KNOWLEDGE_FILE)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND)
+    parser.add_argument("--sample", type=int, default=5000, help="最多用多少个段落拟合")
+    parser.add_argument("--output", default=PCA_PROJECTION_PATH)
+    args = parser.parse_args()
+
+    texts = list(itertools.islice(load_documents_from_file(args.corpus), args.sample))
+    # 拟合时必须使用全宽 embedding
+    embedding_function = get_embedding_function(args.backend, dimension=0)
+    projection = fit_projection(texts, embedding_function, args.dimension, args.output)
+    print(f"✅ 已保存 {projection.input_dim} → {projection.output_dim} 维投影 "
+          f"({projection.fingerprint}): {args.output}")
+
+
+if __name__ == "__main__":
+    main()
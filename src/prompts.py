@@ -0,0 +1,57 @@
+"""
+    提示词组装 - 前缀缓存友好的布局：固定的 system 指令在前，背景知识按段落 id 排序，问题放在最后
+
+相同（或部分相同）的检索结果会产生逐字相同的前缀，服务端的前缀缓存可以跳过这部分计算，
+重复和相似的问题首 token 更快、输入 tokens 也可能按缓存价计费。
+"""
+from src.config import (BASIC_PROMPT_TEMPLATE, BASIC_SYSTEM_PROMPT, PROMPT_LAYOUT, TEACHER_PROMPT_TEMPLATE,
+                        TEACHER_SYSTEM_PROMPT, USER_PROMPT_TEMPLATE)
+from src.metrics import metrics
+
+# 旧模板 -> 对应的固定指令；自定义模板没有对应项时退回单条提示词
+SYSTEM_PROMPTS = {
+    TEACHER_PROMPT_TEMPLATE: TEACHER_SYSTEM_PROMPT,
+    BASIC_PROMPT_TEMPLATE: BASIC_SYSTEM_PROMPT,
+}
+
+
+def _id_sort_key(doc_id):
+    """doc_12 按数字 12 排序，其它格式的 id 按字符串排在后面"""
+    prefix, _, number = doc_id.rpartition("_")
+    return (0, prefix, int(number), "") if number.isdigit() else (1, "", 0, doc_id)
+
+
+def order_chunks(ids, documents):
+    """按段落 id 排序：同一组段落无论检索分数顺序如何，拼出的上下文都完全相同"""
+    return [doc for _, doc in sorted(zip(ids, documents), key=lambda pair: _id_sort_key(pair[0]))]
+
+
+def build_messages(context, question, prompt_template=TEACHER_PROMPT_TEMPLATE, layout=None):
+    """返回传给生成客户端的 messages；layout 为 None 时使用 PROMPT_LAYOUT"""
+    layout = layout or PROMPT_LAYOUT
+    system_prompt = SYSTEM_PROMPTS.get(prompt_template)
+    if layout != "prefix_cache" or system_prompt is None:
+        return [{"role": "user", "content": prompt_template.format(context=context, question=question)}]
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": USER_PROMPT_TEMPLATE.format(context=context, question=question)},
+    ]
+
+
+def cached_tokens(usage):
+    """从响应 usage 中取命中前缀缓存的输入 tokens 数，没有该字段时为 0"""
+    details = (usage or {}).get("prompt_tokens_details") or {}
+    return details.get("cached_tokens", 0) or 0
+
+
+def prefix_cache_report():
+    """按模型汇总输入 tokens、命中前缀缓存的 tokens 和命中率"""
+    counters = metrics.snapshot()["counters"]
+    report = {}
+    for name, value in counters.items():
+        if name.startswith("generation.input_tokens."):
+            model = name[len("generation.input_tokens."):]
+            cached = counters.get(f"generation.cached_tokens.{model}", 0)
+            report[model] = {"input_tokens": value, "cached_tokens": cached,
+                             "cache_hit_ratio": cached / value if value else 0.0}
+    return report
@@ -0,0 +1,97 @@
+"""
+    查询缓存 - 进程内的问题向量、压缩用句子向量与答案缓存（线程安全的 LRU，可选 TTL）
+
+向量只取决于文本和 embedding 配置，缓存不改变结果；
+答案缓存默认关闭，开启后同一问题在 ANSWER_CACHE_TTL 内返回相同的答案。
+两个缓存都可以由 src.warmup 在启动时用查询日志里的热门问题预先填充。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from src.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, COMPRESSION_CACHE_SIZE, QUERY_EMBEDDING_CACHE_SIZE
+from src.metrics import metrics
+
+
+class LRUCache:
+    """最多保留 maxsize 条，超出时淘汰最久未用的；ttl 为 None 表示不过期，maxsize 为 0 表示关闭"""
+
+    def __init__(self, name, maxsize, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (写入时间, 值)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key):
+        """命中时返回值，否则返回 None"""
+        if not self.enabled:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        metrics.inc(f"{self.name}.{'hits' if entry is not None else 'misses'}")
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# ==================== 单例 ====================
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _get_cache(name, maxsize, ttl=None):
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(name, LRUCache(name, maxsize, ttl))
+    return cache
+
+
+def get_query_embedding_cache():
+    return _get_cache("query_embedding_cache", QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def get_sentence_embedding_cache():
+    return _get_cache("sentence_embedding_cache", COMPRESSION_CACHE_SIZE)
+
+
+def get_answer_cache():
+    return _get_cache("answer_cache", ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+
+
+def cache_report():
+    """{缓存名: 条数与命中率}"""
+    return {name: cache.stats() for name, cache in list(_caches.items())}
@@ -0,0 +1,216 @@
+"""
+    API 配额协调 - 同一台机器上所有进程共享的令牌桶，embedding 与生成各有独立的 QPS / TPM 预算
+
+桶的状态保存在 QUOTA_DIR/<预算>.json，读写前对文件加排他锁，多个进程（分片进程、服务、入库脚本）
+看到的是同一个桶。请求分两条通道：interactive（在线问答）与 bulk（入库、批量任务）；
+有 interactive 请求在排队时 bulk 让行，且 bulk 不能把桶用到 QUOTA_BULK_RESERVE 以下，
+在线问答总有余量可用。
+
+    with quota_lane("bulk"):
+        job.run()                       # 这期间的 embedding / 生成调用都走 bulk 通道
+
+    python -m src.quota status
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.config import (QUOTA_BUDGETS, QUOTA_BULK_RESERVE, QUOTA_BURST_SECONDS, QUOTA_DIR, QUOTA_ENABLED,
+                        QUOTA_WAIT_TIMEOUT)
+from src.logger import get_logger
+from src.metrics import metrics
+from src.utils import locked_file
+
+logger = get_logger("quota")
+
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+
+_WAITER_TTL = 2.0      # 排队登记多久不刷新视为已离开（进程被杀掉时不会永远阻塞 bulk）
+_MAX_SLEEP = 0.2       # 单次等待上限，让新到的 interactive 请求尽快被看到
+
+_lane = ContextVar("quota_lane", default=LANE_INTERACTIVE)
+
+
+class QuotaTimeoutError(Exception):
+    """在限定时间内没有拿到配额"""
+
+
+@contextmanager
+def quota_lane(lane):
+    """在这个上下文里发出的 API 调用走指定通道；新线程不继承，需要在线程内部重新设置"""
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+# ==================== 共享令牌桶 ====================
+class SharedTokenBucket:
+    """一个预算（如 embedding）的两个桶：请求数（QPS）和 tokens（TPM），状态存放在共享文件里"""
+
+    def __init__(self, name, requests_per_second=None, tokens_per_minute=None, directory=QUOTA_DIR,
+                 burst_seconds=QUOTA_BURST_SECONDS, bulk_reserve=QUOTA_BULK_RESERVE):
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.json")
+        # 每秒补充量与容量；None 表示该维度不限
+        self.rates = {"requests": requests_per_second,
+                      "tokens": tokens_per_minute / 60 if tokens_per_minute else None}
+        self.capacity = {key: max(rate * burst_seconds, 1.0) for key, rate in self.rates.items() if rate}
+        self.bulk_reserve = bulk_reserve
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------- 状态读写（调用方持有文件锁） ----------
+    def _read(self, f, now):
+        f.seek(0)
+        raw = f.read()
+        state = json.loads(raw) if raw.strip() else {}
+        levels = state.get("levels", {})
+        elapsed = max(now - state.get("updated", now), 0.0)
+        state["levels"] = {key: min(self.capacity[key], levels.get(key, self.capacity[key]) + elapsed * self.rates[key])
+                           for key in self.capacity}
+        state["updated"] = now
+        state["waiters"] = {k: v for k, v in state.get("waiters", {}).items() if v > now}
+        state.setdefault("blocked_until", 0.0)
+        return state
+
+    @staticmethod
+    def _write(f, state):
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(state))
+        f.flush()
+
+    def _shortfall(self, state, cost, reserve):
+        """还差多少秒才能放行；0 表示现在就可以"""
+        wait = 0.0
+        for key, level in state["levels"].items():
+            # 单次消耗超过桶容量时，桶满即可放行（允许欠账），否则大请求永远拿不到配额
+            needed = min(min(cost[key], self.capacity[key]) + reserve * self.capacity[key], self.capacity[key])
+            if level < needed:
+                wait = max(wait, (needed - level) / self.rates[key])
+        return wait
+
+    # ---------- 获取 ----------
+    def acquire(self, tokens=0, lane=None, timeout=QUOTA_WAIT_TIMEOUT):
+        """阻塞到配额足够后扣减，返回等待秒数；超过 timeout 抛出 QuotaTimeoutError"""
+        lane = lane or current_lane()
+        cost = {"requests": 1, "tokens": tokens}
+        start = time.monotonic()
+        waiter = f"{os.getpid()}-{threading.get_ident()}-{uuid.uuid4().hex[:6]}"
+        while True:
+            now = time.time()
+            with locked_file(self.path) as f:
+                state = self._read(f, now)
+                if lane == LANE_BULK and state["waiters"]:
+                    wait = _MAX_SLEEP  # 有在线请求排队，bulk 让行
+                else:
+                    reserve = self.bulk_reserve if lane == LANE_BULK else 0.0
+                    wait = max(self._shortfall(state, cost, reserve), state["blocked_until"] - now)
+                if wait <= 0:
+                    for key in state["levels"]:
+                        state["levels"][key] -= cost[key]
+                    state["waiters"].pop(waiter, None)
+                elif lane == LANE_INTERACTIVE:
+                    state["waiters"][waiter] = now + _WAITER_TTL
+                self._write(f, state)
+
+            waited = time.monotonic() - start
+            if wait <= 0:
+                metrics.observe(f"quota.wait_ms.{self.name}.{lane}", waited * 1000)
+                if waited > 0.001:
+                    metrics.inc(f"quota.throttled.{self.name}.{lane}")
+                return waited
+            if timeout is not None and waited + min(wait, _MAX_SLEEP) > timeout:
+                self._forget(waiter)
+                metrics.inc(f"quota.timeouts.{self.name}.{lane}")
+                raise QuotaTimeoutError(f"{self.name} 配额等待超过 {timeout}s（{lane}）")
+            time.sleep(min(wait, _MAX_SLEEP))
+
+    def _forget(self, waiter):
+        with locked_file(self.path) as f:
+            state = self._read(f, time.time())
+            state["waiters"].pop(waiter, None)
+            self._write(f, state)
+
+    # ---------- 校正 ----------
+    def adjust(self, tokens):
+        """按实际用量校正预估：tokens 为实际减预估，正数继续扣减，负数退还"""
+        if "tokens" not in self.capacity or not tokens:
+            return
+        with locked_file(self.path) as f:
+            state = self._read(f, time.time())
+            state["levels"]["tokens"] = min(self.capacity["tokens"], state["levels"]["tokens"] - tokens)
+            self._write(f, state)
+
+    def backoff(self, seconds):
+        """服务端已经限流（429）：所有进程在 seconds 秒内暂停该预算的请求"""
+        with locked_file(self.path) as f:
+            state = self._read(f, time.time())
+            state["blocked_until"] = max(state["blocked_until"], time.time() + seconds)
+            self._write(f, state)
+        metrics.inc(f"quota.backoffs.{self.name}")
+
+    def status(self):
+        with locked_file(self.path) as f:
+            state = self._read(f, time.time())
+            self._write(f, state)
+        return {"levels": state["levels"], "capacity": self.capacity, "waiting_interactive": len(state["waiters"]),
+                "blocked_for": max(state["blocked_until"] - time.time(), 0.0)}
+
+
+# ==================== 全局配额 ====================
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(name):
+    """返回某个预算的共享桶；QUOTA_ENABLED 关闭或该预算未配置时返回 None（不限流）"""
+    if not QUOTA_ENABLED or name not in QUOTA_BUDGETS:
+        return None
+    bucket = _buckets.get(name)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(name)
+            if bucket is None:
+                bucket = _buckets[name] = SharedTokenBucket(name, **QUOTA_BUDGETS[name])
+    return bucket
+
+
+def acquire(name, tokens=0, timeout=QUOTA_WAIT_TIMEOUT):
+    """API 调用前调用；未启用配额时立即返回 0"""
+    bucket = get_bucket(name)
+    return bucket.acquire(tokens, timeout=timeout) if bucket is not None else 0.0
+
+
+def quota_report():
+    return {name: get_bucket(name).status() for name in QUOTA_BUDGETS} if QUOTA_ENABLED else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 配额状态")
+    parser.add_argument("command", choices=["status", "reset"])
+    args = parser.parse_args()
+
+    for name, budget in QUOTA_BUDGETS.items():
+        bucket = SharedTokenBucket(name, **budget)
+        if args.command == "reset":
+            with locked_file(bucket.path) as f:
+                SharedTokenBucket._write(f, {})
+            print(f"♻️ 已重置 {name}")
+        else:
+            print(f"{name}: {json.dumps(bucket.status(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
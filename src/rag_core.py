@@ -1,109 +1,234 @@
 """
     核心RAG逻辑
+
+生成、压缩、多查询、路由、分片、快照与租户模块在用到时才导入，
+query / clear 等只检索或只清理的命令不必加载生成客户端（requests）等用不到的依赖。
 """
-import dashscope
-import chromadb
-from src.embeddings import QwenEmbeddingFunction
+import logging
+import time
+from contextlib import contextmanager
+
+from src.chunk_store import (build_chunk_store, chunk_store_is_current, chunk_store_path, close_chunk_store,
+                             get_chunk_store)
+from src.index_registry import get_index_registry
+from src.ingest_job import IngestionJob, clear_checkpoint, has_unfinished_checkpoint
 from src.config import *
+from src.logger import get_logger, sampled_request, should_sample
+from src.memory_profile import profile_stage
+from src.prompts import build_messages, order_chunks
+from src.query_cache import get_answer_cache
+from src.utils import iter_paragraphs
+from src.vector_store import checkpoint_path_for, get_client, open_collection
+
+logger = get_logger("rag_core")
 
 
 # ==================== 文档处理函数 ====================
 def load_documents_from_file(file_path=KNOWLEDGE_FILE):
     """从文件中读取文档并按段落分割"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
     # 按段落分割（每个段落是一个知识点）
-    paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
+    paragraphs = [p for p, _ in iter_paragraphs(file_path)]
     return paragraphs
 
 
 # ==================== 核心RAG函数 ====================
 collection = None
+collection_embedding_function = None  # 切换到新版本时沿用同一个 embedding 函数
 
 
 def get_collection():
     global collection
     if collection is None:
-        print("正在初始化向量数据库...")
+        logger.info("正在初始化向量数据库...")
         collection = initialize_vector_database()
+    elif not _is_sharded(collection):
+        # 其它进程（命令行重建、快照导入）切换了别名时，_on_index_switch 会把 collection 换成新版本
+        get_index_registry().refresh()
     return collection
 
 
-def retrieve_context(collection, question, top_k=TOP_K_RESULTS):
-    """检索相关文档"""
+def _is_sharded(collection):
+    """分片集合不走别名版本与段落文本库：文本由各分片自己返回，也没有按 id 读取的 get()"""
+    return getattr(collection, "sharded", False)
+
+
+def query_collection(collection, query_texts, top_k=TOP_K_RESULTS):
+    """一次查询多个问题（一次批量 embedding、一次索引查询），返回 Chroma 原始结果"""
+    store = None if _is_sharded(collection) else get_chunk_store(collection.name)
+    if store is None:
+        return collection.query(
+            query_texts=query_texts,
+            n_results=top_k
+        )
+    # 有段落文本库时 Chroma 只返回 id 和距离，文本从共享的 mmap 文件中按 id 切片
     results = collection.query(
-        query_texts=[question],
-        n_results=top_k
+        query_texts=query_texts,
+        n_results=top_k,
+        include=["distances"]
     )
+    results["documents"] = [store.get_many(ids) for ids in results["ids"]]
+    # 文本库生成之后才写入的段落不在库里，回退到 Chroma 读取
+    missing = {doc_id for ids, docs in zip(results["ids"], results["documents"])
+               for doc_id, doc in zip(ids, docs) if doc is None}
+    if missing:
+        fetched = collection.get(ids=list(missing), include=["documents"])
+        texts = dict(zip(fetched["ids"], fetched["documents"]))
+        results["documents"] = [[texts.get(doc_id) if doc is None else doc for doc_id, doc in zip(ids, docs)]
+                                for ids, docs in zip(results["ids"], results["documents"])]
+    return results
+
+
+def retrieve_documents(collection, question, top_k=TOP_K_RESULTS, multi_query=None):
+    """检索相关文档，返回 Chroma 原始结果（ids / documents / distances）
+
+    multi_query 为 None 时按 MULTI_QUERY_RETRIEVAL 决定是否改写问题做多查询检索。
+    """
+    with profile_stage("query.retrieve", 1):
+        if MULTI_QUERY_RETRIEVAL if multi_query is None else multi_query:
+            from src.multi_query import multi_query_retrieve
+            results = multi_query_retrieve(lambda texts, k: query_collection(collection, texts, k), question, top_k)
+        else:
+            results = query_collection(collection, [question], top_k)
+
+    # 逐条打印检索结果只在 DEBUG 级别且该请求被采样时进行
+    if logger.isEnabledFor(logging.DEBUG) and should_sample():
+        logger.debug("🔍 检索到的文档: %s", question)
+        for i, doc in enumerate(results['documents'][0], 1):
+            logger.debug("  %d. %s...", i, doc[:100])  # 只打印前100字符
+    return results
 
-    print(f"\n🔍 检索到的文档:")
-    for i, doc in enumerate(results['documents'][0], 1):
-        print(f"  {i}. {doc[:100]}...")  # 只打印前100字符
-    print()
 
+def retrieve_context(collection, question, top_k=TOP_K_RESULTS):
+    """检索相关文档"""
+    results = retrieve_documents(collection, question, top_k)
     context = "\n".join(results['documents'][0])
     return context
 
 
-def ask_question(question: str, prompt_template=TEACHER_PROMPT_TEMPLATE) -> str:
-    """核心问答函数"""
-    # 获取collection
-    current_collection = get_collection()
-
-    # 1. 检索相关文档
-    context = retrieve_context(current_collection, question)
+def ask_question(question: str, prompt_template=TEACHER_PROMPT_TEMPLATE, tenant=None) -> str:
+    """核心问答函数；指定 tenant 时检索该租户自己的索引"""
+    # 整个请求只做一次日志采样决定，检索、embedding 各处的 DEBUG 日志要么全有要么全无
+    with sampled_request():
+        return _answer(question, prompt_template, tenant)
 
-    # 2. 构造提示词
-    prompt = prompt_template.format(context=context, question=question)
 
-    # 3. 调用通义千问生成答案
-    response = dashscope.Generation.call(
-        model='qwen-plus',
-        prompt=prompt,
-        result_format='message'
-    )
+@contextmanager
+def _leased_collection(tenant):
+    """占用要检索的索引，返回 (collection, 答案缓存用的索引标识)
 
-    if response.status_code == 200:
-        return response.output.choices[0].message.content
+    主索引占用当前版本，蓝绿切换后旧版本要等查询结束才会被回收；租户索引按需加载，加载期间请求在此排队。
+    租户的索引标识带上代号，重新入库或导入快照后旧答案不再命中。
+    """
+    if tenant is None:
+        current_collection = get_collection()
+        with get_index_registry().lease(current_collection.name):
+            yield current_collection, current_collection.name
     else:
-        return f"调用失败: {response.message}"
-
-
-# ==================== 初始化向量数据库 ====================
-def initialize_vector_database():
-    global collection
+        from src.tenants import get_tenant_manager
+
+        with get_tenant_manager().lease_index(tenant) as index:
+            yield index.collection, f"{tenant}@{index.generation}/{index.collection.name}"
+
+
+def _answer(question, prompt_template, tenant):
+    from src.generation import get_generation_client
+    from src.router import ROUTE_EXTRACTIVE, get_router, record_route
+
+    # 1. 检索相关文档（答案缓存按索引版本区分，切换到新版本后旧答案不再命中）
+    answer_cache = get_answer_cache()
+    with _leased_collection(tenant) as (current_collection, index_key):
+        # 计时从拿到索引开始，两条路径口径一致（租户索引的加载耗时单独记在 tenants.load_ms）
+        start = time.perf_counter()
+        cache_key = (index_key, prompt_template, question)
+        answer = answer_cache.get(cache_key)
+        if answer is not None:
+            return answer
+        results = retrieve_documents(current_collection, question)
+    documents = results['documents'][0]
+
+    # 2. 按问题难度路由：简单的定义型问题直接返回最相关段落
+    decision = get_router().route(question, results, prompt_template)
+    if decision.route == ROUTE_EXTRACTIVE:
+        record_route(decision, (time.perf_counter() - start) * 1000)
+        answer_cache.set(cache_key, documents[0])
+        return documents[0]
+
+    # 3. 构造提示词：段落按 id 排序、固定指令放在 system 消息，便于服务端复用前缀缓存
+    #    （开启压缩时只保留与问题最相关的句子）
+    if PROMPT_LAYOUT == "prefix_cache":
+        documents = order_chunks(results['ids'][0], documents)
+    if CONTEXT_COMPRESSION:
+        from src.compression import get_compressor
+        context, _ = get_compressor().compress(question, documents)
+    else:
+        context = "\n".join(documents)
+    messages = build_messages(context, question, prompt_template)
 
+    # 4. 调用通义千问生成答案（超时、重试、熔断与降级由生成客户端负责，彻底失败时抛出 GenerationError）
+    with profile_stage("query.generate", 1):
+        result = get_generation_client().generate(messages=messages, model=decision.model)
+    record_route(decision, (time.perf_counter() - start) * 1000, result.model, result.usage)
+    answer_cache.set(cache_key, result.text)
+    return result.text
 
-    """初始化Chroma向量数据库并加载文档"""
-    client = chromadb.Client()
-    try:
-        collection = client.create_collection(
-            name=VECTOR_DB_NAME,
-        )
-        print(f"✅ 找到现有集合: {VECTOR_DB_NAME} (已有 {collection.count()} 个文档)")
-    except:
-        # 集合不存在，创建新集合
-        print(f"🆕 创建新集合: {VECTOR_DB_NAME}")
-        collection = client.create_collection(
-            name=VECTOR_DB_NAME,
-            embedding_function=QwenEmbeddingFunction()
-        )
 
+# ==================== 初始化向量数据库 ====================
+def initialize_vector_database(file_path=KNOWLEDGE_FILE, collection_name=VECTOR_DB_NAME,
+                               embedding_function=None):
+    """初始化Chroma向量数据库并加载文档；collection_name 是别名，解析为当前上线的版本"""
+    global collection, collection_embedding_function
+
+    if RETRIEVAL_SHARDS > 1:
+        # 分片模式：每片一个进程，按配置的 EMBEDDING_BACKEND 入库与查询
+        from src.sharding import open_sharded_collection
+        collection = open_sharded_collection(file_path, collection_name, RETRIEVAL_SHARDS)
+        return collection
+
+    registry = get_index_registry()
+    version = registry.resolve(collection_name)
+    collection = open_collection(version, embedding_function)
+    if collection_name == VECTOR_DB_NAME:
+        collection_embedding_function = embedding_function
+        if _on_index_switch not in registry.listeners:
+            registry.add_listener(_on_index_switch)
+    checkpoint_path = checkpoint_path_for(version)
     if collection.count() == 0:
-        print("正在加载文档到向量数据库...")
-        documents = load_documents_from_file()
-        for i, doc in enumerate(documents):
-            collection.add(
-                documents=[doc],
-                ids=[f"doc_{i}"]
-            )
-
-        print(f"✅ 已加载 {len(documents)} 个文档到向量数据库")
+        # 集合是空的，旧检查点记录的进度已经不存在了
+        clear_checkpoint(checkpoint_path)
+    if collection.count() == 0 and SNAPSHOT_PATH:
+        # 有快照时直接装载现成的向量，不调用 embedding API
+        from src.snapshot import load_snapshot
+        logger.info("正在从快照装载向量: %s", SNAPSHOT_PATH)
+        load_snapshot(SNAPSHOT_PATH, collection)
+    elif collection.count() == 0 or has_unfinished_checkpoint(checkpoint_path):
+        logger.info("正在加载文档到向量数据库...")
+        state = IngestionJob(file_path, collection, checkpoint_path).run()
+        logger.info("✅ 已加载 %d 个文档到向量数据库", state["ingested"])
     else:
-        print(f"✅ 集合已有 {collection.count()} 个文档，无需重复添加")
+        logger.info("✅ 集合已有 %d 个文档，无需重复添加", collection.count())
+
+    # 文本库按集合里实际的段落生成（入库文件、快照都一样）；集合之后又有写入时重建
+    store_path = chunk_store_path(version)
+    if store_path and not chunk_store_is_current(store_path, collection):
+        close_chunk_store(version)
+        build_chunk_store(collection, store_path)
     return collection
 
 
+def _on_index_switch(alias, version):
+    """别名切换后，新查询立即改用新版本"""
+    global collection
+    if alias == VECTOR_DB_NAME and not _is_sharded(collection):
+        collection = open_collection(version, collection_embedding_function)
+
+
+def start_background_ingestion(file_path=KNOWLEDGE_FILE, collection_name=VECTOR_DB_NAME):
+    """在后台线程入库（新文件或续跑），期间 ask_question 继续使用已有索引"""
+    version = get_index_registry().resolve(collection_name)
+    job = IngestionJob(file_path, open_collection(version), checkpoint_path_for(version))
+    return job.start()
+
+
 # ==================== 对话历史管理 ====================
 conversation_history = []
 
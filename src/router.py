@@ -0,0 +1,114 @@
+"""
+    模型路由 - 根据检索分数、问题长度和模板把问题分流到 抽取式 / 快速模型 / 大模型
+"""
+import re
+import threading
+
+from src.config import (BASIC_PROMPT_TEMPLATE, MODEL_PRICES, ROUTING_POLICY, ROUTING_THRESHOLDS)
+from src.metrics import metrics
+
+ROUTE_EXTRACTIVE = "extractive"  # 直接返回最相关段落，不调用大模型
+ROUTE_FAST = "fast"              # 便宜、快速的模型
+ROUTE_FULL = "full"              # 默认大模型
+
+# "什么是X" / "X是什么" / "X的定义" 这类定义型问题
+DEFINITION_PATTERN = re.compile(r"^(什么是|何为|何谓).{1,20}[？?]?$|^.{1,20}(是什么|是啥|的定义|指什么)[？?]?$")
+
+
+class RouteDecision:
+    """路由结果：走哪条路、用哪个模型、为什么"""
+
+    def __init__(self, route, model=None, reason=""):
+        self.route = route
+        self.model = model
+        self.reason = reason
+
+    def __repr__(self):
+        return f"RouteDecision({self.route}, {self.model}, {self.reason})"
+
+
+class Router:
+    """
+    可配置的路由策略：
+        adaptive     - 按信号自动分流（默认）
+        always_full  - 全部走大模型（等同于旧行为）
+        always_fast  - 全部走快速模型
+    """
+
+    def __init__(self, policy=ROUTING_POLICY, thresholds=None):
+        if policy not in ("adaptive", "always_full", "always_fast"):
+            raise ValueError(f"未知的路由策略: {policy}")
+        self.policy = policy
+        self.thresholds = dict(ROUTING_THRESHOLDS, **(thresholds or {}))
+
+    def route(self, question, results, prompt_template=None):
+        t = self.thresholds
+        if self.policy == "always_full":
+            return RouteDecision(ROUTE_FULL, t["full_model"], "policy")
+        if self.policy == "always_fast":
+            return RouteDecision(ROUTE_FAST, t["fast_model"], "policy")
+
+        distances = results["distances"][0] if results.get("distances") else []
+        if not distances:
+            return RouteDecision(ROUTE_FULL, t["full_model"], "没有检索分数")
+        top = distances[0]
+        margin = distances[1] - distances[0] if len(distances) > 1 else float("inf")
+        question = question.strip()
+
+        # 定义型问题且第一段明显胜出：答案就是那一段
+        if (DEFINITION_PATTERN.match(question) and top <= t["extractive_max_distance"]
+                and margin >= t["extractive_min_margin"]):
+            return RouteDecision(ROUTE_EXTRACTIVE, None, f"定义型问题 top={top:.3f} margin={margin:.3f}")
+
+        # 简短问题或只要求简洁回答的模板，且检索结果足够明确
+        if margin >= t["fast_min_margin"] and (
+                len(question) <= t["fast_max_question_len"] or prompt_template == BASIC_PROMPT_TEMPLATE):
+            return RouteDecision(ROUTE_FAST, t["fast_model"], f"简单问题 len={len(question)} margin={margin:.3f}")
+
+        return RouteDecision(ROUTE_FULL, t["full_model"], f"复杂问题 top={top:.3f} margin={margin:.3f}")
+
+
+# ==================== 路由指标 ====================
+def estimate_cost(model, usage):
+    """按 MODEL_PRICES（元/千 tokens）估算一次调用的费用"""
+    if model is None or model not in MODEL_PRICES or not usage:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[model]
+    return (usage.get("input_tokens", 0) * input_price + usage.get("output_tokens", 0) * output_price) / 1000
+
+
+def record_route(decision, latency_ms, model=None, usage=None):
+    """记录每条路由的请求数、延迟和费用"""
+    metrics.inc(f"route.requests.{decision.route}")
+    metrics.observe(f"route.latency_ms.{decision.route}", latency_ms)
+    cost = estimate_cost(model, usage)
+    if cost:
+        metrics.inc(f"route.cost.{decision.route}", cost)
+
+
+def route_report():
+    """汇总各路由的请求数、延迟分位与平均费用"""
+    snapshot = metrics.snapshot()
+    counters, histograms = snapshot["counters"], snapshot["histograms"]
+    report = {}
+    for route in (ROUTE_EXTRACTIVE, ROUTE_FAST, ROUTE_FULL):
+        requests = counters.get(f"route.requests.{route}", 0)
+        if not requests:
+            continue
+        cost = counters.get(f"route.cost.{route}", 0.0)
+        report[route] = {"requests": requests, "latency_ms": histograms.get(f"route.latency_ms.{route}"),
+                         "total_cost": cost, "cost_per_request": cost / requests}
+    return report
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router()
+    return _router
@@ -0,0 +1,143 @@
+"""
+    HTTP 服务 - 标准库 ThreadingHTTPServer，提供问答、检索、健康检查与指标接口
+
+    POST /ask      {"question": "...", "tenant": 可选}             -> {"answer": "..."}
+    POST /query    {"question": "...", "top_k": 3, "tenant": 可选} -> {"ids": [...], "documents": [...], "distances": [...]}
+    GET  /healthz                                   -> {"status": "ok", "documents": N}
+    GET  /metrics                                   -> 指标快照、路由统计、前缀缓存命中率、配额与预热状态
+
+/ask 与 /query 成功返回后问题才写入查询日志，下次启动时在后台重放热门问题预热缓存（见 src.warmup）。
+"""
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src import rag_core
+from src.config import MAX_TOP_K, TOP_K_RESULTS, WARMUP_ON_START
+from src.generation import GenerationError
+from src.index_registry import get_index_registry
+from src.logger import get_logger, sampled_request
+from src.memory_profile import is_enabled as memory_profiling_enabled, memory_report
+from src.metrics import metrics
+from src.prompts import prefix_cache_report
+from src.quota import QuotaTimeoutError, quota_report
+from src.router import route_report
+from src.sharding import ShardError
+from src.tenants import TenantNotFoundError, get_tenant_manager
+from src.warmup import get_query_log, start_warmup, warmup_report
+
+logger = get_logger("server")
+
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok", "documents": rag_core.get_collection().count()})
+        elif self.path == "/metrics":
+            self._send_json(200, {"metrics": metrics.snapshot(), "routes": route_report(),
+                                  "prefix_cache": prefix_cache_report(), "tenants": get_tenant_manager().stats(),
+                                  "quota": quota_report(), "warmup": warmup_report(),
+                                  "memory": memory_report() if memory_profiling_enabled() else None})
+        else:
+            self._send_json(404, {"error": f"未知路径: {self.path}"})
+
+    def _parse_request(self):
+        """返回 (question, tenant, top_k)；请求体不合法时返回错误信息字符串"""
+        try:
+            payload = self._read_json()
+        except ValueError:
+            return "请求体需要是 JSON"
+        if not isinstance(payload, dict):
+            return "请求体需要是 JSON 对象"
+        question, tenant, top_k = payload.get("question"), payload.get("tenant"), payload.get("top_k", TOP_K_RESULTS)
+        if not isinstance(question, str) or not question.strip():
+            return "question 需要是非空字符串"
+        if tenant is not None:
+            if not isinstance(tenant, str):
+                return "tenant 需要是字符串"
+            try:
+                get_tenant_manager().tenant_path(tenant)
+            except ValueError as e:
+                return str(e)
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or not 0 < top_k <= MAX_TOP_K:
+            return f"top_k 需要是 1 到 {MAX_TOP_K} 之间的整数"
+        return question, tenant, top_k
+
+    def do_POST(self):
+        if self.path not in ("/ask", "/query"):
+            self._send_json(404, {"error": f"未知路径: {self.path}"})
+            return
+        parsed = self._parse_request()
+        if isinstance(parsed, str):
+            self._send_json(400, {"error": parsed})
+            return
+        question, tenant, top_k = parsed
+
+        with metrics.timer(f"server.latency_ms{self.path.replace('/', '.')}"), sampled_request():
+            try:
+                if self.path == "/ask":
+                    status, response = 200, {"answer": rag_core.ask_question(question, tenant=tenant)}
+                else:
+                    status, response = 200, self._query(question, tenant, top_k)
+            except TenantNotFoundError as e:
+                status, response = 404, {"error": f"租户不存在: {e}"}
+            except QuotaTimeoutError as e:
+                status, response = 429, {"error": f"配额不足，请稍后重试: {e}"}
+            except (GenerationError, ShardError) as e:
+                status, response = 503, {"error": str(e)}
+            except Exception as e:
+                # embedding 接口、Chroma 等意料之外的错误也要回一个 JSON，而不是直接断开连接
+                logger.exception("处理 %s 失败", self.path)
+                status, response = 500, {"error": f"内部错误: {type(e).__name__}"}
+        if status != 200:
+            metrics.inc(f"server.errors.{status}")
+            self._send_json(status, response)
+            return
+        self._send_json(200, response)
+        # 只记录成功的问题，不存在的租户、生成失败的请求不会在下次启动时被预热重放
+        get_query_log().record(question, tenant)
+
+    def _query(self, question, tenant, top_k):
+        if tenant is None:
+            current_collection = rag_core.get_collection()
+            with get_index_registry().lease(current_collection.name):
+                results = rag_core.retrieve_documents(current_collection, question, top_k)
+        else:
+            with get_tenant_manager().lease(tenant) as tenant_collection:
+                results = rag_core.retrieve_documents(tenant_collection, question, top_k)
+        return {key: results[key][0] for key in ("ids", "documents", "distances")}
+
+
+def serve(host="127.0.0.1", port=8000):
+    """启动前先加载索引，第一个请求不必等待入库；热门问题在后台预热"""
+    rag_core.get_collection()
+    # 服务进程持有查询租约，由它回收下线的旧版本（包括命令行重建留下的）
+    get_index_registry().enable_garbage_collection()
+    if WARMUP_ON_START:
+        start_warmup()
+    server = ThreadingHTTPServer((host, port), RAGRequestHandler)
+    server.daemon_threads = True
+    logger.info("🚀 服务已启动: http://%s:%d", host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
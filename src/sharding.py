@@ -0,0 +1,310 @@
+"""
+    分片检索 - 入库时按段落 id 哈希分成 N 片，每片由独立进程持有一个集合；
+    查询时只在主进程算一次 query embedding，并行发给所有分片，按期限收集各片 top-k 后合并为全局 top-k
+
+ShardedCollection 实现了 retrieve_documents 用到的集合接口（name / count / query），
+配置 RETRIEVAL_SHARDS > 1 后 rag_core 会直接用它代替单个 Chroma 集合。
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from src.config import (CHROMA_PERSIST_DIR, DEDUP_ENABLED, INGEST_BATCH_SIZE, KNOWLEDGE_FILE,
+                        RETRIEVAL_SHARDS, SHARD_CALL_TIMEOUT, SHARD_QUERY_DEADLINE, SHARD_START_TIMEOUT,
+                        VECTOR_DB_NAME)
+from src.dedup import Deduplicator
+from src.logger import get_logger
+from src.metrics import metrics
+from src.quota import LANE_BULK, quota_lane
+from src.utils import iter_paragraphs
+
+logger = get_logger("sharding")
+
+_QUEUE_SIZE = 64  # 每个分片请求队列的长度，入库时起背压作用
+_POLL_SECONDS = 0.5  # 等待分片回复时检查分片进程是否还活着的间隔
+_READY = "ready"     # 分片进程启动完成（或失败）时回复的请求号
+
+
+class ShardError(Exception):
+    """分片进程返回错误"""
+
+
+# ==================== 分区 ====================
+def shard_for(doc_id, num_shards):
+    """稳定哈希：同一个 id 在任何进程、任何时候都落在同一片"""
+    return zlib.crc32(doc_id.encode("utf-8")) % num_shards
+
+
+def shard_collection_name(collection_name, shard_id, num_shards):
+    return f"{collection_name}_shard{shard_id}of{num_shards}"
+
+
+# ==================== 分片进程 ====================
+def _shard_worker(shard_id, num_shards, collection_name, backend, requests, responses):
+    """分片进程主循环：处理 upsert / query / count / stop，结果带上请求号写回共享响应队列
+
+    打开集合成功或失败都先回复一条 _READY，主进程据此判断启动结果，不会一直等下去。
+    """
+    try:
+        import chromadb
+
+        from src.embeddings import get_embedding_function
+        from src.vector_store import open_collection
+
+        if CHROMA_PERSIST_DIR:
+            # 每片独立目录，避免多个进程写同一个持久化库
+            client = chromadb.PersistentClient(
+                path=os.path.join(CHROMA_PERSIST_DIR, f"shard{shard_id}of{num_shards}"))
+        else:
+            client = chromadb.Client()
+        collection = open_collection(shard_collection_name(collection_name, shard_id, num_shards),
+                                     get_embedding_function(backend), client)
+    except Exception as e:
+        responses.put((_READY, shard_id, False, f"{type(e).__name__}: {e}"))
+        return
+    responses.put((_READY, shard_id, True, None))
+
+    while True:
+        request_id, op, payload = requests.get()
+        if op == "stop":
+            responses.put((request_id, shard_id, True, None))
+            return
+        try:
+            if op == "upsert":
+                ids, documents = payload
+                with quota_lane(LANE_BULK):
+                    collection.upsert(ids=ids, documents=documents)
+                result = len(ids)
+            elif op == "query":
+                embeddings, top_k = payload
+                n_results = min(top_k, collection.count())
+                result = collection.query(query_embeddings=embeddings, n_results=n_results) if n_results else None
+            elif op == "count":
+                result = collection.count()
+            else:
+                raise ValueError(f"未知操作: {op}")
+            responses.put((request_id, shard_id, True, result))
+        except Exception as e:
+            responses.put((request_id, shard_id, False, f"{type(e).__name__}: {e}"))
+
+
+# ==================== 分片集合 ====================
+class ShardedCollection:
+    """N 个分片进程 + 主进程内的一个响应分发线程"""
+
+    sharded = True  # rag_core 据此跳过别名切换与段落文本库
+
+    def __init__(self, collection_name=VECTOR_DB_NAME, num_shards=RETRIEVAL_SHARDS, backend=None,
+                 deadline=SHARD_QUERY_DEADLINE):
+        from src.embeddings import get_embedding_function
+
+        self.name = collection_name
+        self.num_shards = num_shards
+        # 分片进程按同一个 backend 各自创建 embedding 函数，保证向量空间一致
+        self.embedding_function = get_embedding_function(backend)
+        self.deadline = deadline
+
+        # spawn：分片进程不继承主进程里的线程和 Chroma 状态
+        context = multiprocessing.get_context("spawn")
+        self.responses = context.Queue()
+        self.requests = [context.Queue(_QUEUE_SIZE) for _ in range(num_shards)]
+        self.processes = [
+            context.Process(target=_shard_worker, name=f"shard-{i}", daemon=True,
+                            args=(i, num_shards, collection_name, backend, self.requests[i], self.responses))
+            for i in range(num_shards)
+        ]
+        self.pending = {}  # 请求号 -> (Future, 已收到的分片结果)
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count()
+        for process in self.processes:
+            process.start()
+        self._wait_ready()
+        self.dispatcher = threading.Thread(target=self._dispatch, name="shard-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def _wait_ready(self, timeout=SHARD_START_TIMEOUT):
+        """等所有分片打开集合；有分片启动失败、进程退出或超时时关掉全部分片并抛出 ShardError"""
+        deadline = time.monotonic() + timeout
+        ready, error = set(), None
+        while len(ready) < self.num_shards and error is None:
+            try:
+                request_id, shard_id, ok, result = self.responses.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                dead = [i for i in self._dead_shards() if i not in ready]
+                if dead:
+                    error = f"分片进程 {dead} 启动时退出"
+                elif time.monotonic() > deadline:
+                    error = f"{timeout}s 内只有 {len(ready)}/{self.num_shards} 个分片启动完成"
+                continue
+            if request_id == _READY:
+                if ok:
+                    ready.add(shard_id)
+                else:
+                    error = f"分片 {shard_id} 启动失败: {result}"
+        if error is not None:
+            self.close()
+            raise ShardError(error)
+
+    def _dead_shards(self):
+        return [i for i, process in enumerate(self.processes) if not process.is_alive()]
+
+    # ---------- 请求分发 ----------
+    def _dispatch(self):
+        while True:
+            try:
+                request_id, shard_id, ok, result = self.responses.get()
+            except (EOFError, OSError):
+                return
+            with self.pending_lock:
+                entry = self.pending.get(request_id)
+                if entry is None:  # 已超时放弃的请求
+                    continue
+                future, parts, expected = entry
+                parts[shard_id] = result if ok else ShardError(f"分片 {shard_id}: {result}")
+                if len(parts) == expected:
+                    del self.pending[request_id]
+                    future.set_result(parts)
+
+    def _scatter(self, op, payloads):
+        """payloads: {分片号: 参数}；返回一个在所有分片都回复后完成的 Future"""
+        request_id = next(self.request_ids)
+        future = Future()
+        parts = {}
+        with self.pending_lock:
+            self.pending[request_id] = (future, parts, len(payloads))
+        for shard_id, payload in payloads.items():
+            self.requests[shard_id].put((request_id, op, payload))
+        return request_id, future, parts
+
+    def _gather(self, request_id, future, parts, timeout=SHARD_CALL_TIMEOUT):
+        """等待所有分片；超时或还没回复的分片进程已退出时，返回已到达的部分结果
+        （请求作废，迟到的回复被丢弃）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                return future.result(max(0.0, min(remaining, _POLL_SECONDS))), False
+            except FutureTimeoutError:
+                if remaining > _POLL_SECONDS and not [i for i in self._dead_shards() if i not in parts]:
+                    continue
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+                return dict(parts), True
+
+    def _call_all(self, op, payload=None, timeout=SHARD_CALL_TIMEOUT):
+        parts, timed_out = self._gather(*self._scatter(op, {i: payload for i in range(self.num_shards)}), timeout)
+        if timed_out:
+            raise ShardError(f"{op} 超时或分片进程已退出，{len(parts)}/{self.num_shards} 个分片已回复"
+                             f"（已退出: {self._dead_shards()}）")
+        for result in parts.values():
+            if isinstance(result, ShardError):
+                raise result
+        return [parts[i] for i in range(self.num_shards)]
+
+    # ---------- 集合接口 ----------
+    def count(self):
+        return sum(self._call_all("count"))
+
+    def query(self, query_texts, n_results=10, include=None):
+        """和 Chroma 的 query 返回同样结构；多个问题一次算 embedding、一次发给各分片，每片先取 top-k 再逐个问题全局合并"""
+        start = time.perf_counter()
+        embeddings = self.embedding_function.embed_query(query_texts)
+        request_id, future, parts = self._scatter(
+            "query", {i: (embeddings, n_results) for i in range(self.num_shards)})
+        remaining = self.deadline - (time.perf_counter() - start)
+        parts, timed_out = self._gather(request_id, future, parts, max(remaining, 0.0))
+
+        merged = [[] for _ in range(len(embeddings))]
+        for shard_id, result in parts.items():
+            if isinstance(result, ShardError):
+                metrics.inc("retrieval.shard_errors")
+                logger.warning("%s", result)
+            elif result is not None:
+                for row, found in enumerate(merged):
+                    found.extend(zip(result["distances"][row], result["ids"][row], result["documents"][row]))
+        if timed_out:
+            metrics.inc("retrieval.shard_timeouts")
+            logger.warning("分片查询超过期限或分片进程已退出，仅合并 %d/%d 个分片", len(parts), self.num_shards)
+        for found in merged:
+            found.sort(key=lambda item: item[0])
+            del found[n_results:]
+        metrics.observe("retrieval.sharded_ms", (time.perf_counter() - start) * 1000)
+
+        return {
+            "ids": [[doc_id for _, doc_id, _ in found] for found in merged],
+            "documents": [[doc for _, _, doc in found] for found in merged],
+            "distances": [[distance for distance, _, _ in found] for found in merged],
+            "partial": timed_out or len(parts) < self.num_shards,
+        }
+
+    # ---------- 入库 ----------
+    def ingest(self, file_path=KNOWLEDGE_FILE, batch_size=INGEST_BATCH_SIZE, dedup=DEDUP_ENABLED):
+        """主进程流式读取并去重，按 id 哈希分发给各分片并行写入（embedding 在分片进程里计算）"""
+        deduplicator = Deduplicator() if dedup else None
+        batches = {i: ([], []) for i in range(self.num_shards)}
+        futures = []
+
+        def flush(shard_id):
+            ids, documents = batches[shard_id]
+            if ids:
+                futures.append(self._scatter("upsert", {shard_id: (ids, documents)}))
+                batches[shard_id] = ([], [])
+
+        for index, (paragraph, _) in enumerate(iter_paragraphs(file_path)):
+            if deduplicator is not None and deduplicator.add(index, paragraph)[0]:
+                continue
+            doc_id = f"doc_{index}"
+            shard_id = shard_for(doc_id, self.num_shards)
+            batches[shard_id][0].append(doc_id)
+            batches[shard_id][1].append(paragraph)
+            if len(batches[shard_id][0]) >= batch_size:
+                flush(shard_id)
+        for shard_id in range(self.num_shards):
+            flush(shard_id)
+
+        ingested = 0
+        for request_id, future, parts in futures:
+            results, timed_out = self._gather(request_id, future, parts)
+            if timed_out:
+                raise ShardError(f"分片写入超时或分片进程已退出（已退出: {self._dead_shards()}）")
+            for result in results.values():
+                if isinstance(result, ShardError):
+                    raise result
+                ingested += result
+        if deduplicator is not None:
+            logger.info(deduplicator.report.summary())
+        logger.info("✅ 分片入库完成: %d 段写入 %d 个分片", ingested, self.num_shards)
+        return ingested
+
+    def close(self):
+        for shard_queue in self.requests:
+            try:
+                shard_queue.put((None, "stop", None), timeout=1)
+            except queue.Full:
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+def open_sharded_collection(file_path=KNOWLEDGE_FILE, collection_name=VECTOR_DB_NAME, num_shards=RETRIEVAL_SHARDS,
+                            backend=None):
+    """启动分片进程；分片都是空的时候入库"""
+    sharded = ShardedCollection(collection_name, num_shards, backend)
+    try:
+        count = sharded.count()
+        if count == 0:
+            logger.info("正在分片入库（%d 个分片）...", num_shards)
+            sharded.ingest(file_path)
+        else:
+            logger.info("✅ %d 个分片已有 %d 个文档，无需重复添加", num_shards, count)
+    except Exception:
+        sharded.close()
+        raise
+    return sharded
@@ -0,0 +1,302 @@
+"""
+    Embedding 快照 - 把集合中已算好的向量连同 id、原文、元数据导出为可拷贝的快照目录，
+    新节点直接从快照批量装载，不调用任何 embedding API
+
+快照目录结构（按列存放，向量可以 mmap 读取）：
+    manifest.json   格式版本、条数、维度、embedding 模型/维度/投影、各文件的 sha256
+    vectors.npy     (条数, 维度) 的 float32 矩阵
+    records.jsonl   每行 {"id", "document", "metadata"}，与 vectors.npy 逐行对应
+
+    python -m src.snapshot export data/snapshots/my_docs
+    python -m src.snapshot verify data/snapshots/my_docs
+    python -m src.snapshot import data/snapshots/my_docs              # 装载为新版本并切换别名
+    python -m src.snapshot import data/snapshots/my_docs --tenant acme  # 装载到租户的新目录并切换
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from src.config import SNAPSHOT_BATCH_SIZE, TENANT_COLLECTION_NAME, VECTOR_DB_NAME
+from src.embeddings import EmbeddingMismatchError
+from src.logger import get_logger
+from src.metrics import metrics
+
+logger = get_logger("snapshot")
+
+SNAPSHOT_FORMAT = "rag-embedding-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+_HASH_CHUNK = 4 * 1024 * 1024
+
+
+class SnapshotError(Exception):
+    """快照缺失、格式不对或校验和不一致"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _embedding_metadata(collection):
+    """集合元数据里记录的 embedding 配置（open_collection 创建集合时写入）"""
+    return {k: v for k, v in (collection.metadata or {}).items() if k.startswith("embedding_")}
+
+
+def _max_batch_size(collection, batch_size):
+    client = getattr(collection, "_client", None)
+    limit = client.get_max_batch_size() if client is not None and hasattr(client, "get_max_batch_size") else None
+    return min(batch_size, limit) if limit else batch_size
+
+
+# ==================== 导出 ====================
+def export_snapshot(collection, path, batch_size=SNAPSHOT_BATCH_SIZE):
+    """分页读出集合写入快照目录（先写临时目录再改名，导出中断不会留下半个快照），返回 manifest"""
+    from src.chunk_store import get_chunk_store
+
+    count = collection.count()
+    if count == 0:
+        raise SnapshotError(f"集合 {collection.name} 是空的，没有可导出的向量")
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    start = time.perf_counter()
+    store = get_chunk_store(collection.name)
+    vectors, written = None, 0
+    with open(os.path.join(tmp_path, RECORDS_FILE), 'w', encoding='utf-8') as records:
+        for offset in range(0, count, batch_size):
+            page = collection.get(limit=batch_size, offset=offset,
+                                  include=["embeddings", "documents", "metadatas"])
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if vectors is None:
+                # 按总条数预先分配 .npy，逐页写入，内存里只有一页向量
+                vectors = np.lib.format.open_memmap(os.path.join(tmp_path, VECTORS_FILE), mode="w+",
+                                                    dtype=np.float32, shape=(count, embeddings.shape[1]))
+            documents = page["documents"]
+            if store is not None and not any(documents):
+                documents = store.get_many(page["ids"])  # 段落原文只存放在文本库里
+            metadatas = page["metadatas"] or [None] * len(page["ids"])
+            vectors[written:written + len(page["ids"])] = embeddings
+            for doc_id, document, metadata in zip(page["ids"], documents, metadatas):
+                records.write(json.dumps({"id": doc_id, "document": document, "metadata": metadata},
+                                         ensure_ascii=False) + "\n")
+            written += len(page["ids"])
+    vectors.flush()
+    del vectors
+    if written != count:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise SnapshotError(f"导出期间集合发生变化：预期 {count} 条，实际读到 {written} 条")
+
+    dimension = int(np.load(os.path.join(tmp_path, VECTORS_FILE), mmap_mode="r").shape[1])
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "collection": collection.name,
+        "count": count,
+        "dimension": dimension,
+        "dtype": "float32",
+        "embedding": _embedding_metadata(collection),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": {name: {"sha256": _sha256(os.path.join(tmp_path, name)),
+                         "bytes": os.path.getsize(os.path.join(tmp_path, name))}
+                  for name in (VECTORS_FILE, RECORDS_FILE)},
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info("📦 已导出快照 %s: %d 条 × %d 维（%.1f 秒）", path, count, dimension, time.perf_counter() - start)
+    return manifest
+
+
+# ==================== 校验 ====================
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise SnapshotError(f"{path} 不是快照目录（缺少 {MANIFEST_FILE}）")
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"不支持的快照格式: {manifest.get('format')} v{manifest.get('version')}")
+    return manifest
+
+
+def verify_snapshot(path):
+    """校验文件大小、sha256 与向量形状，返回 manifest"""
+    manifest = read_manifest(path)
+    for name, expected in manifest["files"].items():
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != expected["bytes"]:
+            raise SnapshotError(f"{file_path} 缺失或大小不一致")
+        if _sha256(file_path) != expected["sha256"]:
+            raise SnapshotError(f"{file_path} 校验和不一致，文件可能损坏")
+    vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    if vectors.shape != (manifest["count"], manifest["dimension"]) or vectors.dtype != np.float32:
+        raise SnapshotError(f"向量形状/类型 {vectors.shape} {vectors.dtype} 与 manifest 不一致")
+    return manifest
+
+
+# ==================== 装载 ====================
+def _iter_record_batches(path, batch_size):
+    batch = []
+    with open(os.path.join(path, RECORDS_FILE), 'r', encoding='utf-8') as f:
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def load_snapshot(path, collection, batch_size=SNAPSHOT_BATCH_SIZE, verify=True):
+    """把快照批量写入集合（直接写入向量，零 API 调用），返回写入条数
+
+    集合记录的 embedding 配置必须与快照一致，否则之后的查询向量与库里的向量不在同一空间。
+    """
+    manifest = verify_snapshot(path) if verify else read_manifest(path)
+    recorded = _embedding_metadata(collection)
+    mismatched = {k: (v, recorded[k]) for k, v in manifest["embedding"].items() if k in recorded and recorded[k] != v}
+    if mismatched:
+        raise EmbeddingMismatchError(f"快照与集合 {collection.name} 的 embedding 配置不一致（快照, 集合）: {mismatched}")
+
+    start = time.perf_counter()
+    vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    batch_size = _max_batch_size(collection, batch_size)
+    loaded = 0
+    for records in _iter_record_batches(path, batch_size):
+        metadatas = [r["metadata"] for r in records]
+        collection.upsert(ids=[r["id"] for r in records],
+                          embeddings=np.ascontiguousarray(vectors[loaded:loaded + len(records)]),
+                          documents=[r["document"] for r in records],
+                          metadatas=metadatas if any(metadatas) else None)
+        loaded += len(records)
+    if loaded != manifest["count"]:
+        raise SnapshotError(f"records.jsonl 有 {loaded} 行，manifest 记录 {manifest['count']} 条")
+
+    elapsed = time.perf_counter() - start
+    metrics.observe("snapshot.load_ms", elapsed * 1000)
+    logger.info("📥 已从快照装载 %d 条到 %s（%.1f 秒，%.0f 条/秒）", loaded, collection.name, elapsed,
+                loaded / elapsed if elapsed else 0.0)
+    return loaded
+
+
+def check_loaded(collection, path, sample_size=20, top_k=3):
+    """用快照里的向量抽样自查：每条向量都应在 top_k 内找回自己（用现成向量查询，不调用 API）"""
+    manifest = read_manifest(path)
+    vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    rows = np.linspace(0, manifest["count"] - 1, min(sample_size, manifest["count"])).astype(int)
+    ids = []
+    with open(os.path.join(path, RECORDS_FILE), 'r', encoding='utf-8') as f:
+        wanted = set(rows.tolist())
+        for i, line in enumerate(f):
+            if i in wanted:
+                ids.append(json.loads(line)["id"])
+    results = collection.query(query_embeddings=np.ascontiguousarray(vectors[rows]),
+                               n_results=min(top_k, manifest["count"]), include=["distances"])
+    hits = sum(doc_id in found for doc_id, found in zip(ids, results["ids"]))
+    return hits / len(ids)
+
+
+def import_snapshot(path, alias=VECTOR_DB_NAME, embedding_function=None, registry=None):
+    """装载为别名的新版本，自查通过后原子切换别名（与 rebuild_index 相同的蓝绿流程），返回新版本名"""
+    from src.index_registry import IndexValidationError, get_index_registry
+    from src.vector_store import get_client, open_collection
+
+    registry = registry or get_index_registry()
+    version = registry.new_version_name(alias)
+    collection = open_collection(version, embedding_function)
+    try:
+        load_snapshot(path, collection)
+        recall = check_loaded(collection, path)
+        if recall < 1.0:
+            raise IndexValidationError(f"快照装载后抽样自查召回 {recall:.2f} < 1.0")
+    except Exception:
+        get_client().delete_collection(version)
+        raise
+    registry.switch(alias, version)
+    registry.schedule_garbage_collection()
+    return version
+
+
+def import_tenant_snapshot(path, tenant, manager=None):
+    """装载到租户的新目录，自查通过后原子切换（旧段落不会残留），返回装载条数
+
+    服务进程下一次查询该租户时发现代号变化、重新加载，不需要在本进程里卸载什么。
+    """
+    import chromadb
+
+    from src.index_registry import IndexValidationError
+    from src.tenants import get_tenant_manager
+    from src.vector_store import open_collection
+
+    manager = manager or get_tenant_manager()
+    version_path = manager.new_version_path(tenant)
+    os.makedirs(version_path)
+    client = chromadb.PersistentClient(path=version_path)
+    try:
+        collection = open_collection(TENANT_COLLECTION_NAME, manager.embedding_function, client)
+        loaded = load_snapshot(path, collection)
+        recall = check_loaded(collection, path)
+        if recall < 1.0:
+            raise IndexValidationError(f"快照装载后抽样自查召回 {recall:.2f} < 1.0")
+    except Exception:
+        getattr(client, "close", lambda: None)()
+        shutil.rmtree(version_path, ignore_errors=True)
+        raise
+    getattr(client, "close", lambda: None)()
+    manager.publish(tenant, version_path)
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding 快照导出 / 校验 / 装载")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="把集合导出为快照")
+    export.add_argument("path")
+    export.add_argument("--collection", default=VECTOR_DB_NAME, help="别名或版本名")
+    verify = subparsers.add_parser("verify", help="校验快照文件")
+    verify.add_argument("path")
+    load = subparsers.add_parser("import", help="从快照装载")
+    load.add_argument("path")
+    load.add_argument("--alias", default=VECTOR_DB_NAME)
+    load.add_argument("--tenant", default=None, help="装载到租户目录而不是主索引")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        manifest = verify_snapshot(args.path)
+        print(f"✅ 快照完整: {manifest['count']} 条 × {manifest['dimension']} 维，{manifest['embedding']}")
+        return
+
+    from src.config import CHROMA_PERSIST_DIR
+
+    if args.command == "export":
+        from src.index_registry import get_index_registry
+        from src.vector_store import open_collection
+
+        collection = open_collection(get_index_registry().resolve(args.collection))
+        manifest = export_snapshot(collection, args.path)
+        print(f"📦 {manifest['count']} 条 → {args.path}")
+    elif args.tenant:
+        loaded = import_tenant_snapshot(args.path, args.tenant)
+        print(f"📥 租户 {args.tenant}: 装载 {loaded} 条")
+    else:
+        if not CHROMA_PERSIST_DIR:
+            print("⚠️ 未配置 CHROMA_PERSIST_DIR，装载到内存集合的数据会在进程退出后丢失")
+        version = import_snapshot(args.path, args.alias)
+        print(f"📥 别名 {args.alias} → {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+    多租户索引管理 - 每个租户一个持久化目录，首次查询时从磁盘加载；
+    常用租户常驻内存，总量受字节预算限制，超出时按 LRU 卸载最久未用的租户
+
+加载在后台线程进行，同一租户加载期间到达的请求排队等待同一次加载，不会重复打开。
+驻留字节数按租户索引目录在磁盘上的大小估算（HNSW 索引与元数据加载后大致占用同等内存）。
+
+每个租户目录里有一个代号文件，入库或快照导入后更新；服务进程查询已驻留的租户时发现代号变了就重新加载，
+命令行进程换了索引不需要通知服务。入库与快照导入都不改正在服务的目录：先写到新目录
+（入库在 TENANT_ROOT/.staging/<租户>/ 里进行，中断后可以续跑），完成后移到 TENANT_ROOT/.versions/ 下，
+再把租户目录（符号链接）原子地指向它，旧目录保留 TENANT_RETIRED_KEEP_SECONDS 后删除。
+
+    python -m src.tenants ingest acme data/acme_notes.txt
+    python -m src.tenants stats
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from src.config import (TENANT_COLLECTION_NAME, TENANT_LOAD_WORKERS, TENANT_MEMORY_BUDGET_BYTES,
+                        TENANT_RETIRED_KEEP_SECONDS, TENANT_ROOT, TOP_K_RESULTS)
+from src.logger import get_logger
+from src.metrics import metrics
+
+logger = get_logger("tenants")
+
+GENERATION_FILE = "index.generation"
+VERSIONS_DIR = ".versions"
+STAGING_DIR = ".staging"
+
+
+class TenantNotFoundError(KeyError):
+    """租户没有索引目录（尚未入库）"""
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def read_generation(path):
+    """租户索引的代号；没有代号文件（旧目录）时返回空字符串"""
+    try:
+        with open(os.path.join(path, GENERATION_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def write_generation(path):
+    tmp_path = os.path.join(path, GENERATION_FILE + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, os.path.join(path, GENERATION_FILE))
+
+
+class TenantIndex:
+    """一个已加载到内存的租户索引"""
+
+    def __init__(self, tenant, client, collection, size_bytes, load_ms, generation=""):
+        self.tenant = tenant
+        self.client = client
+        self.collection = collection
+        self.size_bytes = size_bytes
+        self.load_ms = load_ms
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.in_use = 0        # 正在进行的查询数，大于 0 时不会被卸载
+        self.retired = False   # 已被新代号替换，最后一个查询结束后关闭
+
+    def close(self):
+        close = getattr(self.client, "close", None)  # 旧版 chromadb 没有 close，只能等待回收
+        if close is not None:
+            close()
+
+
+# ==================== 索引管理器 ====================
+class TenantIndexManager:
+    def __init__(self, root=TENANT_ROOT, budget_bytes=TENANT_MEMORY_BUDGET_BYTES, load_workers=TENANT_LOAD_WORKERS,
+                 embedding_function=None):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.embedding_function = embedding_function
+        self.resident = OrderedDict()  # 租户 -> TenantIndex，按最近使用排序（末尾最新）
+        self.loading = {}              # 租户 -> 正在进行的加载 Future
+        self.stats_by_tenant = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=load_workers, thread_name_prefix="tenant-load")
+
+    def tenant_path(self, tenant):
+        if not tenant or os.sep in tenant or tenant.startswith("."):
+            raise ValueError(f"非法的租户名: {tenant!r}")
+        return os.path.join(self.root, tenant)
+
+    def _stats(self, tenant):
+        return self.stats_by_tenant.setdefault(tenant, {"hits": 0, "misses": 0, "loads": 0, "reloads": 0,
+                                                        "evictions": 0, "last_load_ms": None, "resident_bytes": 0})
+
+    # ---------- 获取 ----------
+    def load_async(self, tenant):
+        """返回一个在租户索引可用时完成的 Future；已驻留且代号未变时立即完成"""
+        generation = read_generation(self.tenant_path(tenant))
+        stale = None
+        with self.lock:
+            index = self.resident.get(tenant)
+            if index is not None and index.generation != generation:
+                # 其它进程重新入库或导入了快照：旧索引不再接新查询，正在进行的查询结束后关闭
+                stale, index = self.resident.pop(tenant), None
+                stale.retired = True
+                stats = self._stats(tenant)
+                stats.update(reloads=stats["reloads"] + 1, resident_bytes=0)
+            if index is not None:
+                self.resident.move_to_end(tenant)
+                self._stats(tenant)["hits"] += 1
+                future = Future()
+                future.set_result(index)
+                return future
+            self._stats(tenant)["misses"] += 1
+            future = self.loading.get(tenant)
+            if future is None:
+                future = self.loading[tenant] = self.executor.submit(self._load, tenant)
+        if stale is not None:
+            logger.info("🔄 租户 %s 的索引已更新，重新加载", tenant)
+            if not stale.in_use:
+                stale.close()
+        return future
+
+    @contextmanager
+    def lease(self, tenant, timeout=None):
+        """查询期间占用租户索引，保证不会被卸载；索引未加载时等待后台加载完成"""
+        with self.lease_index(tenant, timeout) as index:
+            yield index.collection
+
+    @contextmanager
+    def lease_index(self, tenant, timeout=None):
+        """同 lease，返回 TenantIndex（需要代号等信息时用）"""
+        while True:
+            index = self.load_async(tenant).result(timeout)
+            with self.lock:
+                # 加载完成到占用之间可能恰好被卸载，此时重新加载
+                if self.resident.get(tenant) is index:
+                    index.in_use += 1
+                    break
+        try:
+            yield index
+        finally:
+            with self.lock:
+                index.in_use -= 1
+                close = index.retired and not index.in_use
+            if close:
+                index.close()
+            self._evict_over_budget()
+
+    def query(self, tenant, question, top_k=TOP_K_RESULTS, timeout=None):
+        from src.rag_core import retrieve_documents
+        with self.lease(tenant, timeout) as collection:
+            return retrieve_documents(collection, question, top_k)
+
+    # ---------- 加载与卸载 ----------
+    def _load(self, tenant):
+        import chromadb
+
+        from src.vector_store import open_collection
+
+        start = time.perf_counter()
+        try:
+            path = self.tenant_path(tenant)
+            if not os.path.isdir(path):
+                raise TenantNotFoundError(tenant)
+            # 按符号链接解析后的真实目录打开，之后租户目录被切换到新版本也不会读到一半新一半旧
+            path = os.path.realpath(path)
+            generation = read_generation(path)
+            client = chromadb.PersistentClient(path=path)
+            collection = open_collection(TENANT_COLLECTION_NAME, self.embedding_function, client)
+            collection.peek(1)  # 触发索引加载，让加载耗时计入这里而不是第一个查询
+            load_ms = (time.perf_counter() - start) * 1000
+            index = TenantIndex(tenant, client, collection, directory_bytes(path), load_ms, generation)
+            with self.lock:
+                self.resident[tenant] = index
+                stats = self._stats(tenant)
+                stats.update(loads=stats["loads"] + 1, last_load_ms=load_ms, resident_bytes=index.size_bytes)
+            metrics.observe("tenants.load_ms", load_ms)
+            logger.info("📂 已加载租户 %s（%.1f MB，%.0f ms）", tenant, index.size_bytes / 1024 / 1024, load_ms)
+            self._evict_over_budget(keep=tenant)
+            return index
+        finally:
+            with self.lock:
+                self.loading.pop(tenant, None)
+
+    def _evict_over_budget(self, keep=None):
+        """从最久未用的租户开始卸载，直到总量回到预算内；正在使用的租户跳过"""
+        evicted = []
+        with self.lock:
+            total = sum(index.size_bytes for index in self.resident.values())
+            for tenant in list(self.resident):
+                if total <= self.budget_bytes:
+                    break
+                index = self.resident[tenant]
+                if tenant == keep or index.in_use:
+                    continue
+                del self.resident[tenant]
+                total -= index.size_bytes
+                stats = self._stats(tenant)
+                stats.update(evictions=stats["evictions"] + 1, resident_bytes=0)
+                evicted.append(index)
+        for index in evicted:
+            index.close()
+            metrics.inc("tenants.evictions")
+            logger.info("📤 已卸载租户 %s（释放 %.1f MB）", index.tenant, index.size_bytes / 1024 / 1024)
+        return [index.tenant for index in evicted]
+
+    def evict(self, tenant):
+        with self.lock:
+            index = self.resident.pop(tenant, None)
+            if index is not None:
+                self._stats(tenant)["resident_bytes"] = 0
+        if index is not None:
+            index.close()
+
+    # ---------- 入库与统计 ----------
+    def ingest(self, tenant, file_path):
+        """把知识文件入库到租户的新版本目录，完成后切换上线；服务进程下一次查询该租户时重新加载
+
+        正在服务的目录不会被改动。入库在 .staging/<租户>/ 里进行，中断后再次运行会从检查点续跑；
+        同一租户同时只能有一个入库（文件锁）。
+        """
+        import chromadb
+
+        from src.ingest_job import IngestionJob
+        from src.utils import locked_file
+        from src.vector_store import open_collection
+
+        self.tenant_path(tenant)  # 校验租户名
+        staging_root = os.path.join(self.root, STAGING_DIR)
+        os.makedirs(staging_root, exist_ok=True)
+        staging_path = os.path.join(staging_root, tenant)
+        with locked_file(os.path.join(staging_root, f".{tenant}.lock")):  # 租户名不以 . 开头，不会与暂存目录重名
+            os.makedirs(staging_path, exist_ok=True)
+            client = chromadb.PersistentClient(path=staging_path)
+            try:
+                collection = open_collection(TENANT_COLLECTION_NAME, self.embedding_function, client)
+                # 暂存目录不在服务中，换了知识文件时直接清空上次没做完的段落重新入库
+                state = IngestionJob(file_path, collection, os.path.join(staging_path, "ingest.checkpoint.json"),
+                                     replace=True).run()
+            finally:
+                getattr(client, "close", lambda: None)()
+            version_path = self.new_version_path(tenant)
+            os.makedirs(os.path.dirname(version_path), exist_ok=True)
+            os.rename(staging_path, version_path)
+            self.publish(tenant, version_path)
+        return state
+
+    # ---------- 整体替换 ----------
+    def new_version_path(self, tenant):
+        """新版本的租户目录（还未上线），在 TENANT_ROOT/.versions/ 下"""
+        self.tenant_path(tenant)  # 校验租户名
+        return os.path.join(self.root, VERSIONS_DIR, f"{tenant}-{time.time_ns()}")
+
+    def publish(self, tenant, version_path):
+        """把装载好的新目录原子地换成租户的当前索引，服务进程下一次查询该租户时重新加载"""
+        write_generation(version_path)
+        path = self.tenant_path(tenant)
+        previous = None
+        if os.path.isdir(path) and not os.path.islink(path):
+            # 旧布局的租户目录是真实目录：先挪进 .versions，之后每次切换只替换符号链接
+            previous = self.new_version_path(tenant)
+            os.rename(path, previous)
+        elif os.path.islink(path):
+            previous = os.path.realpath(path)
+        tmp_link = os.path.join(self.root, VERSIONS_DIR, f"{tenant}.link")
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(os.path.relpath(version_path, self.root), tmp_link)
+        os.replace(tmp_link, path)
+        if previous is not None and os.path.isdir(previous):
+            os.utime(previous)  # 目录的修改时间记为换下的时间，保留期从这里算起
+        logger.info("🔀 租户 %s → %s", tenant, os.path.basename(version_path))
+        return self._remove_retired_versions(tenant)
+
+    def _remove_retired_versions(self, tenant, keep_seconds=TENANT_RETIRED_KEEP_SECONDS):
+        """删除换下超过 keep_seconds 的旧目录；保留期内服务进程可能还在读"""
+        versions_dir = os.path.join(self.root, VERSIONS_DIR)
+        current = os.path.realpath(self.tenant_path(tenant))
+        removed = []
+        for name in os.listdir(versions_dir):
+            path = os.path.join(versions_dir, name)
+            if name.rsplit("-", 1)[0] != tenant or os.path.islink(path) or os.path.realpath(path) == current:
+                continue
+            if time.time() - os.path.getmtime(path) > keep_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+        return removed
+
+    def stats(self):
+        with self.lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": sum(index.size_bytes for index in self.resident.values()),
+                "resident_tenants": list(self.resident),
+                "loading_tenants": list(self.loading),
+                "tenants": {tenant: dict(stats) for tenant, stats in self.stats_by_tenant.items()},
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_tenant_manager():
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = TenantIndexManager()
+    return _manager
+
+
+def main():
+    import json
+
+    parser = argparse.ArgumentParser(description="多租户索引管理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest = subparsers.add_parser("ingest", help="为租户入库")
+    ingest.add_argument("tenant")
+    ingest.add_argument("file")
+    query = subparsers.add_parser("query", help="检索某个租户的索引")
+    query.add_argument("tenant")
+    query.add_argument("question")
+    subparsers.add_parser("stats", help="打印租户目录与大小")
+    args = parser.parse_args()
+
+    manager = get_tenant_manager()
+    if args.command == "ingest":
+        state = manager.ingest(args.tenant, args.file)
+        print(f"📦 租户 {args.tenant}: 写入 {state['ingested']} 段")
+    elif args.command == "query":
+        results = manager.query(args.tenant, args.question)
+        for doc_id, doc in zip(results["ids"][0], results["documents"][0]):
+            print(f"[{doc_id}] {doc[:100]}")
+    else:
+        names = os.listdir(manager.root) if os.path.isdir(manager.root) else []
+        tenants = sorted(t for t in names if not t.startswith("."))  # 跳过 .versions
+        sizes = {t: directory_bytes(os.path.join(manager.root, t)) for t in tenants}
+        print(json.dumps(sizes, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+    通用工具函数
+"""
+from contextlib import contextmanager
+
+
+
+# ==================== 文件读取 ====================
+def iter_paragraphs(file_path, start_offset=0):
+    """流式读取段落（空行分隔），逐个 yield (段落, 段落结束处的字节偏移)
+
+    偏移量可以保存下来，下次从 start_offset 继续读取，不需要把整个文件读进内存。
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start_offset)
+        lines = []
+        while True:
+            line = f.readline()
+            if not line or line in (b'\n', b'\r\n'):
+                paragraph = b''.join(lines).decode('utf-8').replace('\r\n', '\n').strip()
+                if paragraph:
+                    yield paragraph, f.tell()
+                lines = []
+                if not line:
+                    break
+            else:
+                lines.append(line)
+
+
+# ==================== 跨进程文件锁 ====================
+@contextmanager
+def locked_file(path):
+    """以排他锁打开状态文件（多个进程共用的 JSON 等），返回文件对象；POSIX 用 flock，Windows 用 msvcrt"""
+    with open(path, "a+", encoding="utf-8") as f:
+        try:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            unlock = lambda: fcntl.flock(f.fileno(), fcntl.LOCK_UN)  # noqa: E731
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            unlock = lambda: (f.seek(0), msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1))  # noqa: E731
+        try:
+            yield f
+        finally:
+            unlock()
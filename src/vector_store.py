@@ -0,0 +1,48 @@
+"""
+    向量库访问 - Chroma 客户端、集合打开与入库检查点位置
+"""
+import os
+
+import chromadb
+
+from src.config import CHROMA_PERSIST_DIR, VECTOR_DB_NAME
+from src.embeddings import check_embedding_metadata, get_embedding_function
+from src.logger import get_logger
+
+logger = get_logger("vector_store")
+
+
+# ==================== 客户端与集合 ====================
+def get_client():
+    """配置了 CHROMA_PERSIST_DIR 时使用持久化客户端（入库可跨进程续跑），否则使用内存客户端"""
+    if CHROMA_PERSIST_DIR:
+        return chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+    return chromadb.Client()
+
+
+def checkpoint_path_for(collection_name):
+    """入库检查点与持久化数据放在一起；内存模式下进程退出数据即丢失，不需要检查点"""
+    if not CHROMA_PERSIST_DIR:
+        return None
+    os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+    return os.path.join(CHROMA_PERSIST_DIR, f"{collection_name}.checkpoint.json")
+
+
+def open_collection(collection_name=VECTOR_DB_NAME, embedding_function=None, client=None):
+    """打开（不存在则创建）集合，并校验 embedding 配置"""
+    client = client or get_client()
+    embedding_function = embedding_function or get_embedding_function()
+    # 无论集合是否已存在都要绑定我们的 embedding 函数，否则 Chroma 会退回默认的本地模型
+    existing = [c.name for c in client.list_collections()]
+    opened = client.get_or_create_collection(
+        name=collection_name,
+        embedding_function=embedding_function,
+        metadata=embedding_function.embedding_metadata()
+    )
+    # 已有集合的元数据记录了入库时的模型/维度/投影，和当前配置不一致时拒绝使用
+    check_embedding_metadata(opened, embedding_function)
+    if collection_name in existing:
+        logger.info("✅ 找到现有集合: %s (已有 %d 个文档)", collection_name, opened.count())
+    else:
+        logger.info("🆕 创建新集合: %s", collection_name)
+    return opened
@@ -0,0 +1,217 @@
+"""
+    启动预热 - 服务把收到的问题追加到查询日志；重启后在后台按频次重放前 N 个热门问题，
+    预先填充问题向量缓存与答案缓存，并把索引页、段落文本库读进内存，部署后的前几分钟不再全是冷请求
+
+重放限速 WARMUP_RATE 个/秒并走 bulk 配额通道，服务照常接收请求；重放的问题不会再写回查询日志。
+答案缓存关闭（ANSWER_CACHE_SIZE = 0）时只做检索，不调用生成模型。
+
+    python -m src.warmup top --n 20     # 查看查询日志里最热门的问题
+    python -m src.warmup run --n 20     # 在前台跑一次预热
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from src.config import QUERY_LOG_MAX_BYTES, QUERY_LOG_PATH, WARMUP_RATE, WARMUP_TOP_N
+from src.logger import get_logger
+from src.metrics import metrics
+from src.quota import LANE_BULK, quota_lane
+from src.utils import locked_file
+
+logger = get_logger("warmup")
+
+
+# ==================== 查询日志 ====================
+class QueryLog:
+    """每行一个 JSON：{"ts", "q", "tenant"}；文件超过 max_bytes 时轮转为 <path>.1
+
+    多个进程可以共用同一个日志：每行一次追加写入；轮转在 <path>.lock 文件锁下进行，只有文件仍然超限时才改名，
+    其它进程写入前发现路径指向的 inode 变了（已被轮转）就重新打开，不会继续写进 .1。
+    """
+
+    def __init__(self, path=QUERY_LOG_PATH, max_bytes=QUERY_LOG_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = None
+        self.lock = threading.Lock()
+
+    def record(self, question, tenant=None):
+        if not self.path:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "q": question, "tenant": tenant}, ensure_ascii=False) + "\n"
+        try:
+            with self.lock:
+                if self.file is not None and self._rotated_elsewhere():
+                    self.file.close()
+                    self.file = None
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self.file = open(self.path, 'a', encoding='utf-8')
+                self.file.write(line)
+                self.file.flush()
+                if self.file.tell() > self.max_bytes:
+                    self.file.close()
+                    self.file = None
+                    self._rotate()
+        except OSError as e:
+            # 日志写不进去不能影响问答
+            metrics.inc("query_log.errors")
+            logger.warning("查询日志写入失败: %s", e)
+
+    def _rotated_elsewhere(self):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _rotate(self):
+        with locked_file(self.path + ".lock"):
+            # 几个进程可能同时写到超限，先拿到锁的那个轮转，其余的看到新文件还小就不再改名
+            try:
+                if os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def top_questions(self, n=WARMUP_TOP_N):
+        """按出现次数从高到低返回 [((问题, 租户), 次数)]，包括轮转出去的旧日志"""
+        counts = Counter()
+        for path in (self.path + ".1", self.path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            counts[(entry["q"], entry.get("tenant"))] += 1
+                        except (ValueError, KeyError, TypeError):
+                            continue  # 进程被杀时可能留下半行
+            except FileNotFoundError:
+                continue
+        return counts.most_common(n)
+
+
+_query_log = None
+_query_log_lock = threading.Lock()
+
+
+def get_query_log():
+    global _query_log
+    if _query_log is None:
+        with _query_log_lock:
+            if _query_log is None:
+                _query_log = QueryLog()
+    return _query_log
+
+
+# ==================== 预热 ====================
+class WarmupJob:
+    """按限速依次重放问题：答案缓存开启时走完整问答，否则只检索"""
+
+    def __init__(self, questions, rate=WARMUP_RATE):
+        self.questions = questions  # [(问题, 租户)]
+        self.rate = rate
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.state = {"status": "pending", "planned": len(questions), "done": 0, "failed": 0, "seconds": 0.0}
+
+    def _replay(self, question, tenant):
+        from src import rag_core
+        from src.query_cache import get_answer_cache
+        from src.tenants import get_tenant_manager
+
+        if get_answer_cache().enabled:
+            rag_core.ask_question(question, tenant=tenant)
+        elif tenant is None:
+            rag_core.retrieve_documents(rag_core.get_collection(), question)
+        else:
+            with get_tenant_manager().lease(tenant) as tenant_collection:
+                rag_core.retrieve_documents(tenant_collection, question)
+
+    def run(self):
+        self.state["status"] = "running"
+        start = time.perf_counter()
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        with quota_lane(LANE_BULK):
+            for i, (question, tenant) in enumerate(self.questions):
+                # 按开始时间排期，单个问题慢了后面不会补发突发
+                if self.stop_event.wait(max(0.0, start + i * interval - time.perf_counter())):
+                    break
+                try:
+                    self._replay(question, tenant)
+                    self.state["done"] += 1
+                except Exception as e:
+                    self.state["failed"] += 1
+                    metrics.inc("warmup.failures")
+                    logger.warning("预热问题失败（%s）: %s", question[:30], e)
+        self.state["seconds"] = time.perf_counter() - start
+        self.state["status"] = "stopped" if self.stop_event.is_set() else "done"
+        metrics.observe("warmup.seconds", self.state["seconds"])
+        logger.info("🔥 预热完成: %d/%d 个问题（失败 %d），用时 %.1f 秒", self.state["done"], self.state["planned"],
+                    self.state["failed"], self.state["seconds"])
+        return self.state
+
+    def start(self):
+        """在后台线程运行，服务同时正常接收请求"""
+        self.thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.state["status"] in ("done", "stopped")
+
+
+_job = None
+
+
+def start_warmup(top_n=WARMUP_TOP_N, rate=WARMUP_RATE, query_log=None):
+    """取查询日志里前 top_n 个热门问题在后台预热；日志为空时返回 None"""
+    global _job
+    questions = [key for key, _ in (query_log or get_query_log()).top_questions(top_n)]
+    if not questions:
+        return None
+    logger.info("🔥 开始预热 %d 个热门问题（%.1f 个/秒）", len(questions), rate)
+    _job = WarmupJob(questions, rate).start()
+    return _job
+
+
+def warmup_report():
+    from src.query_cache import cache_report
+
+    return {"job": dict(_job.state) if _job is not None else None, "caches": cache_report()}
+
+
+# ==================== 命令行 ====================
+def main():
+    parser = argparse.ArgumentParser(description="查询日志与启动预热")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    top = subparsers.add_parser("top", help="打印查询日志里最热门的问题")
+    top.add_argument("--n", type=int, default=WARMUP_TOP_N)
+    run = subparsers.add_parser("run", help="在前台重放热门问题")
+    run.add_argument("--n", type=int, default=WARMUP_TOP_N)
+    run.add_argument("--rate", type=float, default=WARMUP_RATE)
+    args = parser.parse_args()
+
+    if args.command == "top":
+        for (question, tenant), count in get_query_log().top_questions(args.n):
+            print(f"{count:>6}  {f'[{tenant}] ' if tenant else ''}{question}")
+    else:
+        questions = [key for key, _ in get_query_log().top_questions(args.n)]
+        print(json.dumps(WarmupJob(questions, args.rate).run(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+    测试公共配置 - 在导入任何 src 模块之前改写配置：本地 embedding、内存 Chroma、临时数据目录，
+    测试全程不访问网络，也不写仓库里的 data/
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src import config  # noqa: E402
+
+_DATA_DIR = tempfile.mkdtemp(prefix="rag-tests-")
+
+config.EMBEDDING_BACKEND = "local"
+config.EMBEDDING_CACHE_PATH = None
+config.CHROMA_PERSIST_DIR = None
+config.CHUNK_STORE_DIR = None
+config.SNAPSHOT_PATH = None
+config.QUERY_LOG_PATH = None
+config.QUOTA_ENABLED = False
+config.QUOTA_DIR = os.path.join(_DATA_DIR, "quota")
+config.BATCH_DIR = os.path.join(_DATA_DIR, "batch")
+config.TENANT_ROOT = os.path.join(_DATA_DIR, "tenants")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
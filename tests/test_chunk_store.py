@@ -0,0 +1,107 @@
+"""段落文本库：生成与按 id 读取、缺失 id 回退到 Chroma、文件对不上时拒绝使用"""
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from src import chunk_store
+from src.chunk_store import (BLOB_SUFFIX, IDS_SUFFIX, ChunkStore, ChunkStoreError, build_chunk_store,
+                             chunk_store_is_current, chunk_store_path, close_chunk_store, current_generation,
+                             get_chunk_store)
+from src.rag_core import query_collection
+from src.vector_store import get_client, open_collection
+
+DOCUMENTS = {
+    "doc_0": "机器学习让计算机从数据中学习规律。",
+    "doc_1": "向量数据库按距离检索相似段落。",
+    "doc_2": "Transformer 使用自注意力机制 🚀",
+}
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_store, "CHUNK_STORE_DIR", str(tmp_path / "chunks"))
+    name = f"chunks{uuid.uuid4().hex[:8]}"
+    collection = open_collection(name)
+    collection.add(ids=list(DOCUMENTS), documents=list(DOCUMENTS.values()))
+    yield collection
+    close_chunk_store(name)
+    get_client().delete_collection(name)
+
+
+def test_round_trip(collection):
+    path = build_chunk_store(collection, chunk_store_path(collection.name))
+    store = ChunkStore(path)
+    try:
+        assert len(store) == 3
+        for doc_id, text in DOCUMENTS.items():
+            assert store.get(doc_id) == text
+        assert store.get("doc_9") is None
+        assert store.get_many(["doc_2", "missing", "doc_0"]) == [DOCUMENTS["doc_2"], None, DOCUMENTS["doc_0"]]
+    finally:
+        store.close()
+    assert chunk_store_is_current(path, collection)
+
+
+def test_empty_collection(tmp_path):
+    name = f"empty{uuid.uuid4().hex[:8]}"
+    collection = open_collection(name)
+    try:
+        store = ChunkStore(build_chunk_store(collection, str(tmp_path / name)))
+        assert len(store) == 0 and store.get("doc_0") is None
+        store.close()
+    finally:
+        get_client().delete_collection(name)
+
+
+def test_query_reads_text_from_store_and_falls_back_for_new_ids(collection):
+    build_chunk_store(collection, chunk_store_path(collection.name))
+    collection.add(ids=["doc_3"], documents=["文本库生成之后才写入的段落。"])
+    assert not chunk_store_is_current(chunk_store_path(collection.name), collection)
+    assert get_chunk_store(collection.name).get("doc_3") is None
+
+    results = query_collection(collection, ["段落", "机器学习"], top_k=4)
+    texts = dict(DOCUMENTS, doc_3="文本库生成之后才写入的段落。")
+    for ids, documents in zip(results["ids"], results["documents"]):
+        assert sorted(ids) == sorted(texts)
+        assert documents == [texts[doc_id] for doc_id in ids]
+
+
+def test_rebuild_switches_readers_to_new_generation(collection):
+    path = chunk_store_path(collection.name)
+    build_chunk_store(collection, path)
+    first = get_chunk_store(collection.name)
+    assert first.get("doc_3") is None
+
+    collection.add(ids=["doc_3"], documents=["新段落。"])
+    build_chunk_store(collection, path)
+    second = get_chunk_store(collection.name)
+    assert second is not first and second.get("doc_3") == "新段落。"
+    assert first.get("doc_0") == DOCUMENTS["doc_0"]   # 旧一代仍可读，正在用它的线程不受影响
+
+
+def test_truncated_blob_is_rejected(collection):
+    path = build_chunk_store(collection, chunk_store_path(collection.name))
+    with open(current_generation(path) + BLOB_SUFFIX, "r+b") as f:
+        f.truncate(10)
+    with pytest.raises(ChunkStoreError):
+        ChunkStore(path)
+    assert get_chunk_store(collection.name) is None
+
+    results = query_collection(collection, ["机器学习"], top_k=3)
+    assert results["documents"][0] == [DOCUMENTS[doc_id] for doc_id in results["ids"][0]]
+
+
+def test_ids_from_another_generation_are_rejected(collection):
+    path = build_chunk_store(collection, chunk_store_path(collection.name))
+    with open(current_generation(path) + IDS_SUFFIX, "wb") as f:
+        np.save(f, np.array(sorted(DOCUMENTS) + ["doc_3"]))
+    with pytest.raises(ChunkStoreError):
+        ChunkStore(path)
+
+
+def test_missing_store():
+    assert current_generation(os.path.join("nowhere", "store")) is None
+    with pytest.raises(ChunkStoreError):
+        ChunkStore(os.path.join("nowhere", "store"))
@@ -0,0 +1,73 @@
+"""上下文压缩：分句、按问题相关度在预算内挑句子并保持原文顺序、句子向量缓存"""
+import uuid
+
+import numpy as np
+
+from src.compression import ContextCompressor, split_sentences
+
+TOPICS = ["猫", "狗", "鱼"]
+
+
+class KeywordEmbedding:
+    """按关键词出现次数生成向量的假 embedding，记录每次 embed_documents 的输入"""
+
+    def __init__(self):
+        self.model = uuid.uuid4().hex   # 每个实例独占句子缓存的键空间
+        self.document_calls = []
+
+    def embedding_metadata(self):
+        return {"model": self.model}
+
+    def _vector(self, text):
+        return np.array([text.count(topic) for topic in TOPICS] + [0.1], dtype=np.float32)
+
+    def embed_documents(self, texts):
+        self.document_calls.append(list(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, texts):
+        return [self._vector(text) for text in texts]
+
+
+DOCUMENTS = [
+    "猫喜欢晒太阳。狗喜欢追球！鱼在水里游。",
+    "猫一天要睡十几个小时；狗需要每天散步。\n养猫的人越来越多。",
+]
+
+
+def test_split_sentences_keeps_punctuation_and_breaks_on_newlines():
+    assert split_sentences("第一句。第二句！Third?  \n\n第四句；") == ["第一句。", "第二句！", "Third?", "第四句；"]
+    assert split_sentences("  \n ") == []
+
+
+def test_keeps_most_relevant_sentences_in_original_order():
+    compressor = ContextCompressor(KeywordEmbedding(), budget_chars=30, min_sentences=1)
+    compressed, stats = compressor.compress("猫", DOCUMENTS)
+    assert compressed == "猫喜欢晒太阳。\n猫一天要睡十几个小时；养猫的人越来越多。"
+    assert stats["sentences_kept"] == 3 and stats["sentences_total"] == 6
+    assert stats["compressed_chars"] <= 30 + 1   # 段落之间的换行不计入预算
+
+
+def test_min_sentences_kept_even_over_budget():
+    compressor = ContextCompressor(KeywordEmbedding(), budget_chars=5, min_sentences=2)
+    compressed, stats = compressor.compress("狗", DOCUMENTS)
+    assert compressed == "狗喜欢追球！\n狗需要每天散步。"
+    assert stats["sentences_kept"] == 2
+
+
+def test_short_context_is_returned_unchanged():
+    embedding = KeywordEmbedding()
+    compressor = ContextCompressor(embedding, budget_chars=1000)
+    compressed, stats = compressor.compress("猫", DOCUMENTS)
+    assert compressed == "\n".join(DOCUMENTS) and stats["ratio"] == 1.0
+    assert embedding.document_calls == []
+
+
+def test_sentence_embeddings_are_cached():
+    embedding = KeywordEmbedding()
+    compressor = ContextCompressor(embedding, budget_chars=20, min_sentences=1)
+    compressor.compress("猫", DOCUMENTS)
+    assert len(embedding.document_calls) == 1 and len(embedding.document_calls[0]) == 6
+
+    compressor.compress("狗", DOCUMENTS + ["鱼需要干净的水。鱼怕冷。"])
+    assert embedding.document_calls[1] == ["鱼需要干净的水。", "鱼怕冷。"]
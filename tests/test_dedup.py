@@ -0,0 +1,85 @@
+"""入库去重：精确重复（归一化后相同）与 MinHash 近似重复的阈值判断"""
+import pytest
+
+from src.dedup import Deduplicator, choose_bands, deduplicate, normalize_text, shingles
+
+BASE = ("机器学习是人工智能的一个分支，它让计算机能够从数据中学习规律，而不需要显式编程。"
+        "常见的方法包括监督学习、无监督学习和强化学习，广泛应用于图像识别、语音识别和推荐系统。")
+# 只改动一个词：字符 shingle 的 Jaccard 相似度约 0.9
+NEAR = BASE.replace("推荐系统", "推荐算法")
+# 替换中间一整句：相似度约 0.55
+HALF = BASE.replace("常见的方法包括监督学习、无监督学习和强化学习", "深度学习使用多层神经网络自动提取特征")
+OTHER = "向量数据库按照向量之间的距离检索最相似的段落，常用余弦距离或内积，并用近似最近邻索引加速查询。"
+
+
+def _jaccard(a, b):
+    sa, sb = shingles(normalize_text(a)), shingles(normalize_text(b))
+    return len(sa & sb) / len(sa | sb)
+
+
+def test_normalize_ignores_case_width_whitespace_and_punctuation():
+    assert normalize_text("  ＡＢＣ， 机器学习！\n") == normalize_text("abc机器学习")
+
+
+def test_exact_duplicate_after_normalization():
+    dedup = Deduplicator()
+    assert dedup.add(0, BASE) == (False, None, 0.0)
+    is_dup, kept, similarity = dedup.add(1, "  " + BASE.replace("，", ",") + "\n")
+    assert (is_dup, kept, similarity) == (True, 0, 1.0)
+    assert dedup.report.exact_duplicates == 1 and dedup.report.near_duplicates == 0
+
+
+def test_near_duplicate_above_threshold_is_dropped():
+    assert _jaccard(BASE, NEAR) > 0.85
+    dedup = Deduplicator(threshold=0.85)
+    dedup.add(0, BASE)
+    is_dup, kept, similarity = dedup.add(1, NEAR)
+    assert is_dup and kept == 0 and similarity >= 0.85
+    assert dedup.report.near_duplicates == 1
+
+
+def test_partial_overlap_below_threshold_is_kept():
+    assert 0.45 < _jaccard(BASE, HALF) < 0.7
+    dedup = Deduplicator(threshold=0.85)
+    dedup.add(0, BASE)
+    assert dedup.add(1, HALF)[0] is False
+
+
+def test_lower_threshold_catches_partial_overlap():
+    dedup = Deduplicator(threshold=0.4)
+    dedup.add(0, BASE)
+    is_dup, kept, similarity = dedup.add(1, HALF)
+    assert is_dup and kept == 0
+    assert similarity == pytest.approx(_jaccard(BASE, HALF), abs=0.15)
+
+
+def test_unrelated_text_is_kept():
+    dedup = Deduplicator()
+    dedup.add(0, BASE)
+    assert dedup.add(1, OTHER)[0] is False
+    assert dedup.indexed == 2
+
+
+def test_deduplicate_keeps_first_occurrence_and_reports_savings():
+    kept, report = deduplicate([BASE, OTHER, BASE, NEAR])
+    assert [i for i, _ in kept] == [0, 1]
+    assert (report.total, report.kept, report.exact_duplicates, report.near_duplicates) == (4, 2, 1, 1)
+    assert report.embeddings_saved == 2
+    assert report.bytes_saved == len(BASE.encode("utf-8")) + len(NEAR.encode("utf-8"))
+    assert [(dropped, original) for dropped, original, _ in report.duplicates] == [(2, 0), (3, 0)]
+
+
+def test_index_stops_growing_at_limit():
+    dedup = Deduplicator(max_indexed=1)
+    dedup.add(0, BASE)
+    assert dedup.add(1, OTHER)[0] is False
+    assert dedup.indexed == 1
+    # 超出上限的段落没有登记，再次出现时不会被识别为重复；已登记的仍然可以
+    assert dedup.add(2, OTHER)[0] is False
+    assert dedup.add(3, BASE)[0] is True
+
+
+def test_choose_bands_divides_num_perm():
+    bands, rows = choose_bands(128, 0.85)
+    assert bands * rows == 128
+    assert abs((1 / bands) ** (1 / rows) - 0.85) < 0.1
@@ -0,0 +1,127 @@
+"""生成客户端：熔断器状态机与瞬时 / 非瞬时错误的重试分类"""
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from src import generation
+from src.generation import (CircuitBreaker, GenerationClient, GenerationError, TransientGenerationError)
+
+
+# ==================== 熔断器 ====================
+def test_breaker_opens_after_threshold_and_half_opens_after_timeout():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()           # 只放行一个试探请求
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_rejected_request_ends_probe_without_counting_failure():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_rejected()
+    assert breaker.failures == 1 and breaker.state == "half_open"
+    assert breaker.allow()
+
+
+# ==================== 重试分类 ====================
+def _response(status_code):
+    if status_code == 200:
+        message = SimpleNamespace(content="答案")
+        return SimpleNamespace(status_code=200, usage={"input_tokens": 3, "output_tokens": 2},
+                               output=SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+    return SimpleNamespace(status_code=status_code, code="Err", message="失败", usage=None, output=None)
+
+
+class FakeGeneration:
+    """按顺序返回预设结果的 Generation.call；结果是异常时直接抛出"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.models = []
+
+    def call(self, model, **kwargs):
+        self.models.append(model)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _response(outcome)
+
+
+@pytest.fixture
+def fake_generation(monkeypatch):
+    def install(outcomes):
+        fake = FakeGeneration(outcomes)
+        monkeypatch.setattr(generation, "get_dashscope", lambda: SimpleNamespace(Generation=fake))
+        monkeypatch.setattr(generation, "GENERATION_BACKOFF_BASE", 0.0)
+        return fake
+    return install
+
+
+def _client(models=("primary", "backup"), max_retries=2):
+    return GenerationClient(models=list(models), max_retries=max_retries, hedge_percentile=None, pool_size=1)
+
+
+@pytest.mark.parametrize("outcome", [429, 500, 503, requests.exceptions.ConnectionError("reset")])
+def test_transient_errors_are_retried(fake_generation, outcome):
+    fake = fake_generation([outcome, outcome, 200])
+    result = _client().generate("问题")
+    assert result.text == "答案" and result.model == "primary"
+    assert fake.models == ["primary"] * 3
+
+
+def test_non_transient_error_is_not_retried_and_falls_back(fake_generation):
+    fake = fake_generation([400, 200])
+    client = _client()
+    result = client.generate("问题")
+    assert result.model == "backup"
+    assert fake.models == ["primary", "backup"]
+    # 参数错误不说明服务不可用，不计入熔断
+    assert client.breakers["primary"].failures == 0
+
+
+def test_exhausted_retries_count_toward_breaker(fake_generation):
+    fake_generation([503, 503, 200])
+    client = _client(max_retries=1)
+    result = client.generate("问题")
+    assert result.model == "backup"
+    assert client.breakers["primary"].failures == 1
+
+
+def test_open_breaker_skips_model(fake_generation):
+    fake = fake_generation([200])
+    client = _client()
+    client.breakers["primary"] = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    client.breakers["primary"].record_failure()
+    assert client.generate("问题").model == "backup"
+    assert fake.models == ["backup"]
+
+
+def test_all_models_failing_raises(fake_generation):
+    fake_generation([400, 400])
+    with pytest.raises(GenerationError) as excinfo:
+        _client().generate("问题")
+    assert not isinstance(excinfo.value, TransientGenerationError)
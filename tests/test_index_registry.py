@@ -0,0 +1,127 @@
+"""索引版本管理：别名切换、查询租约阻止回收、宽限期、清空别名"""
+import uuid
+
+import pytest
+
+from src.index_registry import IndexRegistry
+from src.vector_store import get_client, open_collection
+
+
+@pytest.fixture
+def alias():
+    return f"docs{uuid.uuid4().hex[:8]}"
+
+
+def _create(*names):
+    for name in names:
+        open_collection(name).add(ids=["doc_0"], documents=["段落"])
+
+
+def _existing():
+    return {c.name for c in get_client().list_collections()}
+
+
+def test_switch_retires_old_version_and_notifies(alias):
+    registry = IndexRegistry()
+    switched = []
+    registry.add_listener(lambda a, v: switched.append((a, v)))
+    v1, v2 = f"{alias}_v1", f"{alias}_v2"
+
+    assert registry.resolve(alias) == alias          # 没有别名记录时就是集合名本身
+    assert registry.switch(alias, v1) == alias
+    assert registry.switch(alias, v2) == v1
+    assert registry.resolve(alias) == v2
+    assert set(registry.retired) == {alias, v1}
+    assert switched == [(alias, v1), (alias, v2)]
+
+    registry.switch(alias, v1)                        # 切回旧版本时它不再是下线状态
+    assert v1 not in registry.retired and v2 in registry.retired
+
+
+def test_switch_is_visible_to_other_processes(tmp_path, alias):
+    path = str(tmp_path / "index_aliases.json")
+    writer, reader = IndexRegistry(path), IndexRegistry(path)
+    switched = []
+    reader.add_listener(lambda a, v: switched.append((a, v)))
+
+    writer.switch(alias, f"{alias}_v1")
+    assert reader.resolve(alias) == f"{alias}_v1"
+    assert switched == [(alias, f"{alias}_v1")]
+    assert alias in reader.retired
+
+
+def test_lease_blocks_collection_until_released(alias):
+    registry = IndexRegistry()
+    old, new = f"{alias}_v1", f"{alias}_v2"
+    _create(old, new)
+    registry.switch(alias, old)
+    registry.retired.pop(alias)                       # 别名同名的老集合不存在，不参与本测试
+
+    with registry.lease(old):
+        registry.switch(alias, new)
+        assert registry.collect_garbage(grace_seconds=0) == []
+        assert old in _existing()
+    assert registry.collect_garbage(grace_seconds=0) == [old]
+    assert old not in _existing() and new in _existing()
+    assert old not in registry.retired
+
+
+def test_grace_period_delays_collection(alias):
+    registry = IndexRegistry()
+    old, new = f"{alias}_v1", f"{alias}_v2"
+    _create(old, new)
+    registry.switch(alias, old)
+    registry.switch(alias, new)
+
+    assert registry.collect_garbage(grace_seconds=60) == []
+    assert old in _existing()
+    registry.retired[old] -= 61
+    assert old in registry.collect_garbage(grace_seconds=60)
+    assert old not in _existing()
+
+
+def test_current_version_is_never_collected(alias):
+    registry = IndexRegistry()
+    v1 = f"{alias}_v1"
+    _create(v1)
+    registry.switch(alias, v1)
+    registry.retired[v1] = 0.0                        # 即使误记为下线，仍被别名指向就不能删
+    assert v1 not in registry.collect_garbage(grace_seconds=0)
+    assert v1 in _existing()
+
+
+def test_command_line_process_only_collects_when_forced(tmp_path, alias):
+    registry = IndexRegistry(str(tmp_path / "index_aliases.json"))
+    old, new = f"{alias}_v1", f"{alias}_v2"
+    _create(old, new)
+    registry.switch(alias, old)
+    registry.switch(alias, new)
+
+    assert registry.collect_garbage(grace_seconds=0) == []
+    assert old in registry.collect_garbage(grace_seconds=0, force=True)
+    # 下线记录同步到共享文件
+    assert old not in IndexRegistry(registry.alias_path).retired
+
+
+def test_drop_alias_removes_current_and_retired_versions(alias):
+    registry = IndexRegistry()
+    v1, v2 = IndexRegistry.new_version_name(alias), f"{alias}_v{'1' * 16}"
+    other = f"{alias}extra_v{'2' * 16}"
+    _create(alias, v1, v2, other)
+    registry.switch(alias, v1)
+    registry.switch(alias, v2)
+    registry.switch(f"{alias}extra", other)
+
+    dropped = registry.drop_alias(alias)
+    assert sorted(dropped) == sorted([v2, alias, v1])
+    assert registry.resolve(alias) == alias
+    assert not {alias, v1, v2} & _existing()
+    assert other in _existing()                       # 前缀相同的其它别名不受影响
+    assert registry.resolve(f"{alias}extra") == other
+
+
+def test_owns_version():
+    assert IndexRegistry.owns_version("docs", "docs")
+    assert IndexRegistry.owns_version("docs", IndexRegistry.new_version_name("docs"))
+    assert not IndexRegistry.owns_version("docs", "docs_extra")
+    assert not IndexRegistry.owns_version("docs", IndexRegistry.new_version_name("docs_extra"))
@@ -0,0 +1,120 @@
+"""后台入库：中断后从检查点续跑、来源文件变化时拒绝覆盖"""
+import pytest
+
+from src.ingest_job import IngestionJob, SourceChangedError, load_checkpoint
+
+
+class FakeCollection:
+    """只实现入库用到的接口；fail_on_call 指定第几次 upsert 抛出异常，模拟进程中途出错"""
+
+    def __init__(self, name="docs", fail_on_call=None):
+        self.name = name
+        self.docs = {}
+        self.upserts = []
+        self.fail_on_call = fail_on_call
+
+    def count(self):
+        return len(self.docs)
+
+    def upsert(self, ids, documents):
+        if self.fail_on_call is not None and len(self.upserts) + 1 == self.fail_on_call:
+            raise ConnectionError("embedding 服务断开")
+        self.upserts.append(list(ids))
+        self.docs.update(zip(ids, documents))
+
+    def get(self, limit=None, include=None):
+        return {"ids": list(self.docs)[:limit]}
+
+    def delete(self, ids):
+        for id_ in ids:
+            self.docs.pop(id_, None)
+
+
+def _write_corpus(path, paragraphs):
+    path.write_text("\n\n".join(paragraphs) + "\n", encoding="utf-8")
+    return str(path)
+
+
+PARAGRAPHS = [f"第 {i} 段：关于主题 {i} 的一段独立说明文字，编号 {i * 7919}。" for i in range(10)]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    return _write_corpus(tmp_path / "notes.txt", PARAGRAPHS)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return str(tmp_path / "notes.checkpoint.json")
+
+
+def test_failed_run_resumes_from_last_committed_batch(corpus, checkpoint):
+    collection = FakeCollection(fail_on_call=3)
+    with pytest.raises(ConnectionError):
+        IngestionJob(corpus, collection, checkpoint, batch_size=3, checkpoint_every=10).run()
+
+    state = load_checkpoint(checkpoint)
+    assert state["status"] == "failed"
+    assert (state["next_index"], state["ingested"]) == (6, 6)
+
+    collection.fail_on_call = None
+    state = IngestionJob(corpus, collection, checkpoint, batch_size=3).run()
+    assert state["status"] == "done" and state["ingested"] == 10
+    # 续跑从 doc_6 开始，已提交的批次不会再调用 embedding
+    assert collection.upserts[2:] == [["doc_6", "doc_7", "doc_8"], ["doc_9"]]
+    assert sorted(collection.docs) == sorted(f"doc_{i}" for i in range(10))
+
+
+def test_stopped_job_resumes(corpus, checkpoint):
+    collection = FakeCollection()
+    job = IngestionJob(corpus, collection, checkpoint, batch_size=4)
+    job.stop()
+    assert job.run()["status"] == "stopped"
+    assert load_checkpoint(checkpoint)["next_index"] == 4
+
+    state = IngestionJob(corpus, collection, checkpoint, batch_size=4).run()
+    assert state["status"] == "done" and state["ingested"] == 10
+    assert [ids[0] for ids in collection.upserts] == ["doc_0", "doc_4", "doc_8"]
+
+
+def test_finished_job_is_not_repeated(corpus, checkpoint):
+    collection = FakeCollection()
+    IngestionJob(corpus, collection, checkpoint, batch_size=4).run()
+    calls = len(collection.upserts)
+    state = IngestionJob(corpus, collection, checkpoint, batch_size=4).run()
+    assert state["ingested"] == 10 and len(collection.upserts) == calls
+
+
+def test_resume_does_not_double_count_duplicates(tmp_path, checkpoint):
+    corpus = _write_corpus(tmp_path / "dup.txt", PARAGRAPHS[:3] + PARAGRAPHS[:3] + PARAGRAPHS[3:6])
+    collection = FakeCollection(fail_on_call=2)
+    with pytest.raises(ConnectionError):
+        IngestionJob(corpus, collection, checkpoint, batch_size=3).run()
+    collection.fail_on_call = None
+    state = IngestionJob(corpus, collection, checkpoint, batch_size=3).run()
+    assert (state["ingested"], state["skipped"]) == (6, 3)
+    assert collection.count() == 6
+
+
+def test_changed_source_with_existing_data_is_rejected(tmp_path, corpus, checkpoint):
+    collection = FakeCollection()
+    IngestionJob(corpus, collection, checkpoint, batch_size=4).run()
+
+    _write_corpus(tmp_path / "notes.txt", ["完全不同的新内容。"] + PARAGRAPHS)
+    with pytest.raises(SourceChangedError):
+        IngestionJob(corpus, collection, checkpoint, batch_size=4).run()
+    # 其它文件写入同一个集合同样拒绝，即使没有检查点
+    other = _write_corpus(tmp_path / "other.txt", ["另一份笔记。"])
+    with pytest.raises(SourceChangedError):
+        IngestionJob(other, collection, batch_size=4).run()
+    assert collection.docs["doc_0"] == PARAGRAPHS[0]
+
+
+def test_replace_clears_collection_before_reingesting(tmp_path, corpus, checkpoint):
+    collection = FakeCollection()
+    IngestionJob(corpus, collection, checkpoint, batch_size=4).run()
+
+    _write_corpus(tmp_path / "notes.txt", ["新内容一。", "新内容二。"])
+    state = IngestionJob(corpus, collection, checkpoint, batch_size=4, replace=True).run()
+    assert state["ingested"] == 2
+    assert collection.docs == {"doc_0": "新内容一。", "doc_1": "新内容二。"}
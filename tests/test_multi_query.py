@@ -0,0 +1,107 @@
+"""多查询检索：倒数排名融合的排序、规则改写、一次批量查询与改写期限"""
+import time
+
+from src import multi_query
+from src.multi_query import expand_query, extract_keywords, multi_query_retrieve, reciprocal_rank_fusion
+
+
+def _results(*rows):
+    """每行是 [(id, 距离), ...]，文本就用 id 代替"""
+    return {"ids": [[doc_id for doc_id, _ in row] for row in rows],
+            "documents": [[f"text-{doc_id}" for doc_id, _ in row] for row in rows],
+            "distances": [[distance for _, distance in row] for row in rows]}
+
+
+# ==================== 融合 ====================
+def test_documents_found_by_several_queries_rank_first():
+    fused = reciprocal_rank_fusion(_results([("a", 0.1), ("b", 0.2), ("c", 0.3)],
+                                            [("c", 0.25), ("b", 0.3), ("d", 0.4)],
+                                            [("c", 0.2), ("d", 0.35), ("b", 0.5)]),
+                                   top_k=4, rrf_k=60, primary_weight=1.0)
+    assert fused["ids"] == [["c", "b", "d", "a"]]
+    assert fused["documents"] == [["text-c", "text-b", "text-d", "text-a"]]
+    # 距离取该段落在各查询中的最小值
+    assert fused["distances"] == [[0.2, 0.2, 0.35, 0.1]]
+
+
+def test_primary_weight_favours_original_question():
+    results = _results([("a", 0.3), ("b", 0.4)], [("b", 0.1), ("a", 0.5)])
+    assert reciprocal_rank_fusion(results, top_k=2, primary_weight=2.0)["ids"] == [["a", "b"]]
+    # 权重相同时得分持平，按最小距离排序
+    assert reciprocal_rank_fusion(results, top_k=2, primary_weight=1.0)["ids"] == [["b", "a"]]
+
+
+def test_fusion_truncates_to_top_k():
+    fused = reciprocal_rank_fusion(_results([("a", 0.1), ("b", 0.2), ("c", 0.3)]), top_k=2)
+    assert fused["ids"] == [["a", "b"]]
+
+
+# ==================== 规则改写 ====================
+def test_extract_keywords_strips_question_words():
+    assert extract_keywords("什么是过拟合？如何解决？") == "过拟合 解决"
+
+
+def test_expand_query_uses_synonyms_and_excludes_original():
+    variants = expand_query("什么是过拟合？", max_variants=10)
+    assert "过拟合" in variants
+    assert "什么是overfitting？" in variants and "泛化能力差" in variants
+    assert "什么是过拟合？" not in variants
+    assert len(variants) == len(set(variants))
+    assert len(expand_query("什么是过拟合？", max_variants=2)) == 2
+
+
+# ==================== 多查询检索 ====================
+class RecordingQuery:
+    """记录每次 query_fn 调用的问题列表，按问题返回固定结果"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, top_k):
+        self.calls.append(list(texts))
+        return _results(*[[(f"{text}-{i}", 0.1 * i) for i in range(top_k)] for text in texts])
+
+
+def test_original_and_rule_variants_share_one_query():
+    query = RecordingQuery()
+    fused = multi_query_retrieve(query, "什么是过拟合？", top_k=3, paraphrase=False)
+    assert len(query.calls) == 1
+    assert query.calls[0][0] == "什么是过拟合？" and len(query.calls[0]) > 1
+    assert fused["ids"][0][0] == "什么是过拟合？-0"    # 原问题权重更高，它的第一名排第一
+    assert len(fused["ids"][0]) == 3
+
+
+def test_question_without_variants_is_not_fused():
+    query = RecordingQuery()
+    results = multi_query_retrieve(query, "？", top_k=2, paraphrase=False)
+    assert query.calls == [["？"]]
+    assert results["ids"] == [["？-0", "？-1"]]
+
+
+def test_paraphrases_are_queried_once_more(monkeypatch):
+    monkeypatch.setattr(multi_query, "paraphrase_query", lambda question, n, deadline: ["过拟合怎么回事", "过拟合"])
+    query = RecordingQuery()
+    multi_query_retrieve(query, "什么是过拟合？", top_k=2, paraphrase=True, deadline=5)
+    assert len(query.calls) == 2
+    assert query.calls[1] == ["过拟合怎么回事"]          # 已在规则变体里的改写不再重复查询
+
+
+def test_slow_paraphrase_falls_back_to_rule_variants(monkeypatch):
+    def slow_paraphrase(question, n, deadline):
+        time.sleep(0.5)
+        return ["太晚的改写"]
+
+    monkeypatch.setattr(multi_query, "paraphrase_query", slow_paraphrase)
+    query = RecordingQuery()
+    start = time.perf_counter()
+    multi_query_retrieve(query, "什么是过拟合？", top_k=2, paraphrase=True, deadline=0.1)
+    assert time.perf_counter() - start < 0.4
+    assert len(query.calls) == 1
+
+
+def test_expired_paraphrase_is_skipped(monkeypatch):
+    called = []
+    monkeypatch.setattr(multi_query, "paraphrase_query", lambda *args: called.append(args) or [])
+    assert multi_query._paraphrase_before("问题", 2, time.perf_counter() - 1) == []
+    assert called == []
+
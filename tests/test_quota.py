@@ -0,0 +1,99 @@
+"""共享令牌桶：按速率补充、超时、bulk 预留与让行、429 退避、多实例共享状态"""
+import time
+
+import pytest
+
+from src import quota
+from src.quota import (LANE_BULK, LANE_INTERACTIVE, QuotaTimeoutError, SharedTokenBucket, current_lane,
+                       get_bucket, quota_lane)
+from src.utils import locked_file
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    def make(**kwargs):
+        kwargs.setdefault("requests_per_second", 20)
+        kwargs.setdefault("bulk_reserve", 0.0)
+        return SharedTokenBucket("test", directory=str(tmp_path), burst_seconds=1.0, **kwargs)
+    return make
+
+
+def test_burst_then_refill_at_rate(bucket):
+    b = bucket(requests_per_second=20)
+    for _ in range(20):
+        assert b.acquire(timeout=0) == pytest.approx(0, abs=0.01)
+    waited = b.acquire(timeout=1)
+    assert 0.03 <= waited < 0.3        # 每 50 ms 补充一个请求
+
+
+def test_timeout_raises(bucket):
+    b = bucket(requests_per_second=1)
+    b.acquire()
+    with pytest.raises(QuotaTimeoutError):
+        b.acquire(timeout=0.05)
+
+
+def test_token_budget_and_adjust(bucket):
+    b = bucket(requests_per_second=None, tokens_per_minute=600)   # 每秒 10 tokens，容量 10
+    b.acquire(tokens=8)
+    assert b.status()["levels"]["tokens"] == pytest.approx(2, abs=0.2)
+    b.adjust(-5)                        # 实际用量比预估少 5，退还
+    assert b.status()["levels"]["tokens"] == pytest.approx(7, abs=0.2)
+    with pytest.raises(QuotaTimeoutError):
+        b.acquire(tokens=10, timeout=0.05)
+
+
+def test_request_larger_than_capacity_waits_for_full_bucket(bucket):
+    b = bucket(requests_per_second=None, tokens_per_minute=600)
+    assert b.acquire(tokens=50, timeout=0) == pytest.approx(0, abs=0.01)
+    assert b.status()["levels"]["tokens"] < 0   # 允许欠账，之后的请求等它还清
+
+
+def test_bulk_leaves_reserve_for_interactive(bucket):
+    b = bucket(requests_per_second=10, bulk_reserve=0.3)
+    for _ in range(7):
+        b.acquire(lane=LANE_BULK, timeout=0)
+    with pytest.raises(QuotaTimeoutError):
+        b.acquire(lane=LANE_BULK, timeout=0.02)
+    for _ in range(3):
+        assert b.acquire(lane=LANE_INTERACTIVE, timeout=0) == pytest.approx(0, abs=0.01)
+
+
+def test_bulk_yields_to_waiting_interactive_requests(bucket):
+    b = bucket(requests_per_second=10)
+    with locked_file(b.path) as f:
+        state = b._read(f, time.time())
+        state["waiters"]["other-process"] = time.time() + 1.0
+        b._write(f, state)
+    with pytest.raises(QuotaTimeoutError):
+        b.acquire(lane=LANE_BULK, timeout=0.1)
+    assert b.acquire(lane=LANE_INTERACTIVE, timeout=0) == pytest.approx(0, abs=0.01)
+    assert b.status()["waiting_interactive"] == 1
+
+
+def test_backoff_blocks_all_lanes(bucket):
+    b = bucket(requests_per_second=100)
+    b.backoff(0.2)
+    assert b.status()["blocked_for"] > 0.1
+    assert b.acquire(timeout=1) >= 0.15
+
+
+def test_instances_share_state_through_file(bucket):
+    first, second = bucket(requests_per_second=5), bucket(requests_per_second=5)
+    for _ in range(5):
+        first.acquire(timeout=0)
+    with pytest.raises(QuotaTimeoutError):
+        second.acquire(timeout=0.05)
+
+
+def test_lane_context():
+    assert current_lane() == LANE_INTERACTIVE
+    with quota_lane(LANE_BULK):
+        assert current_lane() == LANE_BULK
+    assert current_lane() == LANE_INTERACTIVE
+
+
+def test_disabled_quota_has_no_bucket(monkeypatch):
+    monkeypatch.setattr(quota, "QUOTA_ENABLED", False)
+    assert get_bucket("embedding") is None
+    assert quota.acquire("embedding", 100) == 0.0
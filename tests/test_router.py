@@ -0,0 +1,73 @@
+"""模型路由：定义型问题走抽取式、简单明确的问题走快速模型、其余走大模型"""
+import pytest
+
+from src.config import BASIC_PROMPT_TEMPLATE
+from src.router import (ROUTE_EXTRACTIVE, ROUTE_FAST, ROUTE_FULL, Router, estimate_cost)
+
+THRESHOLDS = {"fast_model": "fast-model", "full_model": "full-model"}
+
+
+def _results(*distances):
+    return {"distances": [list(distances)]}
+
+
+@pytest.fixture
+def router():
+    return Router("adaptive", THRESHOLDS)
+
+
+def test_definition_question_with_clear_winner_is_extractive(router):
+    decision = router.route("什么是机器学习？", _results(0.5, 0.9))
+    assert decision.route == ROUTE_EXTRACTIVE and decision.model is None
+
+
+def test_definition_question_with_close_runner_up_is_not_extractive(router):
+    assert router.route("机器学习是什么", _results(0.5, 0.6)).route == ROUTE_FULL
+
+
+def test_definition_question_with_far_top_hit_is_not_extractive(router):
+    # 第一段本身不够近，即便领先也不能直接当答案；问题短且结果明确，退到快速模型
+    decision = router.route("什么是机器学习", _results(0.9, 1.3))
+    assert decision.route == ROUTE_FAST and decision.model == "fast-model"
+
+
+def test_short_question_with_clear_margin_goes_fast(router):
+    assert router.route("梯度下降怎么调学习率", _results(0.4, 0.7)).route == ROUTE_FAST
+
+
+def test_long_question_goes_full_unless_basic_template(router):
+    question = "请详细比较随机梯度下降和批量梯度下降在大规模数据集上的收敛速度与内存开销"
+    assert router.route(question, _results(0.4, 0.7)).route == ROUTE_FULL
+    assert router.route(question, _results(0.4, 0.7), BASIC_PROMPT_TEMPLATE).route == ROUTE_FAST
+
+
+def test_ambiguous_results_go_full(router):
+    decision = router.route("梯度下降怎么调学习率", _results(0.4, 0.45))
+    assert decision.route == ROUTE_FULL and decision.model == "full-model"
+
+
+def test_missing_distances_go_full(router):
+    assert router.route("什么是机器学习", {"distances": [[]]}).route == ROUTE_FULL
+    assert router.route("什么是机器学习", {}).route == ROUTE_FULL
+
+
+def test_single_result_has_infinite_margin(router):
+    assert router.route("什么是机器学习", _results(0.5)).route == ROUTE_EXTRACTIVE
+
+
+@pytest.mark.parametrize("policy, route, model", [("always_full", ROUTE_FULL, "full-model"),
+                                                  ("always_fast", ROUTE_FAST, "fast-model")])
+def test_fixed_policies_ignore_signals(policy, route, model):
+    decision = Router(policy, THRESHOLDS).route("什么是机器学习", _results(0.1, 0.9))
+    assert (decision.route, decision.model) == (route, model)
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        Router("cheapest")
+
+
+def test_estimate_cost():
+    assert estimate_cost("qwen-turbo", {"input_tokens": 1000, "output_tokens": 1000}) == pytest.approx(0.0009)
+    assert estimate_cost("unknown", {"input_tokens": 1000}) == 0.0
+    assert estimate_cost(None, None) == 0.0
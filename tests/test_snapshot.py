@@ -0,0 +1,99 @@
+"""Embedding 快照：导出 / 装载往返、sha256 校验、embedding 维度不一致时拒绝装载"""
+import json
+import os
+import uuid
+
+import pytest
+
+from src.config import LOCAL_EMBEDDING_DIM
+from src.embeddings import EmbeddingMismatchError, LocalEmbeddingFunction
+from src.snapshot import (MANIFEST_FILE, RECORDS_FILE, SnapshotError, check_loaded, export_snapshot,
+                          load_snapshot, verify_snapshot)
+from src.vector_store import get_client, open_collection
+
+DOCUMENTS = [f"第 {i} 段：关于主题 {i} 的说明。" for i in range(12)]
+
+
+@pytest.fixture
+def collections():
+    """按需创建内存集合，用例结束后删除"""
+    names = []
+
+    def make(embedding_function=None):
+        name = f"snap{uuid.uuid4().hex[:8]}"
+        names.append(name)
+        return open_collection(name, embedding_function)
+
+    yield make
+    for name in names:
+        get_client().delete_collection(name)
+
+
+@pytest.fixture
+def snapshot(tmp_path, collections):
+    source = collections()
+    source.add(ids=[f"doc_{i}" for i in range(len(DOCUMENTS))], documents=DOCUMENTS,
+               metadatas=[{"row": i} for i in range(len(DOCUMENTS))])
+    path = str(tmp_path / "snapshot")
+    export_snapshot(source, path, batch_size=5)
+    return path
+
+
+def test_round_trip(snapshot, collections):
+    manifest = verify_snapshot(snapshot)
+    assert (manifest["count"], manifest["dimension"]) == (len(DOCUMENTS), LOCAL_EMBEDDING_DIM)
+    assert not os.path.exists(f"{snapshot}.tmp")
+
+    target = collections()
+    assert load_snapshot(snapshot, target, batch_size=5) == len(DOCUMENTS)
+    assert check_loaded(target, snapshot) == 1.0
+    loaded = target.get(ids=["doc_3"], include=["documents", "metadatas"])
+    assert loaded["documents"] == [DOCUMENTS[3]] and loaded["metadatas"] == [{"row": 3}]
+
+
+def test_corrupted_file_fails_sha256(snapshot, collections):
+    path = os.path.join(snapshot, RECORDS_FILE)
+    with open(path, "r+b") as f:
+        data = bytearray(f.read())
+        data[5] ^= 0x01                 # 改一个字节，大小不变
+        f.seek(0)
+        f.write(data)
+    with pytest.raises(SnapshotError, match="校验和"):
+        verify_snapshot(snapshot)
+
+    target = collections()
+    with pytest.raises(SnapshotError):
+        load_snapshot(snapshot, target)
+    assert target.count() == 0
+
+
+def test_truncated_file_is_rejected(snapshot):
+    with open(os.path.join(snapshot, RECORDS_FILE), "r+b") as f:
+        f.truncate(10)
+    with pytest.raises(SnapshotError, match="大小"):
+        verify_snapshot(snapshot)
+
+
+def test_dimension_mismatch_is_rejected(snapshot, collections):
+    target = collections(LocalEmbeddingFunction(dim=LOCAL_EMBEDDING_DIM // 2))
+    with pytest.raises(EmbeddingMismatchError, match="embedding_dim"):
+        load_snapshot(snapshot, target)
+    assert target.count() == 0
+
+
+def test_unknown_format_is_rejected(snapshot, tmp_path):
+    manifest_path = os.path.join(snapshot, MANIFEST_FILE)
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["version"] = 99
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    with pytest.raises(SnapshotError):
+        verify_snapshot(snapshot)
+    with pytest.raises(SnapshotError):
+        verify_snapshot(str(tmp_path / "missing"))
+
+
+def test_empty_collection_cannot_be_exported(tmp_path, collections):
+    with pytest.raises(SnapshotError):
+        export_snapshot(collections(), str(tmp_path / "empty"))